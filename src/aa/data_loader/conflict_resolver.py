@@ -0,0 +1,195 @@
+"""
+数据冲突处理模块
+
+数据预处理时保证 (数据日期, 机构名称, 指标名称) 唯一：
+- 同一数据源（multi_sheet_df中的一组手工数据sheet或一张标准表）内 (数据日期, 机构名称) 重复的行，
+  逐个指标按冲突策略取值；
+- 不同数据源中的同名指标，按冲突策略决定采用哪个数据源的取值，另一个数据源的取值只用于填补缺失。
+
+取值不同的冲突记录到冲突报告中，随预处理结果写入xlsx的“数据冲突”页或指标库的conflicts表。
+预处理结果带有冲突报告即表示已保证唯一，报告生成时算子据此跳过去重和记录数检查。
+"""
+import logging
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 冲突策略
+LAST_WINS = "后者覆盖"  # multi_sheet_df中靠后的数据源（同一数据源内靠后的行）覆盖靠前的
+FIRST_WINS = "配置顺序"  # multi_sheet_df中靠前的数据源（同一数据源内靠前的行）优先
+CONFLICT_POLICIES = (LAST_WINS, FIRST_WINS)
+
+CONFLICT_SHEET = "数据冲突"
+CONFLICT_COLUMNS = ["数据日期", "机构名称", "指标名称", "采用来源", "采用值", "舍弃来源", "舍弃值"]
+
+# 数据源：(在multi_sheet_df中的序号, 名称)
+Source = Tuple[int, str]
+
+
+class ConflictResolver:
+    """按冲突策略合并重复数据，并累积冲突报告"""
+
+    def __init__(self, policy: str = LAST_WINS):
+        """
+        Args:
+            policy: 冲突策略，后者覆盖 或 配置顺序
+        """
+        if policy not in CONFLICT_POLICIES:
+            raise ValueError(f"不支持的冲突策略：{policy}")
+        self.policy = policy
+        self._conflicts: List[pd.DataFrame] = []
+
+    def wins(self, new: Source, existing: Source) -> bool:
+        """数据源new是否覆盖数据源existing"""
+        if self.policy == LAST_WINS:
+            return new[0] >= existing[0]
+        return new[0] < existing[0]
+
+    def dedupe(
+        self, df: pd.DataFrame, keys: Sequence[str], sources: Sequence[Source]
+    ) -> pd.DataFrame:
+        """
+        去除同一数据源内键重复的行
+
+        没有重复键时原样返回；有重复时按数据源序号和行序排列，
+        每个指标取策略选中的非空值（后者覆盖取最后一个，配置顺序取第一个）。
+
+        Args:
+            df: 数据源的数据
+            keys: 唯一键，如 [数据日期, 机构名称]
+            sources: 每一行所属的数据源，与df的行一一对应
+        """
+        duplicated = df.duplicated(subset=list(keys), keep=False).to_numpy()
+        if not duplicated.any():
+            return df
+
+        source_order = np.array([source[0] for source in sources], dtype="int64")
+        source_names = np.array([source[1] for source in sources], dtype=object)
+        # 数据源序号相同时保持原有行序
+        order = np.lexsort((np.arange(len(df)), source_order))
+        ordered = df.iloc[order].reset_index(drop=True)
+        names = pd.Series(source_names[order])
+        is_dup = pd.Series(duplicated[order])
+
+        value_columns = [col for col in ordered.columns if col not in keys]
+        pick_last = self.policy == LAST_WINS
+        for column in value_columns:
+            self._record_row_conflicts(ordered[is_dup], names[is_dup], keys, column, pick_last)
+
+        grouped = ordered.groupby(list(keys), sort=False, dropna=False)
+        result = (grouped.last() if pick_last else grouped.first()).reset_index()
+        logger.warning(
+            "数据源中存在%s行重复的 %s，已按“%s”合并",
+            int(duplicated.sum()),
+            "、".join(keys),
+            self.policy,
+        )
+        return result.reindex(columns=df.columns)
+
+    def _record_row_conflicts(
+        self,
+        rows: pd.DataFrame,
+        names: pd.Series,
+        keys: Sequence[str],
+        column: str,
+        pick_last: bool,
+    ):
+        """记录重复行中某个指标取值不同的冲突"""
+        values = rows[column]
+        present = values.notna().to_numpy()
+        if not present.any():
+            return
+        frame = rows.loc[present, list(keys)].copy()
+        frame["_值"] = values[present].to_numpy()
+        frame["_来源"] = names[present].to_numpy()
+        grouped = frame.groupby(list(keys), sort=False, dropna=False)
+        winner = grouped.tail(1) if pick_last else grouped.head(1)
+        winner = winner.rename(columns={"_值": "采用值", "_来源": "采用来源"})
+        merged = frame.merge(winner, on=list(keys), how="left")
+        merged = merged[merged["_值"] != merged["采用值"]]
+        if merged.empty:
+            return
+        self._append(
+            merged.get("数据日期"),
+            merged.get("机构名称"),
+            column,
+            merged["采用来源"],
+            merged["采用值"],
+            merged["_来源"],
+            merged["_值"],
+        )
+
+    def combine(
+        self,
+        merged_df: pd.DataFrame,
+        columns: Sequence[str],
+        column_sources: Dict[str, Source],
+        new_source: Source,
+        suffix: str = "_DROP",
+    ) -> pd.DataFrame:
+        """
+        合并不同数据源中的同名指标列
+
+        merged_df 为按 (数据日期, 机构名称) 关联后的宽表，同名指标列中原有数据源的列保留原名，
+        新数据源的列带有suffix后缀。按冲突策略选出采用的一列，另一列只填补其缺失值，
+        合并后删除带后缀的列，并更新column_sources。
+
+        Args:
+            merged_df: 关联后的宽表
+            columns: 两个数据源都有的指标列
+            column_sources: 指标列 -> 当前取值的数据源
+            new_source: 新关联的数据源
+        """
+        for column in columns:
+            drop_column = f"{column}{suffix}"
+            if drop_column not in merged_df.columns:
+                continue
+            existing_source = column_sources.get(column, new_source)
+            if existing_source == new_source:
+                merged_df[column] = merged_df[column].combine_first(merged_df[drop_column])
+                merged_df.drop(columns=[drop_column], inplace=True)
+                continue
+
+            existing, new = merged_df[column], merged_df[drop_column]
+            conflict = (existing.notna() & new.notna() & (existing != new)).to_numpy()
+            if self.wins(new_source, existing_source):
+                winner, loser = (new, new_source), (existing, existing_source)
+                column_sources[column] = new_source
+            else:
+                winner, loser = (existing, existing_source), (new, new_source)
+            if conflict.any():
+                self._append(
+                    merged_df.loc[conflict, "数据日期"],
+                    merged_df.loc[conflict, "机构名称"],
+                    column,
+                    winner[1][1],
+                    winner[0][conflict],
+                    loser[1][1],
+                    loser[0][conflict],
+                )
+            merged_df[column] = winner[0].combine_first(loser[0])
+            merged_df.drop(columns=[drop_column], inplace=True)
+        return merged_df
+
+    def _append(self, dates, orgs, indicator, kept_source, kept, dropped_source, dropped):
+        count = len(kept)
+        frame = pd.DataFrame(
+            {
+                "数据日期": np.asarray(dates) if dates is not None else [None] * count,
+                "机构名称": np.asarray(orgs) if orgs is not None else [None] * count,
+                "指标名称": indicator,
+                "采用来源": np.broadcast_to(np.asarray(kept_source, dtype=object), count),
+                "采用值": np.asarray(kept),
+                "舍弃来源": np.broadcast_to(np.asarray(dropped_source, dtype=object), count),
+                "舍弃值": np.asarray(dropped),
+            }
+        )
+        self._conflicts.append(frame)
+
+    def report(self) -> pd.DataFrame:
+        """冲突报告，没有冲突时为只有表头的空表"""
+        if not self._conflicts:
+            return pd.DataFrame(columns=CONFLICT_COLUMNS)
+        return pd.concat(self._conflicts, ignore_index=True)[CONFLICT_COLUMNS]
@@ -1,13 +1,40 @@
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
 import pandas as pd
 import numpy as np
 import logging
 from aa.data_loader.base_loader import BaseDataLoader
+from aa.data_loader.conflict_resolver import (
+    CONFLICT_COLUMNS,
+    CONFLICT_SHEET,
+    LAST_WINS,
+    ConflictResolver,
+)
+from aa.data_loader.derived_metrics import DerivedMetricEngine
+from aa.data_loader.layout_detector import (
+    LAYOUT_CACHE_FILE,
+    LayoutCache,
+    SheetLayout,
+    detect_layout,
+    is_auto_row,
+    is_block_end,
+)
+from aa.data_loader.metric_cube import MetricCube
+from aa.data_loader.metric_store import MetricStoreWriter
+from aa.data_loader.rollup import RollupBuilder
+from aa.data_loader.wind_export import WIND_TYPE, read_wind_export
+from aa.data_loader.xlsx_stream import StreamingXlsxWriter
 from aa.utils.config_parser import parse_data_extraction_config
+from aa.utils.dtype_coercion import coerce_frame, normalize_dtype
+from aa.utils.run_metrics import RunMetrics
 
 logger = logging.getLogger(__name__)
 
+# 分区方式 -> pandas周期频率
+PARTITION_FREQS = {"月": "M", "年": "Y"}
+# 沿用缓存的数据区域时，在缓存的end_row之后多读取的行数，用于容纳新增的机构
+LAYOUT_LOOKAHEAD_ROWS = 20
+
 class DataPreprocessor(BaseDataLoader):
     """数据预处理模块，支持新旧两种配置格式"""
 
@@ -16,6 +43,11 @@ class DataPreprocessor(BaseDataLoader):
         data_extraction_config_file: Union[str, Path] = "config/data_extraction_config.xlsx",
         raw_data_dir: Union[str, Path] = "data/raw",
         data_output_dir: Union[str, Path] = "data/processed",
+        export_metric_cube: bool = True,
+        store_format: str = "xlsx",
+        partition_by: Optional[str] = None,
+        conflict_policy: str = LAST_WINS,
+        metrics: Optional[RunMetrics] = None,
     ):
         """
         初始化数据预处理器
@@ -24,21 +56,46 @@ class DataPreprocessor(BaseDataLoader):
             data_extraction_config_file: 数据提取配置文件路径
             raw_data_dir: 原始数据目录
             data_output_dir: 输出数据目录
+            export_metric_cube: 是否导出内存映射的指标立方体，供报告生成时零拷贝读取
+            store_format: 预处理结果的存储格式，xlsx 或 sqlite（写入SQLite指标库，适用于超出内存的历史数据）
+            partition_by: 分区处理方式，月 或 年，按分区逐个合并、转置并追加写入，默认一次性处理全部数据
+            conflict_policy: 重复数据的冲突策略，后者覆盖（默认）或 配置顺序（multi_sheet_df中靠前的数据源优先）
+            metrics: 运行指标，记录读取的文件数、行数和各阶段耗时
         """
         super().__init__()
+        self.metrics = metrics if metrics is not None else RunMetrics()
         self.data_extraction_config_file = Path(data_extraction_config_file)
         self.raw_data_dir = Path(raw_data_dir)
         self.data_output_dir = Path(data_output_dir)
-        self.data_output_file = self.data_output_dir / "data_preprocessed.xlsx"
+        if store_format not in ("xlsx", "sqlite"):
+            raise ValueError(f"不支持的存储格式：{store_format}")
+        self.store_format = store_format
+        if partition_by is not None and partition_by not in PARTITION_FREQS:
+            raise ValueError(f"不支持的分区方式：{partition_by}")
+        self.partition_by = partition_by
+        self.data_output_file = self.data_output_dir / f"data_preprocessed.{store_format}"
+        self.export_metric_cube = export_metric_cube
         self.data_output_dir.mkdir(parents=True, exist_ok=True)
 
         self.data_config_df_dict = parse_data_extraction_config(self.data_extraction_config_file)
+        # 保证 (数据日期, 机构名称, 指标名称) 唯一，冲突记录随预处理结果输出
+        self.conflict_resolver = ConflictResolver(conflict_policy)
+        # 数据源：result_dict的键 -> (在multi_sheet_df中的序号, 名称)，合并同名指标时按冲突策略取舍
+        self.sources = {}
+        # 手工表start_row、end_row需自动识别时，已识别的报表版式及其数据区域
+        self.layout_cache = LayoutCache(self.data_output_dir / LAYOUT_CACHE_FILE)
+        # 衍生指标公式只解析一次，各分区共用
+        self.derived_metric_engine = DerivedMetricEngine.from_config(
+            self.data_config_df_dict.get("衍生指标")
+        )
 
     def load(self, config: dict = None) -> dict:
         """主处理入口"""
         try:
-            df_dict = self.process_multi_sheets()
-            self._save_output(df_dict)
+            with self.metrics.stage("读取原始数据"):
+                df_dict = self.process_multi_sheets()
+            with self.metrics.stage("合并写出"):
+                self._save_output(df_dict)
             return {
                 "status": "success",
                 "record_count": len(df_dict),
@@ -66,8 +123,9 @@ class DataPreprocessor(BaseDataLoader):
             "multi_sheet_df", sort=False
         ):
             merged_dfs = []
+            row_sources = []
 
-            for _, row in group.iterrows():
+            for position, row in group.iterrows():
                 # 获取字段定义
                 field_defs = single_config[
                     single_config["single_sheet_df"] == row["single_sheet_df"]
@@ -83,6 +141,10 @@ class DataPreprocessor(BaseDataLoader):
                 col_mapping = {
                     f["field"]: f["column_index"] for _, f in field_defs.iterrows()
                 }
+                dtype_mapping = {
+                    f["field"]: normalize_dtype(f["dtype"], f["type"])
+                    for _, f in field_defs.iterrows()
+                }
 
                 # 加载数据
                 file_path = self.raw_data_dir / f"{row['file_name']}"
@@ -90,23 +152,44 @@ class DataPreprocessor(BaseDataLoader):
                     logger.warning("文件不存在: %s", file_path)
                     continue
 
-                df = self._load_sheet_data(
-                    file_path=file_path,
-                    sheet_name=row["sheet_name"],
-                    col_mapping=col_mapping,
-                    start_row=row["start_row"],
-                    end_row=row["end_row"],
-                )
+                if is_auto_row(row["start_row"]) or is_auto_row(row["end_row"]):
+                    df = self._load_detected_sheet_data(
+                        file_path=file_path,
+                        sheet_name=row["sheet_name"],
+                        col_mapping=col_mapping,
+                        dtype_mapping=dtype_mapping,
+                        start_row=row["start_row"],
+                        end_row=row["end_row"],
+                    )
+                else:
+                    df = self._load_sheet_data(
+                        file_path=file_path,
+                        sheet_name=row["sheet_name"],
+                        col_mapping=col_mapping,
+                        dtype_mapping=dtype_mapping,
+                        start_row=row["start_row"],
+                        end_row=row["end_row"],
+                    )
                 if not df.empty:
                     merged_dfs.append(df)
+                    row_sources.extend(
+                        [(position, f"{row['file_name']}[{row['sheet_name']}]")] * len(df)
+                    )
 
             if merged_dfs:
-                result_dict[group_name] = pd.concat(merged_dfs).reset_index(drop=True)
+                # 同一组的多个sheet中重复的 (数据日期, 机构名称) 按冲突策略合并
+                result_dict[group_name] = self.conflict_resolver.dedupe(
+                    pd.concat(merged_dfs).reset_index(drop=True),
+                    ["数据日期", "机构名称"],
+                    row_sources,
+                )
+                self.sources[group_name] = (group.index.min(), str(group_name))
+        self.layout_cache.save()
 
         # 2.继续处理 type == "standard" 的配置
         standard_multi_sheet_df = multi_config[multi_config["type"] == "standard"]
 
-        for _, row in standard_multi_sheet_df.iterrows():
+        for position, row in standard_multi_sheet_df.iterrows():
             try:
                 # 直接读取配置字段
                 file_name = row['file_name']
@@ -124,15 +207,61 @@ class DataPreprocessor(BaseDataLoader):
                     file_path,
                     sheet_name=sheet_name
                 )
+                self.metrics.inc("files_read_total")
+                self.metrics.inc("rows_ingested_total", len(df), source=f"{file_name}[{sheet_name}]")
 
                 df = self._clean_org_column(df)
 
+                # 标准表的指标列统一按数值类型读取，错误单元格在此一次性报告
+                dtype_mapping = {
+                    col: "float" for col in df.columns if col not in ("数据日期", "机构名称")
+                }
+                dtype_mapping["数据日期"] = "datetime"
+                df = coerce_frame(df, dtype_mapping, source=f"{file_name}[{sheet_name}]")
+
+                # 计划值按年份关联，每个机构每年只保留一条
+                keys = ["数据日期", "机构名称"]
+                if sheet_name == "计划值":
+                    df["_年份"] = df["数据日期"].dt.year
+                    keys = ["_年份", "机构名称"]
+                source = (position, f"{file_name}[{sheet_name}]")
+                df = self.conflict_resolver.dedupe(df, keys, [source] * len(df))
+                df = df.drop(columns=["_年份"], errors="ignore")
+
                 # 存储结果
                 result_dict["ALL_DT_"+sheet_name] = df
+                self.sources["ALL_DT_"+sheet_name] = source
 
             except Exception as e:
                 logger.error("处理standard配置[%s]失败: %s", sheet_name, str(e))
 
+        # 3.最后处理 type == "wind" 的配置（Wind宽表导出，表头为 指标/[单位]/[报告期]/[报表类型]）
+        wind_multi_sheet_df = multi_config[multi_config["type"] == WIND_TYPE]
+
+        for position, row in wind_multi_sheet_df.iterrows():
+            try:
+                file_name = row['file_name']
+                sheet_name = row['sheet_name']
+                file_path = self.raw_data_dir / f"{file_name}"
+
+                if not file_path.exists():
+                    logger.warning("文件不存在: %s", file_path)
+                    continue
+
+                df = read_wind_export(file_path, sheet_name)
+                self.metrics.inc("files_read_total")
+                self.metrics.inc("rows_ingested_total", len(df), source=f"{file_name}[{sheet_name}]")
+
+                df = self._clean_org_column(df)
+                source = (position, f"{file_name}[{sheet_name}]")
+                df = self.conflict_resolver.dedupe(df, ["数据日期", "机构名称"], [source] * len(df))
+
+                result_dict["ALL_DT_"+sheet_name] = df
+                self.sources["ALL_DT_"+sheet_name] = source
+
+            except Exception as e:
+                logger.error("处理wind配置[%s]失败: %s", sheet_name, str(e))
+
         return result_dict
 
     def _load_sheet_data(
@@ -142,8 +271,14 @@ class DataPreprocessor(BaseDataLoader):
         col_mapping: dict,
         start_row: int,
         end_row: int,
+        dtype_mapping: Optional[dict] = None,
+        key_field: Optional[str] = None,
     ) -> pd.DataFrame:
-        """加载单个sheet数据"""
+        """
+        加载单个sheet数据，并按single_sheet_df配置的dtype转换字段类型
+
+        指定key_field时（自动识别的数据区域），在该字段第一个空值或合计、总计行处截断。
+        """
         try:
             # 转换列字母为索引
             indices_lst = [self._col_to_index(c) for c in col_mapping.values()]
@@ -157,23 +292,94 @@ class DataPreprocessor(BaseDataLoader):
                 skiprows=start_row - 1,
                 nrows=end_row - start_row + 1,
             )
+            self.metrics.inc("files_read_total")
+            self.metrics.inc("rows_ingested_total", len(df), source=f"{file_path.name}[{sheet_name}]")
 
             # 从文件名解析数据日期（格式：XXXYYYY-MM-DD.xlsx XXX可以是任意字符，文件必须以YYYY-MM-DD结尾，必须按次格式，否则无法识别数据日期）
             # date_str = file_path.stem.replace("月报", "")
             date_part = file_path.stem.split(".")[0][-10:]
             df.columns = list(col_mapping.keys())
+            if key_field is not None:
+                block_end = df[key_field].map(is_block_end).to_numpy(dtype=bool)
+                if block_end.any():
+                    df = df.iloc[: int(block_end.argmax())].copy()
             df["数据日期"] = pd.to_datetime(date_part, format="%Y-%m-%d")
             # 使用 pop() 方法移除 'A' 列
             a_column = df.pop("数据日期")
             # 将 'A' 列添加到 DataFrame 的第一列
             df.insert(0, "数据日期", a_column)
             df = self._clean_org_column(df)
+            if dtype_mapping:
+                df = coerce_frame(df, dtype_mapping, source=f"{file_path.name}[{sheet_name}]")
             return df
 
         except Exception as e:
             logger.error("加载{file_path}失败: %s", {str(e)})
             return pd.DataFrame()
 
+    def _load_detected_sheet_data(
+        self,
+        file_path: Path,
+        sheet_name: str,
+        col_mapping: dict,
+        start_row,
+        end_row,
+        dtype_mapping: Optional[dict] = None,
+    ) -> pd.DataFrame:
+        """
+        start_row或end_row需自动识别时加载手工表
+
+        表头版式与已缓存的版式一致时，沿用缓存的start_row，读取到缓存的end_row之后若干行并在关键列处截断；
+        否则（或截断后仍未到数据区域末尾）流式扫描关键列识别数据区域，并缓存该版式。
+        """
+        key_field = "机构名称" if "机构名称" in col_mapping else next(iter(col_mapping))
+        key_column = self._excel_column_number(col_mapping[key_field]) - 1
+        fixed_start = None if is_auto_row(start_row) else int(start_row)
+        fixed_end = None if is_auto_row(end_row) else int(end_row)
+        source = f"{file_path.name}[{sheet_name}]"
+
+        try:
+            layout = self.layout_cache.match(file_path, sheet_name)
+            if layout is not None and fixed_start in (None, layout.start_row):
+                self.metrics.inc("layout_detections_total", result="hit")
+                window_end = fixed_end or layout.end_row + LAYOUT_LOOKAHEAD_ROWS
+                df = self._load_sheet_data(
+                    file_path=file_path,
+                    sheet_name=sheet_name,
+                    col_mapping=col_mapping,
+                    dtype_mapping=dtype_mapping,
+                    start_row=layout.start_row,
+                    end_row=window_end,
+                    key_field=None if fixed_end else key_field,
+                )
+                if df.empty or fixed_end or len(df) < window_end - layout.start_row + 1:
+                    new_end = layout.start_row + len(df) - 1
+                    if not df.empty and not fixed_end and new_end != layout.end_row:
+                        self.layout_cache.remember(
+                            sheet_name,
+                            SheetLayout(layout.fingerprint, layout.header_rows, layout.start_row, new_end),
+                        )
+                    logger.info("%s 沿用已缓存的版式，数据区域：第%s行起%s行", source, layout.start_row, len(df))
+                    return df
+                logger.info("%s 数据超出缓存的数据区域，重新识别", source)
+
+            self.metrics.inc("layout_detections_total", result="miss")
+            layout = detect_layout(file_path, sheet_name, key_column, key_field, fixed_start)
+        except Exception as e:
+            logger.error("识别%s的数据区域失败: %s", source, str(e))
+            return pd.DataFrame()
+
+        self.layout_cache.remember(sheet_name, layout)
+        logger.info("%s 识别到数据区域：第%s-%s行", source, layout.start_row, layout.end_row)
+        return self._load_sheet_data(
+            file_path=file_path,
+            sheet_name=sheet_name,
+            col_mapping=col_mapping,
+            dtype_mapping=dtype_mapping,
+            start_row=layout.start_row,
+            end_row=fixed_end or layout.end_row,
+        )
+
     def _clean_org_column(self, df:pd.DataFrame) -> pd.DataFrame:
         """清洗机构名称字段"""
         if "机构名称" in df.columns:
@@ -206,102 +412,234 @@ class DataPreprocessor(BaseDataLoader):
         return num
 
     def _save_output(self, data_dict: dict):
-        """保存结果到Excel"""
-        # pylint: disable=abstract-class-instantiated
-        # 使用openpyxl引擎时ExcelWriter需要忽略抽象类实例化警告
-        groups_config = self.data_config_df_dict["机构分组"]
-        with pd.ExcelWriter(self.data_output_file, engine="openpyxl", mode="w") as writer:  # type: ignore[abstract]
-            # 保存原始各sheet数据
-            for sheet_name, df in data_dict.items():
-                df.to_excel(writer, sheet_name=sheet_name[:31], index=False)
-
-            # 合并所有DataFrame并保存到ALL_DATA页
-            if data_dict:
-                # 初始化合并基准
-                merged_df = next(iter(data_dict.values()))
-
-                # 逐个合并剩余DataFrame
-                for key, df in data_dict.items():
-                    logger.info("合并sheet，处理df: %s", key)
-                    if key == "ALL_DT_计划值":
-                        # 提取年份列用于合并
-                        merged_df["年份"] = merged_df["数据日期"].dt.year
-                        df_copy = df.copy()
-                        df_copy["年份"] = df_copy["数据日期"].dt.year
-
-                        # 使用年份和机构名称作为合并条件
-                        merged_df = pd.merge(
-                            merged_df,
-                            df_copy,
-                            on=["年份", "机构名称"],
-                            how="outer",
-                            suffixes=("", "_DROP"),
-                        )
-                        # 合并后删除临时年份列
-                        if "年份" in merged_df.columns:
-                            merged_df.drop(columns=["年份"], inplace=True)
-                    else:
-                        merged_df = pd.merge(
-                            merged_df,
-                            df,
-                            on=["数据日期", "机构名称"],
-                            how="outer",
-                            suffixes=("", "_DROP"),
+        """保存结果到Excel，或按store_format写入SQLite指标库"""
+        if not data_dict:
+            # 不写出空的数据文件，避免报告生成时才发现缺少ALL_DATA页
+            raise ValueError("未读取到任何数据，请检查multi_sheet_df的switch配置和原始数据文件")
+        merged_df = None
+        # 配置了“指标聚合”页时，随合并过程累积季度、年度汇总
+        rollup_builder = RollupBuilder.from_config(self.data_config_df_dict.get("指标聚合"))
+        if self.store_format == "sqlite":
+            with MetricStoreWriter(self.data_output_file) as store_writer:
+                for merged_df in self._iter_merged(data_dict):
+                    store_writer.append(self._melt(merged_df))
+                    if rollup_builder is not None:
+                        rollup_builder.add(merged_df)
+                if rollup_builder is not None:
+                    store_writer.write_rollups(rollup_builder.result())
+                store_writer.write_conflicts(
+                    self._conflict_report(), self.conflict_resolver.policy
+                )
+        else:
+            # 只写模式流式写入，sheet超过Excel行数上限时自动续写到 名称_2、名称_3 …
+            with StreamingXlsxWriter(self.data_output_file) as writer:
+                # 保存原始各sheet数据
+                for sheet_name, df in data_dict.items():
+                    writer.write_sheet(sheet_name, [df])
+
+                # 合并所有DataFrame并保存到ALL_DATA页，分区模式下逐个分区追加
+                wide_sheet = melted_sheet = None
+                for merged_df in self._iter_merged(data_dict):
+                    if wide_sheet is None:
+                        wide_sheet = writer.sheet("ALL_DATA", merged_df.columns)
+                        melted_sheet = writer.sheet(
+                            "ALL_DATA_MELTED", ["数据日期", "机构分组", "机构名称", "指标名称", "指标值"]
                         )
+                    # 保存合并后的宽表
+                    wide_sheet.append(merged_df)
+                    # 保存合并结果
+                    melted_sheet.append(self._melt(merged_df))
+                    if rollup_builder is not None:
+                        rollup_builder.add(merged_df)
+
+                # 保存季度、年度汇总
+                if rollup_builder is not None:
+                    writer.write_sheet("ALL_DATA_ROLLUP", [rollup_builder.result()])
+
+                # 保存冲突报告，该页存在即表示预处理结果已保证唯一
+                writer.write_sheet(
+                    CONFLICT_SHEET, [self._conflict_report()], columns=CONFLICT_COLUMNS
+                )
 
-                # 合并同名指标列
-                merged_df = self._merge_drop_columns(merged_df)
-
-                # 验收计划完成率指标
-                merged_df = self._calculate_acceptance_rate(merged_df)
+        # 导出指标立方体，在数据文件写完之后导出，保证立方体不早于预处理数据文件
+        if self.export_metric_cube and merged_df is not None:
+            if self.partition_by is None:
+                MetricCube.write(merged_df, self.data_output_dir, self.data_output_file)
+            else:
+                logger.info("分区处理模式下不导出指标立方体")
 
-                # 去除重复列
-                merged_df = merged_df.loc[
-                    :, ~merged_df.columns.str.endswith("_DROP")
-                ]
+    def _iter_merged(self, data_dict: dict) -> Iterator[pd.DataFrame]:
+        """
+        逐个分区返回合并后的宽表，未设置partition_by时一次性返回全部数据
 
-                # 关联 分组配置df
+        不同数据日期的数据互不关联，只有计划值按年份关联，因此按月或按年分区合并、
+        计算完成率和转置，内存峰值取决于最大的分区而非全部历史。
+        """
+        if self.partition_by is None:
+            yield self._merge_sheets(data_dict)
+            return
+
+        freq = PARTITION_FREQS[self.partition_by]
+        periods = sorted(
+            set().union(
+                *(df["数据日期"].dt.to_period(freq).dropna().unique() for df in data_dict.values())
+            )
+        )
+        # 有实际数据的 (年份, 机构)；这些机构在某月缺数时，不应出现只有计划值的行
+        actual_keys = set()
+        for key, df in data_dict.items():
+            if key != "ALL_DT_计划值":
+                actual_keys.update(zip(df["数据日期"].dt.year, df["机构名称"]))
+
+        for period in periods:
+            part_dict = {}
+            for key, df in data_dict.items():
+                if key == "ALL_DT_计划值":
+                    # 计划值按年份关联，分区内取当年的全部计划值
+                    part_dict[key] = df[df["数据日期"].dt.year == period.year]
+                else:
+                    part_dict[key] = df[df["数据日期"].dt.to_period(freq) == period]
+            logger.info("分区合并：%s", period)
+            merged_df = self._merge_sheets(part_dict)
+
+            if freq == "M":
+                # 计划值按整年关联，只保留本月的行，并去除有实际数据机构的纯计划值行
+                in_period = merged_df["数据日期"].dt.to_period(freq) == period
+                part_orgs = set().union(
+                    *(df["机构名称"] for key, df in part_dict.items() if key != "ALL_DT_计划值")
+                )
+                plan_only = ~merged_df["机构名称"].isin(part_orgs) & pd.MultiIndex.from_arrays(
+                    [merged_df["数据日期"].dt.year, merged_df["机构名称"]]
+                ).isin(list(actual_keys))
+                merged_df = merged_df[in_period & ~plan_only].reset_index(drop=True)
+            yield merged_df
+
+    def _merge_sheets(self, data_dict: dict) -> pd.DataFrame:
+        """合并各sheet数据为宽表，计算计划完成率并关联机构分组"""
+        groups_config = self.data_config_df_dict["机构分组"]
+        if groups_config["机构名称"].duplicated().any():
+            logger.warning("机构分组配置中存在重复的机构名称，保留最后一条")
+            groups_config = groups_config.drop_duplicates(subset=["机构名称"], keep="last")
+
+        # 初始化合并基准
+        first_key, merged_df = next(iter(data_dict.items()))
+        # 指标列 -> 当前取值的数据源
+        column_sources = {col: self._source(first_key) for col in merged_df.columns}
+
+        # 逐个合并剩余DataFrame
+        for key, df in data_dict.items():
+            logger.info("合并sheet，处理df: %s", key)
+            if key == "ALL_DT_计划值":
+                # 提取年份列用于合并
+                merged_df["年份"] = merged_df["数据日期"].dt.year
+                df_copy = df.copy()
+                df_copy["年份"] = df_copy["数据日期"].dt.year
+
+                # 使用年份和机构名称作为合并条件
                 merged_df = pd.merge(
                     merged_df,
-                    groups_config,
-                    on="机构名称",
-                    how="left",
+                    df_copy,
+                    on=["年份", "机构名称"],
+                    how="outer",
                     suffixes=("", "_DROP"),
                 )
-
-                # 去除重复的机构名称列
-                merged_df = merged_df.loc[:, ~merged_df.columns.str.endswith("_DROP")]
-
-                # 调整列顺序
-                base_columns = ["数据日期", "机构分组", "机构名称"]
-                other_columns = [
-                    col for col in merged_df.columns if col not in base_columns
-                ]
-                merged_df = merged_df.reindex(columns=base_columns + other_columns)
-
-                # 保存合并后的宽表
-                merged_df.to_excel(writer, sheet_name="ALL_DATA", index=False)
-
-                # 转换窄表格式
-                id_vars = ["数据日期", "机构分组", "机构名称"]
-                measure_columns = [
-                    col for col in merged_df.columns if col not in id_vars
+                # 合并后删除临时年份列
+                if "年份" in merged_df.columns:
+                    merged_df.drop(columns=["年份"], inplace=True)
+            else:
+                shared_columns = [
+                    col for col in df.columns
+                    if col in merged_df.columns and col not in ("数据日期", "机构名称")
                 ]
-
-                melted_df = merged_df.melt(
-                    id_vars=id_vars,
-                    value_vars=measure_columns,
-                    var_name="指标名称",
-                    value_name="指标值",
-                ).dropna(subset=["指标值"])
-
-                # 按日期和机构名称排序
-                final_df = melted_df.sort_values(
-                    ["数据日期", "机构分组", "机构名称", "指标名称"]
-                ).reset_index(drop=True)
-
-                # 保存合并结果
-                final_df.to_excel(writer, sheet_name="ALL_DATA_MELTED", index=False)
+                merged_df = pd.merge(
+                    merged_df,
+                    df,
+                    on=["数据日期", "机构名称"],
+                    how="outer",
+                    suffixes=("", "_DROP"),
+                )
+                # 不同数据源中的同名指标按冲突策略取舍
+                source = self._source(key)
+                merged_df = self.conflict_resolver.combine(
+                    merged_df, shared_columns, column_sources, source
+                )
+                for col in df.columns:
+                    column_sources.setdefault(col, source)
+
+        # 合并同名指标列
+        merged_df = self._merge_drop_columns(merged_df)
+
+        # 验收计划完成率指标
+        merged_df = self._calculate_acceptance_rate(merged_df)
+
+        # 去除重复列
+        merged_df = merged_df.loc[
+            :, ~merged_df.columns.str.endswith("_DROP")
+        ]
+
+        # 计算衍生指标
+        merged_df = self._derive_metrics(merged_df)
+
+        # 关联 分组配置df
+        merged_df = pd.merge(
+            merged_df,
+            groups_config,
+            on="机构名称",
+            how="left",
+            suffixes=("", "_DROP"),
+        )
+
+        # 去除重复的机构名称列
+        merged_df = merged_df.loc[:, ~merged_df.columns.str.endswith("_DROP")]
+
+        # 未在机构分组中配置的机构不参与组内排名，记录到运行指标
+        unmatched = merged_df.loc[merged_df["机构分组"].isna(), "机构名称"].dropna().unique()
+        if len(unmatched):
+            logger.warning("以下机构未在机构分组中配置：%s", "、".join(map(str, unmatched)))
+            self.metrics.add_unmatched_orgs(unmatched)
+
+        # 调整列顺序
+        base_columns = ["数据日期", "机构分组", "机构名称"]
+        other_columns = [
+            col for col in merged_df.columns if col not in base_columns
+        ]
+        return merged_df.reindex(columns=base_columns + other_columns)
+
+    def _conflict_report(self) -> pd.DataFrame:
+        """冲突报告，有冲突时在日志中汇总"""
+        report = self.conflict_resolver.report()
+        if not report.empty:
+            logger.warning(
+                "数据冲突：%s处取值不同，已按“%s”处理，明细见%s",
+                len(report),
+                self.conflict_resolver.policy,
+                CONFLICT_SHEET,
+            )
+        return report
+
+    def _source(self, key: str) -> tuple:
+        """result_dict中数据的数据源，未登记的按读取顺序排在最后"""
+        return self.sources.get(key, (float("inf"), str(key)))
+
+    def _melt(self, merged_df: pd.DataFrame) -> pd.DataFrame:
+        """将宽表转换为按日期、机构排序的窄表"""
+        # 转换窄表格式
+        id_vars = ["数据日期", "机构分组", "机构名称"]
+        measure_columns = [
+            col for col in merged_df.columns if col not in id_vars
+        ]
+
+        melted_df = merged_df.melt(
+            id_vars=id_vars,
+            value_vars=measure_columns,
+            var_name="指标名称",
+            value_name="指标值",
+        ).dropna(subset=["指标值"])
+
+        # 按日期和机构名称排序
+        return melted_df.sort_values(
+            ["数据日期", "机构分组", "机构名称", "指标名称"]
+        ).reset_index(drop=True)
 
     def _merge_drop_columns(self, df, drop_drop_cols=True, inplace=False):
         """
@@ -346,40 +684,18 @@ class DataPreprocessor(BaseDataLoader):
         return df
 
     def _derive_metrics(self, df: pd.DataFrame) -> pd.DataFrame:
-        """指标衍生函数占位实现
+        """
+        按“衍生指标”配置页的公式计算衍生指标
+
+        衍生指标作为宽表的新列参与转置、汇总和导出，报告生成时与原始指标一样可被各算子引用
         Args:
-            df: 需要衍生指标的数据框
-            新增逻辑：
-            1. 检查A/B列是否存在
-            2. 处理除零异常
-            3. 处理缺失值
-            4. 添加异常处理机制
+            df: 合并后的宽表
         Returns:
             添加衍生指标后的数据框
         """
-        try:
-            # 检查必要列是否存在
-            if "A" not in df.columns or "B" not in df.columns:
-                missing_cols = [col for col in ["A", "B"] if col not in df.columns]
-                raise ValueError(f"缺失必要列: {', '.join(missing_cols)}")
-
-            # 转换数据类型为数值型
-            df[["A", "B"]] = df[["A", "B"]].apply(pd.to_numeric, errors="coerce")
-
-            # 处理除零和无效值
-            with np.errstate(divide="ignore", invalid="ignore"):
-                c_values = np.divide(df["A"], df["B"])
-
-            # 处理异常情况
-            c_values = np.where(
-                (df["B"] == 0) | (df["A"].isna()) | (df["B"].isna()), np.nan, c_values
-            )
-
-            df["C"] = c_values
-        except Exception as e:
-            logger.error("指标衍生失败: %s", str(e))
-
-        return df
+        if self.derived_metric_engine is None:
+            return df
+        return self.derived_metric_engine.evaluate(df)
 
     def _calculate_acceptance_rate(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -410,10 +726,7 @@ class DataPreprocessor(BaseDataLoader):
 
                 # 检查是否存在对应的实际值列
                 if base_name in result_df.columns:
-                    # 将列转换为数值类型
-                    result_df[base_name] = pd.to_numeric(result_df[base_name], errors='coerce')
-                    result_df[plan_col] = pd.to_numeric(result_df[plan_col], errors='coerce')
-
+                    # 实际值与计划值在读取时已按dtype转换为数值类型，此处无需再次转换
                     # 1. 计算普通计划完成率（实际值/计划值）
                     with np.errstate(divide='ignore', invalid='ignore'):
                         completion_rate = np.divide(result_df[base_name], result_df[plan_col])
@@ -437,7 +750,7 @@ class DataPreprocessor(BaseDataLoader):
                         result_df["_temp_cum_actual"] = result_df[base_name]
 
                         # 计算月份数并根据月份数调整计划值
-                        result_df["_temp_month"] = pd.to_datetime(result_df["数据日期"]).dt.month
+                        result_df["_temp_month"] = result_df["数据日期"].dt.month
 
                         # 计算应完成的计划值：计划值/12*当前月份数
                         result_df["_temp_cum_plan"] = result_df[plan_col] / 12 * result_df["_temp_month"]
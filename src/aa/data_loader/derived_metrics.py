@@ -0,0 +1,191 @@
+"""衍生指标模块
+
+根据数据预处理配置中的“衍生指标”页，用公式从已有指标计算新指标，例如：
+    客单价 = 销售额（万元） * 10000 / 客户数
+    人均产能 = [营收] / [员工人数]
+
+- 公式在预处理开始时解析一次，得到表达式树；衍生指标之间可以互相引用，按依赖关系排序后依次计算；
+- 计算在宽表上按列向量化进行，多个公式中相同的子表达式只计算一次；
+- 除数为0、任一操作数为空值时结果统一为空值（NaN）。
+
+公式支持 + - * / 、括号和数字；指标名称可以直接书写，
+名称中含有运算符、半角括号或空格时用方括号括起，如 [营收(万元)]。
+"""
+import ast
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 指标名称：方括号括起的任意名称，或不以数字开头、不含运算符和空白的连续字符
+_NAME_PATTERN = re.compile(r"\[([^\]]+)\]|([^\s+\-*/()\[\]0-9.][^\s+\-*/()\[\]]*)")
+
+_BINARY_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+# 满足交换律的运算，规范化操作数顺序，使 a*b 与 b*a 视为同一子表达式
+_COMMUTATIVE = {"+", "*"}
+
+
+def parse_formula(expression: str) -> Tuple[tuple, List[str]]:
+    """
+    将公式解析为表达式树
+
+    表达式树的节点为元组：("col", 指标名称)、("num", 数值)、("neg", 子节点)、(运算符, 左节点, 右节点)，
+    相同的子表达式得到相同的元组，可直接作为缓存键。
+
+    Returns:
+        (表达式树, 引用的指标名称列表)
+
+    Raises:
+        ValueError: 公式包含不支持的写法时
+    """
+    names: List[str] = []
+
+    def placeholder(matched: re.Match) -> str:
+        names.append((matched.group(1) or matched.group(2)).strip())
+        return f"_v{len(names) - 1}"
+
+    code = _NAME_PATTERN.sub(placeholder, str(expression))
+    try:
+        tree = ast.parse(code, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"公式语法错误：{expression}") from e
+
+    def convert(node) -> tuple:
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            op = _BINARY_OPERATORS[type(node.op)]
+            left, right = convert(node.left), convert(node.right)
+            if op in _COMMUTATIVE and repr(right) < repr(left):
+                left, right = right, left
+            return (op, left, right)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return ("neg", convert(node.operand))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd):
+            return convert(node.operand)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return ("num", float(node.value))
+        if isinstance(node, ast.Name) and re.fullmatch(r"_v\d+", node.id):
+            return ("col", names[int(node.id[2:])])
+        raise ValueError(f"公式中包含不支持的写法：{expression}")
+
+    return convert(tree.body), sorted(set(names))
+
+
+@dataclass(frozen=True)
+class Formula:
+    """一个衍生指标的公式"""
+
+    name: str
+    expression: str
+    tree: tuple
+    dependencies: Tuple[str, ...]
+
+
+class DerivedMetricEngine:
+    """衍生指标计算引擎"""
+
+    def __init__(self, formulas: Dict[str, str]):
+        """
+        Args:
+            formulas: 衍生指标名称 -> 公式
+        """
+        parsed: Dict[str, Formula] = {}
+        for name, expression in formulas.items():
+            try:
+                tree, dependencies = parse_formula(expression)
+            except ValueError as e:
+                logger.error("衍生指标公式解析失败：%s，%s", name, e)
+                continue
+            if name in dependencies:
+                logger.error("衍生指标公式引用了自身：%s = %s", name, expression)
+                continue
+            parsed[name] = Formula(name, str(expression), tree, tuple(dependencies))
+        self.formulas = self._topological_order(parsed)
+
+    @classmethod
+    def from_config(cls, config_df: Optional[pd.DataFrame]) -> Optional["DerivedMetricEngine"]:
+        """根据“衍生指标”配置页（指标名称、公式）创建引擎，未配置时返回None"""
+        if config_df is None or "指标名称" not in config_df.columns or "公式" not in config_df.columns:
+            return None
+        formulas = {
+            str(row["指标名称"]).strip(): str(row["公式"]).strip()
+            for _, row in config_df.iterrows()
+            if pd.notna(row["指标名称"]) and pd.notna(row["公式"])
+        }
+        if not formulas:
+            return None
+        engine = cls(formulas)
+        logger.info("已解析衍生指标公式：%s", [f.name for f in engine.formulas])
+        return engine
+
+    @staticmethod
+    def _topological_order(parsed: Dict[str, Formula]) -> List[Formula]:
+        """按依赖关系排序，被引用的衍生指标排在前面；存在循环引用的公式不计算"""
+        pending = {
+            name: {dep for dep in formula.dependencies if dep in parsed}
+            for name, formula in parsed.items()
+        }
+        ordered = []
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                logger.error("衍生指标公式存在循环引用：%s", sorted(pending))
+                break
+            for name in ready:
+                ordered.append(parsed[name])
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return ordered
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        在宽表上计算全部衍生指标，结果作为新列写入宽表
+
+        Args:
+            df: 宽表，每个指标一列
+
+        Returns:
+            添加衍生指标列后的宽表
+        """
+        cache: Dict[tuple, object] = {}
+
+        def calc(node: tuple):
+            if node in cache:
+                return cache[node]
+            kind = node[0]
+            if kind == "col":
+                value = pd.to_numeric(df[node[1]], errors="coerce").to_numpy(dtype="float64")
+            elif kind == "num":
+                value = node[1]
+            elif kind == "neg":
+                value = -calc(node[1])
+            else:
+                left, right = calc(node[1]), calc(node[2])
+                with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                    if kind == "+":
+                        value = left + right
+                    elif kind == "-":
+                        value = left - right
+                    elif kind == "*":
+                        value = left * right
+                    else:
+                        value = np.divide(left, right)
+            cache[node] = value
+            return value
+
+        for formula in self.formulas:
+            if formula.name in df.columns:
+                logger.warning("衍生指标与已有指标重名，未计算：%s", formula.name)
+                continue
+            missing = [dep for dep in formula.dependencies if dep not in df.columns]
+            if missing:
+                logger.warning("衍生指标%s引用的指标不存在：%s", formula.name, missing)
+                continue
+            values = np.broadcast_to(np.asarray(calc(formula.tree), dtype="float64"), (len(df),))
+            # 除数为0得到的无穷大与空值统一为NaN
+            df[formula.name] = np.where(np.isfinite(values), values, np.nan)
+        return df
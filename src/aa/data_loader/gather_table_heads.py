@@ -1,62 +1,175 @@
 """用于从Excel文件中提取表头信息的模块。
 
 该模块提供了从多个Excel文件中提取表头信息的功能，
-并将提取的表头信息汇总到一个新的Excel文件中。
+并将提取的表头信息汇总到一个新的Excel文件中，用于核对各期原始报表的表头、数据区域是否与配置一致。
+
+- 按multi_sheet_df的配置，每个原始文件只以只读模式打开一次，同一文件的多条配置共用；
+- 每个sheet只流式读取到所需的最后一行：前start_row行（表头及第一行数据）和end_row附近的几行；
+- 多个文件在进程池中并行读取，数百个月报文件的核对在数秒内完成。
 """
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from aa.utils.run_metrics import RunMetrics
 
 logger = logging.getLogger(__name__)
 
-def gather_table_heads():
-    # 读取配置文件
-    config_file = "/Users/chenxin/Dev/AA/config/data_extraction_config.xlsx"
-    config_df = pd.read_excel(config_file, sheet_name='multi_sheet_df')
-
-    # 初始化输出文件
-    output_file = "/Users/chenxin/Dev/AA/data/processed/table_heads.xlsx"
-    writer = pd.ExcelWriter(output_file, engine='openpyxl')
-
-    # 遍历每个sheet_name
-    for sheet_name in config_df['sheet_name'].unique():
-        sheet_df = config_df[config_df['sheet_name'] == sheet_name]
-
-        # 遍历每个file_name
-        for _, row in sheet_df.iterrows():
-            file_name = f"{row['file_name']}"
-            start_row = row['start_row']
-            end_row = row['end_row']
-
-            # 读取原始文件
-            input_file = f"/Users/chenxin/Dev/AA/data/raw/{file_name}"
-            wb = load_workbook(input_file)
-            ws = wb[sheet_name]
-
-            # 获取表头区域
-            header_rows = []
-            for i in range(1, start_row + 1):
-                header_rows.append([cell.value for cell in ws[i]])
-            for i in range(end_row-2, end_row + 1):
-                header_rows.append([cell.value for cell in ws[i]])
-
-            # 将表头写入输出文件
-            if sheet_name in writer.book.sheetnames:
-                output_ws = writer.book[sheet_name]
-                start_row = output_ws.max_row + 2  # 从新行开始，留空一行
-            else:
-                output_ws = writer.book.create_sheet(sheet_name)
-                start_row = 1
-
-            for row_idx, row_data in enumerate(header_rows):
-                for col_idx, value in enumerate(row_data):
-                    output_ws.cell(row=start_row+row_idx, column=col_idx+1, value=value)
-
-            # 添加空行
-            output_ws.append([])
-
-    # 保存输出文件
-    # writer.save(output_file)
-    writer.close()
-if __name__ == '__main__':
-    gather_table_heads()
+# end_row之前、之后各取的行数
+ROWS_BEFORE_END = 2
+ROWS_AFTER_END = 1
+
+
+def _config_int(value) -> int:
+    """start_row、end_row配置值，未配置时为-1"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def survey_rows(start_row: int, end_row: int) -> List[int]:
+    """
+    一条配置需要核对的行号（从1开始）
+
+    手工表取前start_row行和end_row前后几行；标准表（start_row、end_row为-1）只取表头行。
+    """
+    rows = list(range(1, start_row + 1)) if start_row > 0 else [1]
+    if end_row > 0:
+        rows.extend(range(max(end_row - ROWS_BEFORE_END, 1), end_row + ROWS_AFTER_END + 1))
+    return sorted(set(rows))
+
+
+def _read_file_rows(file_path: str, sheet_rows: Dict[str, List[int]]) -> Dict[str, Dict[int, list]]:
+    """
+    以只读模式打开一次文件，读取各sheet的指定行
+
+    Returns:
+        sheet名称 -> {行号: 单元格取值}；sheet不存在时为错误信息字符串
+    """
+    result = {}
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet_name, rows in sheet_rows.items():
+            if sheet_name not in workbook.sheetnames:
+                result[sheet_name] = f"sheet不存在：{sheet_name}"
+                continue
+            wanted = set(rows)
+            values = {}
+            # 只读模式按行流式解析，读到所需的最后一行即停止
+            for row_idx, row in enumerate(
+                workbook[sheet_name].iter_rows(max_row=max(rows), values_only=True), start=1
+            ):
+                if row_idx in wanted:
+                    values[row_idx] = list(row)
+            result[sheet_name] = values
+    finally:
+        workbook.close()
+    return result
+
+
+def _survey_file(task: Tuple[str, Dict[str, List[int]]]):
+    """进程池中执行的单个文件读取任务，出错时返回错误信息"""
+    file_path, sheet_rows = task
+    try:
+        return _read_file_rows(file_path, sheet_rows), None
+    except Exception as e:
+        return None, str(e)
+
+
+def gather_table_heads(
+    data_extraction_config_file: Union[str, Path],
+    raw_data_dir: Union[str, Path],
+    output_file: Union[str, Path],
+    workers: int = 1,
+    metrics: Optional[RunMetrics] = None,
+) -> dict:
+    """
+    汇总multi_sheet_df中各配置对应原始报表的表头和数据区域末尾
+
+    输出文件每个sheet_name一页，每条配置一段：首行为 文件名、start_row、end_row，
+    其后每行为 行号 + 原始单元格取值，段与段之间空一行。
+
+    Args:
+        data_extraction_config_file: 数据预处理配置文件
+        raw_data_dir: 原始数据文件夹
+        output_file: 输出文件
+        workers: 并行读取文件的进程数，默认按顺序读取
+        metrics: 运行指标，记录读取的文件数和耗时
+
+    Returns:
+        汇总结果，包括核对的配置数、文件数和读取失败的文件
+    """
+    raw_data_dir = Path(raw_data_dir)
+    metrics = metrics if metrics is not None else RunMetrics()
+    config_df = pd.read_excel(data_extraction_config_file, sheet_name="multi_sheet_df")
+
+    entries = []
+    file_tasks: Dict[str, Dict[str, List[int]]] = {}
+    for _, row in config_df.iterrows():
+        file_name = f"{row['file_name']}"
+        sheet_name = f"{row['sheet_name']}"
+        start_row, end_row = _config_int(row["start_row"]), _config_int(row["end_row"])
+        rows = survey_rows(start_row, end_row)
+        entries.append((file_name, sheet_name, start_row, end_row, rows))
+        file_path = raw_data_dir / file_name
+        if file_path.exists():
+            sheet_rows = file_tasks.setdefault(str(file_path), {})
+            sheet_rows[sheet_name] = sorted(set(sheet_rows.get(sheet_name, [])) | set(rows))
+
+    tasks = list(file_tasks.items())
+    with metrics.stage("表头核对"):
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                results = list(pool.map(_survey_file, tasks))
+        else:
+            results = [_survey_file(task) for task in tasks]
+    file_rows = {}
+    failed = {}
+    for (file_path, _), (rows, error) in zip(tasks, results):
+        metrics.inc("files_read_total")
+        if error is not None:
+            logger.error("读取文件失败：%s，%s", file_path, error)
+            failed[file_path] = error
+        else:
+            file_rows[file_path] = rows
+
+    # 按配置顺序写出，每个sheet_name一页
+    workbook = Workbook(write_only=True)
+    output_sheets = {}
+    for file_name, sheet_name, start_row, end_row, rows in entries:
+        if sheet_name not in output_sheets:
+            output_sheets[sheet_name] = workbook.create_sheet(sheet_name[:31])
+        else:
+            output_sheets[sheet_name].append([])
+        output_ws = output_sheets[sheet_name]
+        output_ws.append([file_name, f"start_row={start_row}", f"end_row={end_row}"])
+
+        file_path = str(raw_data_dir / file_name)
+        if file_path in failed:
+            output_ws.append([f"读取失败：{failed[file_path]}"])
+            continue
+        if file_path not in file_rows:
+            logger.warning("文件不存在: %s", file_path)
+            output_ws.append(["文件不存在"])
+            continue
+        sheet_values = file_rows[file_path][sheet_name]
+        if isinstance(sheet_values, str):
+            output_ws.append([sheet_values])
+            continue
+        for row_idx in rows:
+            output_ws.append([row_idx, *sheet_values.get(row_idx, [])])
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(output_file)
+    logger.info("表头核对结果已输出：%s（%s条配置，%s个文件）", output_file, len(entries), len(tasks))
+    return {
+        "status": "success" if not failed else "error",
+        "entry_count": len(entries),
+        "file_count": len(tasks),
+        "failed_files": failed,
+        "output_file": str(output_file),
+    }
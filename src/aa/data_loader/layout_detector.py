@@ -0,0 +1,199 @@
+"""
+手工表数据区域识别模块
+
+multi_sheet_df中手工表的start_row、end_row填 -1（或留空、填auto）时，数据预处理自动识别数据区域：
+- 以只读模式流式读取sheet，只检查关键列（通常为机构名称列）：关键列取值为表头名称（如“机构名称”）的行为表头行，
+  其后第一个非空行为start_row，遇到第一个空行或合计、总计行即停止，之前一行为end_row；
+- 表头行及以上各行的取值（数字统一替换后，报表日期等每月变化的内容不影响）计算版式指纹，
+  与识别出的数据区域一起缓存到输出目录的 layout_cache.json；
+- 新一期文件只读取表头部分计算指纹，与已缓存的版式一致时直接沿用缓存的数据区域，不再扫描，
+  读取数据时在关键列第一个空行或合计行处截断，每月机构数有增减也不需要修改配置。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+import pandas as pd
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+AUTO_ROW = "auto"
+LAYOUT_CACHE_FILE = "layout_cache.json"
+# 关键列中作为表头行的取值（关键字段名称之外）
+HEADER_LABELS = ("机构名称", "机构", "名称", "单位名称", "分支机构")
+# 关键列中包含这些关键字的行为合计行，数据区域到此结束
+TOTAL_KEYWORDS = ("合计", "总计")
+# 未找到表头行时最多扫描的行数
+MAX_HEADER_ROWS = 50
+# 每个sheet最多缓存的版式数
+MAX_LAYOUTS_PER_SHEET = 20
+
+
+@dataclass
+class SheetLayout:
+    """一种报表版式的数据区域"""
+
+    fingerprint: str
+    header_rows: int
+    start_row: int
+    end_row: int
+
+
+def is_auto_row(value) -> bool:
+    """start_row、end_row是否需要自动识别：留空、auto 或小于1"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return True
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ("", AUTO_ROW):
+            return True
+        value = text
+    try:
+        return int(value) < 1
+    except (TypeError, ValueError):
+        return True
+
+
+def is_block_end(value) -> bool:
+    """关键列取值是否表示数据区域结束：空值或合计、总计行"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return True
+    text = re.sub(r"\s", "", str(value))
+    return not text or any(keyword in text for keyword in TOTAL_KEYWORDS)
+
+
+def layout_fingerprint(rows: Iterable[Sequence]) -> str:
+    """表头各行取值的指纹，数字统一替换，去掉行尾空单元格"""
+    digest = hashlib.md5()
+    for row in rows:
+        cells = ["" if v is None else re.sub(r"\d+", "#", str(v).strip()) for v in row]
+        while cells and not cells[-1]:
+            cells.pop()
+        digest.update("\t".join(cells).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+def detect_layout(
+    file_path: Union[str, Path],
+    sheet_name: str,
+    key_column: int,
+    key_label: str,
+    start_row: Optional[int] = None,
+) -> SheetLayout:
+    """
+    流式扫描关键列，识别数据区域
+
+    Args:
+        file_path: 原始文件
+        sheet_name: sheet名称
+        key_column: 关键列序号（从0开始）
+        key_label: 关键字段名称，关键列取值与之相同的行为表头行
+        start_row: 已配置的start_row，指定时只识别end_row
+
+    Raises:
+        ValueError: 未识别到表头行或数据区域时
+    """
+    labels = {key_label, *HEADER_LABELS}
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        header_rows: List[Sequence] = []
+        header_row = start_row - 1 if start_row else None
+        first_row = start_row
+        end_row = None
+        for row_idx, row in enumerate(workbook[sheet_name].iter_rows(values_only=True), start=1):
+            key = row[key_column] if key_column < len(row) else None
+            if header_row is None:
+                header_rows.append(row)
+                if key is not None and re.sub(r"\s", "", str(key)) in labels:
+                    header_row = row_idx
+                elif row_idx >= MAX_HEADER_ROWS:
+                    break
+                continue
+            if row_idx <= header_row:
+                header_rows.append(row)
+                continue
+            if first_row is None:
+                # 表头行之后跳过空行（如多行表头）
+                if is_block_end(key):
+                    continue
+                first_row = row_idx
+            elif is_block_end(key):
+                break
+            end_row = row_idx
+    finally:
+        workbook.close()
+
+    if header_row is None:
+        raise ValueError(
+            f"{Path(file_path).name}[{sheet_name}] 前{MAX_HEADER_ROWS}行的关键列中未找到表头行（{key_label}），"
+            "请在multi_sheet_df中配置start_row、end_row"
+        )
+    if first_row is None or end_row is None or end_row < first_row:
+        raise ValueError(f"{Path(file_path).name}[{sheet_name}] 表头行之后没有数据")
+    return SheetLayout(layout_fingerprint(header_rows), header_row, first_row, end_row)
+
+
+class LayoutCache:
+    """按sheet缓存已识别的报表版式，保存在输出目录的 layout_cache.json"""
+
+    def __init__(self, cache_file: Union[str, Path]):
+        self.cache_file = Path(cache_file)
+        self.layouts: Dict[str, List[SheetLayout]] = {}
+        self._dirty = False
+        if self.cache_file.exists():
+            try:
+                data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+                self.layouts = {
+                    sheet: [SheetLayout(**item) for item in items] for sheet, items in data.items()
+                }
+            except (ValueError, TypeError) as e:
+                logger.warning("版式缓存无法读取，将重新识别：%s，%s", self.cache_file, e)
+
+    def match(self, file_path: Union[str, Path], sheet_name: str) -> Optional[SheetLayout]:
+        """只读取表头部分计算指纹，返回与之一致的已缓存版式"""
+        candidates = self.layouts.get(sheet_name)
+        if not candidates:
+            return None
+        max_rows = max(layout.header_rows for layout in candidates)
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = list(workbook[sheet_name].iter_rows(max_row=max_rows, values_only=True))
+        finally:
+            workbook.close()
+        fingerprints = {}
+        for layout in candidates:
+            if layout.header_rows not in fingerprints:
+                fingerprints[layout.header_rows] = layout_fingerprint(rows[: layout.header_rows])
+            if fingerprints[layout.header_rows] == layout.fingerprint:
+                return layout
+        return None
+
+    def remember(self, sheet_name: str, layout: SheetLayout):
+        """记录版式，同一指纹只保留最新的数据区域"""
+        layouts = [
+            item for item in self.layouts.get(sheet_name, [])
+            if (item.fingerprint, item.header_rows) != (layout.fingerprint, layout.header_rows)
+        ]
+        layouts.insert(0, layout)
+        self.layouts[sheet_name] = layouts[:MAX_LAYOUTS_PER_SHEET]
+        self._dirty = True
+
+    def save(self):
+        """有新版式时写回缓存文件"""
+        if not self._dirty:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            sheet: [asdict(layout) for layout in layouts] for sheet, layouts in self.layouts.items()
+        }
+        # 先写临时文件再原子替换，运行中断时不会留下写了一半的缓存文件
+        tmp_file = self.cache_file.with_name(f".{self.cache_file.name}.tmp")
+        tmp_file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.cache_file)
+        self._dirty = False
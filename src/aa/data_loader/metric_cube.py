@@ -0,0 +1,189 @@
+"""指标立方体模块
+
+将预处理后的宽表导出为稠密的 (数据日期 × 机构 × 指标) float64 数组文件（.npy），
+并以JSON边车文件保存日期、机构、机构分组和指标名称等标签，以及导出时预处理数据文件的
+名称、大小和修改时间（用于判断立方体是否过期）、宽表中重复的 (数据日期, 机构名称)。
+立方体中重复的记录只保留最后一条，查询这些机构、日期时调用方应改为从窄表取数，以便给出重复提示；
+非数值列不导出，这些指标同样从窄表取数。
+报告生成时以内存映射方式只读打开，不反序列化为pandas对象，
+同一主机上并发运行的多个报告任务共享操作系统的页缓存。
+"""
+import json
+import logging
+from pathlib import Path
+import os
+from typing import Optional, Union
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CUBE_FILE_NAME = "metric_cube.npy"
+LABELS_FILE_NAME = "metric_cube_labels.json"
+ID_COLUMNS = ("数据日期", "机构分组", "机构名称")
+
+
+class MetricCube:
+    """内存映射的指标立方体"""
+
+    def __init__(self, values: np.ndarray, labels: dict):
+        self.values = values
+        self.dates = pd.DatetimeIndex(pd.to_datetime(labels["dates"]))
+        self.orgs = list(labels["orgs"])
+        self.groups = list(labels["groups"])
+        self.indicators = list(labels["indicators"])
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.org_index = {org: i for i, org in enumerate(self.orgs)}
+        self.indicator_index = {name: i for i, name in enumerate(self.indicators)}
+        self.source = labels.get("source")
+        self.mtime = 0.0
+        # 宽表中重复的 (数据日期, 机构名称) -> 记录数
+        self.duplicates = {
+            (pd.Timestamp(date), org): count for date, org, count in labels.get("duplicates", [])
+        }
+
+    @staticmethod
+    def write(
+        wide_df: pd.DataFrame,
+        output_dir: Union[str, Path],
+        source_file: Optional[Union[str, Path]] = None,
+    ) -> Path:
+        """
+        将宽表导出为指标立方体
+
+        Args:
+            wide_df: 预处理后的宽表（ALL_DATA）
+            output_dir: 输出目录
+            source_file: 已写出的预处理数据文件，记录其签名供报告生成时判断立方体是否过期
+
+        Returns:
+            立方体文件路径
+        """
+        output_dir = Path(output_dir)
+        cube_file = output_dir / CUBE_FILE_NAME
+        labels_file = output_dir / LABELS_FILE_NAME
+
+        indicators = [
+            col for col in wide_df.columns
+            if col not in ID_COLUMNS and pd.api.types.is_numeric_dtype(wide_df[col])
+        ]
+        date_codes, dates = pd.factorize(wide_df["数据日期"], sort=True)
+        org_codes, orgs = pd.factorize(wide_df["机构名称"], sort=True)
+        if "机构分组" in wide_df.columns:
+            org_groups = wide_df.groupby(org_codes)["机构分组"].last()
+            groups = [
+                None if pd.isna(org_groups.get(i)) else str(org_groups.get(i))
+                for i in range(len(orgs))
+            ]
+        else:
+            groups = [None] * len(orgs)
+
+        # 直接写入内存映射文件，逐个指标填充，不在内存中构建完整数组
+        cube = np.lib.format.open_memmap(
+            cube_file, mode="w+", dtype="float64",
+            shape=(len(dates), len(orgs), len(indicators)),
+        )
+        cube[:] = np.nan
+        for k, indicator in enumerate(indicators):
+            cube[date_codes, org_codes, k] = wide_df[indicator].to_numpy(dtype="float64")
+        cube.flush()
+        del cube
+
+        # 重复的 (数据日期, 机构名称) 在立方体中只保留最后一条，记录下来供查询时改为从窄表取数
+        n_orgs = max(len(orgs), 1)
+        counts = pd.Series(date_codes.astype("int64") * n_orgs + org_codes).value_counts()
+        duplicates = [
+            [dates[code // n_orgs].strftime("%Y-%m-%d"), str(orgs[code % n_orgs]), int(count)]
+            for code, count in counts[counts > 1].items()
+        ]
+        if duplicates:
+            logger.warning(
+                "宽表中有%s组重复的 (数据日期, 机构名称)，指标立方体只保留最后一条，查询时将从窄表取数",
+                len(duplicates),
+            )
+
+        labels = {
+            "dates": [date.strftime("%Y-%m-%d") for date in dates],
+            "orgs": [str(org) for org in orgs],
+            "groups": groups,
+            "indicators": indicators,
+            "duplicates": duplicates,
+            "source": None if source_file is None else file_signature(source_file),
+        }
+        with open(labels_file, "w", encoding="utf-8") as f:
+            json.dump(labels, f, ensure_ascii=False)
+
+        logger.info(
+            "已导出指标立方体：%s（%s个日期 × %s家机构 × %s个指标）",
+            cube_file, len(dates), len(orgs), len(indicators),
+        )
+        return cube_file
+
+    @classmethod
+    def open(cls, data_dir: Union[str, Path]) -> Optional["MetricCube"]:
+        """
+        以只读内存映射方式打开指标立方体
+
+        Args:
+            data_dir: 立方体所在目录
+
+        Returns:
+            MetricCube，文件不存在时返回None
+        """
+        data_dir = Path(data_dir)
+        cube_file = data_dir / CUBE_FILE_NAME
+        labels_file = data_dir / LABELS_FILE_NAME
+        if not cube_file.exists() or not labels_file.exists():
+            return None
+        with open(labels_file, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+        values = np.load(cube_file, mmap_mode="r")
+        cube = cls(values, labels)
+        cube.mtime = cube_file.stat().st_mtime
+        return cube
+
+    def is_stale(self, source_file: Union[str, Path]) -> bool:
+        """
+        立方体是否与预处理数据文件不一致
+
+        导出时记录了数据文件签名的，比较文件名、大小和修改时间；旧版立方体只比较修改时间。
+        """
+        source_file = Path(source_file)
+        if self.source is None:
+            return self.mtime < source_file.stat().st_mtime
+        return self.source != file_signature(source_file)
+
+    def covers(self, date: pd.Timestamp, org: str, indicator: str) -> bool:
+        """立方体能否代表 (数据日期, 机构, 指标) 的全部记录：指标已导出且该机构、日期没有重复记录"""
+        return indicator in self.indicator_index and (date, org) not in self.duplicates
+
+    def value(self, date: pd.Timestamp, org: str, indicator: str) -> float:
+        """查询单个指标值，不存在时返回NaN"""
+        i = self.date_index.get(date)
+        j = self.org_index.get(org)
+        k = self.indicator_index.get(indicator)
+        if i is None or j is None or k is None:
+            return np.nan
+        return float(self.values[i, j, k])
+
+    def series(self, org: str, indicator: str) -> Optional[np.ndarray]:
+        """返回机构某指标按日期排列的序列（内存映射视图）"""
+        j = self.org_index.get(org)
+        k = self.indicator_index.get(indicator)
+        if j is None or k is None:
+            return None
+        return self.values[:, j, k]
+
+    def cross_section(self, date: pd.Timestamp, indicator: str) -> Optional[np.ndarray]:
+        """返回某日期某指标所有机构的取值（内存映射视图），按self.orgs排列"""
+        i = self.date_index.get(date)
+        k = self.indicator_index.get(indicator)
+        if i is None or k is None:
+            return None
+        return self.values[i, :, k]
+
+
+def file_signature(path: Union[str, Path]) -> dict:
+    """文件签名：文件名、大小和修改时间（纳秒）"""
+    stat = os.stat(path)
+    return {"file": Path(path).name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
@@ -0,0 +1,407 @@
+"""指标库模块
+
+将预处理后的窄表（数据日期、机构分组、机构名称、指标名称、指标值）写入本地SQLite数据库，
+替代xlsx中的ALL_DATA_MELTED页，用于历史数据超出内存的场景。
+
+- 建有两个覆盖索引：(机构名称, 指标名称, 数据日期) 用于按机构取数，
+  (数据日期, 机构分组, 指标名称) 用于组内排名，查询只访问索引不回表；
+- 查询均使用参数化语句，语句文本固定，由sqlite3的语句缓存复用已编译的语句；
+- 写入时先写临时文件，建好索引后原子替换正式文件。替换前关闭本进程内该文件的读连接
+  （之后的查询自动重新连接新文件）；Windows上其他进程仍打开该文件时无法替换，
+  重试数次后报错并保留临时文件，需关闭正在读取指标库的报告任务后重新预处理；
+- 与指标立方体（metric_cube.npy）同时存在且立方体未过期时，当期值、同比、环比等单值查询优先读取立方体，
+  组内排名、趋势、数据覆盖等查询读取指标库。
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+logger = logging.getLogger(__name__)
+
+# 本进程内打开的只读指标库，替换文件前关闭其连接
+_OPEN_STORES: "weakref.WeakSet[MetricStore]" = weakref.WeakSet()
+# 替换正式文件失败（文件被占用）时的重试次数和间隔（秒）
+REPLACE_RETRIES = 5
+REPLACE_RETRY_INTERVAL = 0.5
+
+STORE_SUFFIXES = (".sqlite", ".db")
+TABLE_NAME = "metrics"
+MELTED_COLUMNS = ["数据日期", "机构分组", "机构名称", "指标名称", "指标值"]
+
+_CREATE_TABLE = (
+    f"CREATE TABLE {TABLE_NAME} ("
+    "数据日期 TEXT NOT NULL, 机构分组 TEXT, 机构名称 TEXT NOT NULL, "
+    "指标名称 TEXT NOT NULL, 指标值 REAL)"
+)
+_CREATE_INDEXES = (
+    f"CREATE INDEX idx_{TABLE_NAME}_org ON {TABLE_NAME} "
+    "(机构名称, 指标名称, 数据日期, 机构分组, 指标值)",
+    f"CREATE INDEX idx_{TABLE_NAME}_group ON {TABLE_NAME} "
+    "(数据日期, 机构分组, 指标名称, 机构名称, 指标值)",
+)
+_INSERT = f"INSERT INTO {TABLE_NAME} VALUES (?, ?, ?, ?, ?)"
+
+ROLLUP_TABLE_NAME = "rollups"
+_CREATE_ROLLUP_TABLE = (
+    f"CREATE TABLE {ROLLUP_TABLE_NAME} ("
+    "周期类型 TEXT NOT NULL, 数据日期 TEXT NOT NULL, 机构分组 TEXT, 机构名称 TEXT NOT NULL, "
+    "指标名称 TEXT NOT NULL, 指标值 REAL, 月份数 INTEGER)"
+)
+_INSERT_ROLLUP = f"INSERT INTO {ROLLUP_TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+CONFLICT_TABLE_NAME = "conflicts"
+_CREATE_CONFLICT_TABLE = (
+    f"CREATE TABLE {CONFLICT_TABLE_NAME} ("
+    "数据日期 TEXT, 机构名称 TEXT, 指标名称 TEXT, 采用来源 TEXT, 采用值, 舍弃来源 TEXT, 舍弃值)"
+)
+_INSERT_CONFLICT = f"INSERT INTO {CONFLICT_TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?, ?)"
+# 指标库的属性，如 unique_keys=1 表示 (数据日期, 机构名称, 指标名称) 已保证唯一
+META_TABLE_NAME = "meta"
+_CREATE_META_TABLE = f"CREATE TABLE {META_TABLE_NAME} (key TEXT PRIMARY KEY, value TEXT)"
+
+# 查询语句保持固定文本，参数通过占位符传入，便于语句缓存复用
+_SELECT_VALUES = (
+    f"SELECT 指标值 FROM {TABLE_NAME} "
+    "WHERE 机构名称 = ? AND 指标名称 = ? AND 数据日期 = ? ORDER BY rowid"
+)
+_SELECT_ORG_GROUP = (
+    f"SELECT 机构分组 FROM {TABLE_NAME} "
+    "WHERE 机构名称 = ? AND 指标名称 = ? AND 数据日期 = ? ORDER BY rowid LIMIT 1"
+)
+_SELECT_GROUP_ROWS = (
+    f"SELECT 机构名称, 指标值 FROM {TABLE_NAME} "
+    "WHERE 数据日期 = ? AND 机构分组 = ? AND 指标名称 = ? ORDER BY rowid"
+)
+_SELECT_DATE_INDICATOR_ROWS = (
+    f"SELECT 机构名称, 指标值 FROM {TABLE_NAME} "
+    "WHERE 数据日期 = ? AND 指标名称 = ? ORDER BY rowid"
+)
+_SELECT_LATEST_DATE = (
+    f"SELECT MAX(数据日期) FROM {TABLE_NAME} WHERE 机构名称 = ? AND 指标名称 = ?"
+)
+_SELECT_INDICATORS = f"SELECT DISTINCT 指标名称 FROM {TABLE_NAME}"
+# 带MAX(rowid)的分组查询中，机构分组取自每个机构最后写入的一行
+_SELECT_ORG_GROUPS = (
+    f"SELECT 机构名称, 机构分组, MAX(rowid) FROM {TABLE_NAME} "
+    "WHERE 机构分组 IS NOT NULL GROUP BY 机构名称"
+)
+_SELECT_DATES = f"SELECT DISTINCT 数据日期 FROM {TABLE_NAME} ORDER BY 数据日期"
+_SELECT_COVERAGE_ROWS = f"SELECT 数据日期, 机构名称, 指标名称, 指标值 FROM {TABLE_NAME}"
+_SELECT_MONTH_END_ROWS = (
+    f"SELECT 数据日期, 机构名称, 指标名称, 指标值 FROM {TABLE_NAME} "
+    "WHERE 指标值 IS NOT NULL AND 数据日期 = date(数据日期, 'start of month', '+1 month', '-1 day') "
+    "ORDER BY rowid"
+)
+
+
+def is_store_file(path: Union[str, Path]) -> bool:
+    """根据文件后缀判断是否为指标库文件"""
+    return Path(path).suffix.lower() in STORE_SUFFIXES
+
+
+def _date_text(date) -> str:
+    return pd.Timestamp(date).strftime("%Y-%m-%d")
+
+
+class MetricStoreWriter:
+    """指标库写入器，支持按分区多次追加，关闭时建索引并原子替换正式文件"""
+
+    def __init__(self, store_file: Union[str, Path]):
+        self.store_file = Path(store_file)
+        self.tmp_file = self.store_file.with_name(self.store_file.name + ".tmp")
+        if self.tmp_file.exists():
+            self.tmp_file.unlink()
+        self.conn = sqlite3.connect(self.tmp_file)
+        # 临时文件在完成前不会被读取，关闭日志和同步以加快批量写入
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute(_CREATE_TABLE)
+        self.row_count = 0
+
+    def append(self, melted_df: pd.DataFrame):
+        """追加窄表数据，按DataFrame的行序写入"""
+        if melted_df.empty:
+            return
+        df = melted_df[MELTED_COLUMNS]
+        dates = df["数据日期"].dt.strftime("%Y-%m-%d")
+        groups = df["机构分组"].astype(object).where(df["机构分组"].notna(), None)
+        rows = zip(
+            dates.tolist(),
+            groups.tolist(),
+            df["机构名称"].astype(str).tolist(),
+            df["指标名称"].astype(str).tolist(),
+            df["指标值"].astype("float64").tolist(),
+        )
+        with self.conn:
+            self.conn.executemany(_INSERT, rows)
+        self.row_count += len(df)
+
+    def write_rollups(self, rollup_df: pd.DataFrame):
+        """写入季度、年度汇总表"""
+        groups = rollup_df["机构分组"].astype(object).where(rollup_df["机构分组"].notna(), None)
+        rows = zip(
+            rollup_df["周期类型"].astype(str).tolist(),
+            rollup_df["数据日期"].dt.strftime("%Y-%m-%d").tolist(),
+            groups.tolist(),
+            rollup_df["机构名称"].astype(str).tolist(),
+            rollup_df["指标名称"].astype(str).tolist(),
+            rollup_df["指标值"].astype("float64").tolist(),
+            rollup_df["月份数"].astype(int).tolist(),
+        )
+        with self.conn:
+            self.conn.execute(_CREATE_ROLLUP_TABLE)
+            self.conn.executemany(_INSERT_ROLLUP, rows)
+
+    def write_conflicts(self, conflict_df: pd.DataFrame, policy: str):
+        """写入冲突报告，并标记指标库已保证 (数据日期, 机构名称, 指标名称) 唯一"""
+        dates = pd.to_datetime(conflict_df["数据日期"], errors="coerce").dt.strftime("%Y-%m-%d")
+        rows = zip(
+            dates.where(dates.notna(), None).tolist(),
+            conflict_df["机构名称"].astype(object).where(conflict_df["机构名称"].notna(), None).tolist(),
+            conflict_df["指标名称"].astype(str).tolist(),
+            conflict_df["采用来源"].astype(str).tolist(),
+            conflict_df["采用值"].astype(object).tolist(),
+            conflict_df["舍弃来源"].astype(str).tolist(),
+            conflict_df["舍弃值"].astype(object).tolist(),
+        )
+        with self.conn:
+            self.conn.execute(_CREATE_CONFLICT_TABLE)
+            self.conn.executemany(_INSERT_CONFLICT, rows)
+            self.conn.execute(_CREATE_META_TABLE)
+            self.conn.executemany(
+                f"INSERT INTO {META_TABLE_NAME} VALUES (?, ?)",
+                [("unique_keys", "1"), ("conflict_policy", policy)],
+            )
+
+    def close(self) -> Path:
+        """建索引、收集统计信息并原子替换正式文件"""
+        with self.conn:
+            for statement in _CREATE_INDEXES:
+                self.conn.execute(statement)
+            self.conn.execute("ANALYZE")
+        self.conn.close()
+        self._replace_store_file()
+        logger.info("已写入指标库：%s（%s行）", self.store_file, self.row_count)
+        return self.store_file
+
+    def _replace_store_file(self):
+        """用临时文件替换正式文件，先关闭本进程内的读连接，文件被其他进程占用时重试"""
+        target = self.store_file.resolve()
+        for store in list(_OPEN_STORES):
+            if store.store_file.resolve() == target:
+                store.close()
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(self.tmp_file, self.store_file)
+                return
+            except PermissionError:
+                if attempt == REPLACE_RETRIES - 1:
+                    raise RuntimeError(
+                        f"指标库文件被其他进程占用，无法替换：{self.store_file}，"
+                        f"新数据保留在 {self.tmp_file}，请关闭正在读取指标库的报告任务后重新预处理"
+                    ) from None
+                time.sleep(REPLACE_RETRY_INTERVAL)
+
+    def __enter__(self) -> "MetricStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.conn.close()
+            self.tmp_file.unlink(missing_ok=True)
+
+
+class MetricStore:
+    """只读的指标库"""
+
+    def __init__(self, store_file: Union[str, Path]):
+        self.store_file = Path(store_file)
+        if not self.store_file.exists():
+            raise FileNotFoundError(2, "指标库文件不存在", str(self.store_file))
+        self._local = threading.local()
+        self._unique_keys: Optional[bool] = None
+        # 各线程打开的连接，close时统一关闭；generation变化后各线程重新连接
+        self._connections: List[sqlite3.Connection] = []
+        self._generation = 0
+        self._lock = threading.Lock()
+        _OPEN_STORES.add(self)
+
+    @staticmethod
+    def write(melted_df: pd.DataFrame, store_file: Union[str, Path]) -> Path:
+        """将窄表一次性写入指标库"""
+        with MetricStoreWriter(store_file) as writer:
+            writer.append(melted_df)
+        return Path(store_file)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的只读连接，连接打开后即固定读取同一文件快照"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "generation", None) != self._generation:
+            conn = sqlite3.connect(
+                f"file:{self.store_file.resolve()}?mode=ro",
+                uri=True,
+                cached_statements=32,
+                check_same_thread=False,
+            )
+            with self._lock:
+                self._connections.append(conn)
+                self._local.conn = conn
+                self._local.generation = self._generation
+        return conn
+
+    def close(self):
+        """关闭所有线程的连接，之后的查询重新连接"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+            self._unique_keys = None
+        for conn in connections:
+            conn.close()
+
+    @property
+    def unique_keys(self) -> bool:
+        """预处理时是否已保证 (数据日期, 机构名称, 指标名称) 唯一"""
+        if self._unique_keys is None:
+            self._unique_keys = self.meta().get("unique_keys") == "1"
+        return self._unique_keys
+
+    def meta(self) -> dict:
+        """指标库的属性，旧版本的指标库没有属性表时返回空字典"""
+        if not self._has_table(META_TABLE_NAME):
+            return {}
+        return dict(self.conn.execute(f"SELECT key, value FROM {META_TABLE_NAME}").fetchall())
+
+    def conflict_frame(self) -> Optional[pd.DataFrame]:
+        """读取预处理时的冲突报告，旧版本的指标库返回None"""
+        if not self._has_table(CONFLICT_TABLE_NAME):
+            return None
+        return pd.read_sql_query(f"SELECT * FROM {CONFLICT_TABLE_NAME} ORDER BY rowid", self.conn)
+
+    def _has_table(self, table_name: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone() is not None
+
+    def values(self, date: pd.Timestamp, org: str, indicator: str) -> np.ndarray:
+        """查询 (数据日期, 机构, 指标) 的非空取值（未保证唯一的旧指标库去重）"""
+        rows = self.conn.execute(_SELECT_VALUES, (org, indicator, _date_text(date))).fetchall()
+        values = np.array([r[0] for r in rows], dtype="float64")
+        if not self.unique_keys:
+            values = pd.unique(values)
+        return values[~np.isnan(values)]
+
+    def org_group(self, date: pd.Timestamp, org: str, indicator: str) -> Tuple[bool, Optional[str]]:
+        """
+        查询机构在 (数据日期, 指标) 下的机构分组
+
+        Returns:
+            (是否存在该机构的记录, 机构分组)
+        """
+        row = self.conn.execute(_SELECT_ORG_GROUP, (org, indicator, _date_text(date))).fetchone()
+        if row is None:
+            return False, None
+        return True, row[0]
+
+    def group_rows(
+        self, date: pd.Timestamp, indicator: str, branch_group: Optional[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """查询 (数据日期, 机构分组, 指标) 下所有机构的取值，按写入顺序返回 (机构名称, 指标值)"""
+        if branch_group is None or pd.isna(branch_group):
+            return np.array([], dtype=object), np.array([], dtype="float64")
+        rows = self.conn.execute(
+            _SELECT_GROUP_ROWS, (_date_text(date), str(branch_group), indicator)
+        ).fetchall()
+        orgs = np.array([r[0] for r in rows], dtype=object)
+        values = np.array([r[1] for r in rows], dtype="float64")
+        return orgs, values
+
+    def date_indicator_rows(
+        self, date: pd.Timestamp, indicator: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """查询 (数据日期, 指标) 下所有机构的取值，按写入顺序返回 (机构名称, 指标值)"""
+        rows = self.conn.execute(
+            _SELECT_DATE_INDICATOR_ROWS, (_date_text(date), indicator)
+        ).fetchall()
+        orgs = np.array([r[0] for r in rows], dtype=object)
+        values = np.array([r[1] for r in rows], dtype="float64")
+        return orgs, values
+
+    def latest_date(self, org: str, indicator: str) -> Optional[pd.Timestamp]:
+        """查询 (机构, 指标) 的最新数据日期，无数据时返回None"""
+        row = self.conn.execute(_SELECT_LATEST_DATE, (org, indicator)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return pd.Timestamp(row[0])
+
+    def org_groups(self) -> Dict[str, str]:
+        """各机构的机构分组，同一机构有多个取值时保留最后写入的"""
+        return {str(org): group for org, group, _ in self.conn.execute(_SELECT_ORG_GROUPS)}
+
+    def indicators(self) -> List[str]:
+        """指标库中的全部指标名称"""
+        return [r[0] for r in self.conn.execute(_SELECT_INDICATORS)]
+
+    def dates(self) -> pd.DatetimeIndex:
+        """指标库中的全部数据日期（升序）"""
+        return pd.DatetimeIndex([r[0] for r in self.conn.execute(_SELECT_DATES)])
+
+    def month_end_frame(self, chunk_size: int = 200_000) -> pd.DataFrame:
+        """
+        分块读取所有月末数据，机构名称和指标名称编码为分类类型，供趋势引擎构建矩阵
+
+        Args:
+            chunk_size: 每次读取的行数
+        """
+        return self._read_frame(_SELECT_MONTH_END_ROWS, chunk_size, with_values=True)
+
+    def coverage_frame(self, chunk_size: int = 200_000) -> pd.DataFrame:
+        """
+        分块读取所有记录的 (数据日期, 机构名称, 指标名称, 指标值)，供构建数据覆盖索引
+
+        Args:
+            chunk_size: 每次读取的行数
+        """
+        return self._read_frame(_SELECT_COVERAGE_ROWS, chunk_size, with_values=True)
+
+    def _read_frame(self, sql: str, chunk_size: int, with_values: bool) -> pd.DataFrame:
+        """分块读取查询结果，机构名称和指标名称编码为分类类型"""
+        chunks: Iterable[pd.DataFrame] = pd.read_sql_query(sql, self.conn, chunksize=chunk_size)
+        frames = []
+        for chunk in chunks:
+            chunk["数据日期"] = pd.to_datetime(chunk["数据日期"])
+            chunk["机构名称"] = chunk["机构名称"].astype("category")
+            chunk["指标名称"] = chunk["指标名称"].astype("category")
+            frames.append(chunk)
+        if not frames:
+            empty = {
+                "数据日期": pd.Series(dtype="datetime64[ns]"),
+                "机构名称": pd.Series(dtype="category"),
+                "指标名称": pd.Series(dtype="category"),
+            }
+            if with_values:
+                empty["指标值"] = pd.Series(dtype="float64")
+            return pd.DataFrame(empty)
+        # 各块的分类取值不同，合并分类后再拼接，避免退化为字符串对象列
+        result = pd.concat(frames, ignore_index=True)
+        for column in ("机构名称", "指标名称"):
+            result[column] = union_categoricals([frame[column] for frame in frames])
+        return result
+
+    def rollup_frame(self) -> Optional[pd.DataFrame]:
+        """读取季度、年度汇总表，未生成汇总时返回None"""
+        if not self._has_table(ROLLUP_TABLE_NAME):
+            return None
+        df = pd.read_sql_query(f"SELECT * FROM {ROLLUP_TABLE_NAME} ORDER BY rowid", self.conn)
+        df["数据日期"] = pd.to_datetime(df["数据日期"])
+        return df
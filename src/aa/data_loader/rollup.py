@@ -0,0 +1,187 @@
+"""季度、年度汇总模块
+
+根据数据预处理配置中的“指标聚合”页，将月度数据汇总为季度和年度数据，
+供近N季度趋势、近N年趋势等算子直接按周期读取，不再取季末、年末的月度快照。
+
+聚合方式：
+- 求和（sum）：期间各月相加，适用于销售额、新客户数等流量指标
+- 期末值（last）：期间最后一个月的值，适用于余额、存量类指标
+- 平均值（average）：期间各月平均
+- 加权比率（weighted_ratio）：分子指标之和 / 分母指标之和，适用于毛利率等比率指标
+
+汇总结果为窄表，包含 周期类型、数据日期（周期末日期）、机构分组、机构名称、指标名称、指标值、月份数，
+月份数为参与汇总的月份个数，用于判断周期数据是否齐全。
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SUM = "sum"
+LAST = "last"
+AVERAGE = "average"
+WEIGHTED_RATIO = "weighted_ratio"
+
+AGGREGATION_ALIASES = {
+    "求和": SUM,
+    "期末值": LAST,
+    "平均值": AVERAGE,
+    "加权比率": WEIGHTED_RATIO,
+}
+AGGREGATION_ALIASES.update({code: code for code in (SUM, LAST, AVERAGE, WEIGHTED_RATIO)})
+
+# 周期类型 -> (pandas周期频率, 周期包含的月份数)
+ROLLUP_KINDS = {"季度": ("Q", 3), "年": ("Y", 12)}
+ROLLUP_COLUMNS = ["周期类型", "数据日期", "机构分组", "机构名称", "指标名称", "指标值", "月份数"]
+
+
+@dataclass(frozen=True)
+class AggregationRule:
+    """指标的聚合规则"""
+
+    indicator: str
+    method: str
+    numerator: Optional[str] = None    # 加权比率的分子指标
+    denominator: Optional[str] = None  # 加权比率的分母指标
+
+    @property
+    def columns(self) -> List[str]:
+        """汇总时需要的月度指标列"""
+        if self.method == WEIGHTED_RATIO:
+            return [self.numerator, self.denominator]
+        return [self.indicator]
+
+
+def parse_aggregation_rules(config_df: Optional[pd.DataFrame]) -> Dict[str, AggregationRule]:
+    """
+    解析“指标聚合”配置页：指标名称、聚合方式、分子指标、分母指标
+
+    Returns:
+        指标名称 -> 聚合规则
+    """
+    rules = {}
+    if config_df is None or "指标名称" not in config_df.columns or "聚合方式" not in config_df.columns:
+        return rules
+    for _, row in config_df.iterrows():
+        if pd.isna(row["指标名称"]) or pd.isna(row["聚合方式"]):
+            continue
+        indicator = str(row["指标名称"]).strip()
+        raw = str(row["聚合方式"]).strip()
+        method = AGGREGATION_ALIASES.get(raw, AGGREGATION_ALIASES.get(raw.lower()))
+        if method is None:
+            logger.warning("指标聚合配置无法识别：%s 聚合方式=%s", indicator, raw)
+            continue
+        numerator = denominator = None
+        if method == WEIGHTED_RATIO:
+            numerator = row.get("分子指标")
+            denominator = row.get("分母指标")
+            if pd.isna(numerator) or pd.isna(denominator):
+                logger.warning("指标聚合配置缺少分子指标或分母指标：%s", indicator)
+                continue
+            numerator, denominator = str(numerator).strip(), str(denominator).strip()
+        rules[indicator] = AggregationRule(indicator, method, numerator, denominator)
+    return rules
+
+
+class RollupBuilder:
+    """
+    季度、年度汇总构建器
+
+    按分区（或一次性）传入月度宽表，只累积每个 (周期, 机构) 的部分和、月份数和期末值，
+    全部分区处理完后再计算汇总值，内存占用与周期数 × 机构数成正比。
+    """
+
+    def __init__(self, rules: Dict[str, AggregationRule]):
+        self.rules = rules
+        self.columns = sorted({col for rule in rules.values() for col in rule.columns})
+        self._partials: List[pd.DataFrame] = []
+        self._groups: Dict[str, object] = {}
+        self._missing_logged = set()
+
+    @classmethod
+    def from_config(cls, config_df: Optional[pd.DataFrame]) -> Optional["RollupBuilder"]:
+        """根据“指标聚合”配置页创建构建器，未配置时返回None"""
+        rules = parse_aggregation_rules(config_df)
+        return cls(rules) if rules else None
+
+    def add(self, wide_df: pd.DataFrame):
+        """累积一个分区的月度宽表（只使用月末数据）"""
+        df = wide_df[wide_df["数据日期"].dt.is_month_end]
+        columns = [col for col in self.columns if col in df.columns]
+        for col in set(self.columns) - set(columns) - self._missing_logged:
+            logger.warning("指标聚合配置的指标不在数据中：%s", col)
+            self._missing_logged.add(col)
+        if df.empty or not columns:
+            return
+
+        if "机构分组" in df.columns:
+            groups = df.groupby("机构名称", sort=False)["机构分组"].last()
+            self._groups.update(groups.dropna().to_dict())
+
+        df = df.sort_values("数据日期", kind="stable")
+        for kind, (freq, _) in ROLLUP_KINDS.items():
+            keys = [
+                pd.Series(kind, index=df.index, name="周期类型"),
+                df["数据日期"].dt.to_period(freq).dt.end_time.dt.normalize().rename("数据日期"),
+                df["机构名称"],
+            ]
+            grouped = df[columns].groupby(keys, sort=False)
+            self._partials.append(
+                pd.concat(
+                    {
+                        "sum": grouped.sum(min_count=1),
+                        "count": grouped.count(),
+                        "last": grouped.last(),
+                    },
+                    axis=1,
+                )
+            )
+
+    def result(self) -> pd.DataFrame:
+        """计算汇总结果（窄表）"""
+        if not self._partials:
+            return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+        partials = pd.concat(self._partials)
+        grouped = partials.groupby(level=[0, 1, 2], sort=True)
+        totals = grouped.sum(min_count=1)
+        sums = totals["sum"]
+        counts = totals["count"].fillna(0)
+        # 分区按时间顺序传入，取最后一个非空值即为期末值
+        lasts = grouped.last()["last"]
+
+        frames = []
+        for rule in self.rules.values():
+            if any(col not in sums.columns for col in rule.columns):
+                continue
+            if rule.method == SUM:
+                values = sums[rule.indicator]
+                months = counts[rule.indicator]
+            elif rule.method == AVERAGE:
+                months = counts[rule.indicator]
+                values = sums[rule.indicator] / months.where(months > 0)
+            elif rule.method == LAST:
+                values = lasts[rule.indicator]
+                months = counts[rule.indicator]
+            else:
+                denominator = sums[rule.denominator]
+                values = sums[rule.numerator] / denominator.where(denominator != 0)
+                months = np.minimum(counts[rule.numerator], counts[rule.denominator])
+            frame = pd.DataFrame({"指标值": values, "月份数": months}).reset_index()
+            frame.columns = ["周期类型", "数据日期", "机构名称", "指标值", "月份数"]
+            frame["指标名称"] = rule.indicator
+            frames.append(frame.dropna(subset=["指标值"]))
+
+        if not frames:
+            return pd.DataFrame(columns=ROLLUP_COLUMNS)
+        result = pd.concat(frames, ignore_index=True)
+        result["机构分组"] = result["机构名称"].map(self._groups)
+        result["月份数"] = result["月份数"].astype(int)
+        result = result.sort_values(
+            ["周期类型", "数据日期", "机构名称", "指标名称"], kind="stable"
+        ).reset_index(drop=True)
+        logger.info("已生成季度、年度汇总：%s行", len(result))
+        return result[ROLLUP_COLUMNS]
@@ -0,0 +1,228 @@
+"""
+Wind宽表导出模块
+
+Wind终端导出的宽表每行一只证券（代码、名称），每列一个 指标×报告期 组合，列名为复合表头，如：
+    贷款总额\\n[单位]亿元\\n[报告期]2024-12-31\\n[报表类型]合并报表
+数据预处理时作为 type 为 wind 的数据源读取：
+- 复合表头每列只解析一次，得到 指标、单位、数据日期、报表类型；
+- 按解析结果建立 (数据日期, 指标) -> 列号 的下标矩阵，每块数据按下标一次取出，
+  直接得到 (机构名称, 数据日期) × 指标 的宽表，不再逐单元格melt、正则替换后pivot；
+- xlsx以只读模式按行分块读取和转换，内存占用取决于块大小和结果本身，适用于数千只证券×数千列的导出。
+"""
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+WIND_TYPE = "wind"
+# 同一指标、同一报告期有多种报表类型时优先采用的报表类型
+DEFAULT_REPORT_TYPE = "合并报表"
+CODE_COLUMN = "代码"
+NAME_COLUMN = "名称"
+CHUNK_ROWS = 2_000
+
+_HEADER_FIELD = re.compile(r"\[(单位|报告期|年度|交易日期|日期|报表类型)\]\s*([^\[\n_]*)")
+
+
+@dataclass(frozen=True)
+class WindColumn:
+    """一列复合表头的解析结果"""
+
+    indicator: str
+    unit: Optional[str]
+    data_dt: pd.Timestamp
+    report_type: Optional[str]
+
+
+def parse_wind_header(header) -> Optional[WindColumn]:
+    """
+    解析Wind复合表头
+
+    指标名称为第一个 [ 之前的部分；报告期取 [报告期]、[年度]、[交易日期] 或 [日期]，
+    只有年份时取当年年末。无法识别指标或报告期时返回None（如代码、名称列）。
+    """
+    text = str(header)
+    indicator = re.split(r"[\n_]?\[", text, maxsplit=1)[0].strip()
+    fields = {key: value.strip() for key, value in _HEADER_FIELD.findall(text)}
+    period = next(
+        (fields[key] for key in ("报告期", "年度", "交易日期", "日期") if fields.get(key)), None
+    )
+    if not indicator or period is None:
+        return None
+    if re.fullmatch(r"\d{4}", period):
+        period = f"{period}-12-31"
+    data_dt = pd.to_datetime(period, errors="coerce")
+    if pd.isna(data_dt):
+        return None
+    return WindColumn(indicator, fields.get("单位") or None, data_dt.normalize(), fields.get("报表类型"))
+
+
+class WindLayout:
+    """一张Wind宽表的列布局：表头解析一次，之后每块数据按下标矩阵转换"""
+
+    def __init__(
+        self,
+        headers: Sequence,
+        name_column: str = NAME_COLUMN,
+        report_type: str = DEFAULT_REPORT_TYPE,
+        source: str = "",
+    ):
+        """
+        Args:
+            headers: 表头行
+            name_column: 作为机构名称的列
+            report_type: 同一指标、同一报告期有多种报表类型时优先采用的报表类型
+            source: 数据来源描述，用于日志
+        """
+        headers = [str(h) if h is not None else "" for h in headers]
+        if name_column not in headers:
+            raise ValueError(f"{source} 缺少{name_column}列")
+        self.name_position = headers.index(name_column)
+        self.code_position = headers.index(CODE_COLUMN) if CODE_COLUMN in headers else None
+
+        # (数据日期, 指标) -> (列号, 是否为优先报表类型)
+        chosen = {}
+        skipped = 0
+        for position, header in enumerate(headers):
+            column = parse_wind_header(header)
+            if column is None:
+                continue
+            key = (column.data_dt, column.indicator)
+            preferred = column.report_type in (None, report_type)
+            if key in chosen:
+                skipped += 1
+                if chosen[key][1] or not preferred:
+                    continue
+            chosen[key] = (position, preferred)
+        if not chosen:
+            raise ValueError(f"{source} 未识别到Wind复合表头（指标/[单位]/[报告期]/[报表类型]）")
+        if skipped:
+            logger.warning("%s 有%s列的指标和报告期重复，已按报表类型%s取一列", source, skipped, report_type)
+
+        self.dates = pd.DatetimeIndex(sorted({key[0] for key in chosen}))
+        self.indicators: List[str] = list(dict.fromkeys(key[1] for key in chosen))
+        indicator_index = {name: i for i, name in enumerate(self.indicators)}
+        date_index = {date: i for i, date in enumerate(self.dates)}
+        # 用到的指标列，及下标矩阵：数据日期 × 指标 -> 指标列中的序号，没有对应列的位置指向末尾追加的空列
+        self.n_columns = len(headers)
+        self.value_positions = sorted(position for position, _ in chosen.values())
+        value_index = {position: i for i, position in enumerate(self.value_positions)}
+        self.take = np.full(
+            (len(self.dates), len(self.indicators)), len(self.value_positions), dtype=np.intp
+        )
+        for (date, indicator), (position, _) in chosen.items():
+            self.take[date_index[date], indicator_index[indicator]] = value_index[position]
+        self.source = source
+        self.bad_cells = 0
+        logger.info(
+            "%s 识别到%s个指标、%s个报告期（%s列）",
+            source, len(self.indicators), len(self.dates), len(chosen),
+        )
+
+    def reshape(self, rows: Sequence[Sequence]) -> pd.DataFrame:
+        """
+        将一块数据行转换为 数据日期、机构名称 + 指标列 的宽表
+
+        没有机构名称的行（如末尾的“数据来源：Wind”）和所有指标都为空的 (机构, 数据日期) 不输出。
+        """
+        block = pd.DataFrame.from_records(rows).reindex(columns=range(self.n_columns))
+        names = block[self.name_position]
+        keep = names.notna().to_numpy()
+        if self.code_position is not None:
+            codes = block[self.code_position].astype(str)
+            keep = keep & ~codes.str.startswith("数据来源").to_numpy()
+        block = block[keep]
+        names = names[keep].astype(str).str.strip().to_numpy()
+
+        values = self._numeric(block[self.value_positions])
+        # 末尾追加一列空值，下标矩阵中缺失的位置取到空值
+        values = np.concatenate([values, np.full((len(values), 1), np.nan)], axis=1)
+        # (机构, 数据日期, 指标) -> (机构×数据日期, 指标)
+        cube = values[:, self.take].reshape(-1, len(self.indicators))
+        result = pd.DataFrame(cube, columns=self.indicators)
+        result.insert(0, "机构名称", np.repeat(names, len(self.dates)))
+        result.insert(0, "数据日期", np.tile(self.dates.to_numpy(), len(names)))
+        return result[~np.isnan(cube).all(axis=1)]
+
+    def _numeric(self, block: pd.DataFrame) -> np.ndarray:
+        """数值块，Wind中的 -- 等无法转换的单元格置为空值并计数"""
+        try:
+            return block.to_numpy(dtype="float64", na_value=np.nan)
+        except (TypeError, ValueError):
+            pass
+        converted = block.apply(pd.to_numeric, errors="coerce")
+        self.bad_cells += int((block.notna().to_numpy() & converted.isna().to_numpy()).sum())
+        return converted.to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _iter_row_chunks(
+    file_path: Path, sheet_name: str, chunk_rows: int
+) -> Iterator[Tuple[list, list]]:
+    """按块返回 (表头, 数据行)；xlsx以只读模式流式读取，其他格式整表读取后分块"""
+    if file_path.suffix.lower() in (".xlsx", ".xlsm"):
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    yield header, chunk
+                    chunk = []
+            if chunk:
+                yield header, chunk
+        finally:
+            workbook.close()
+        return
+
+    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+    header = df.iloc[0].tolist()
+    for start in range(1, len(df), chunk_rows):
+        yield header, df.iloc[start: start + chunk_rows].itertuples(index=False, name=None)
+
+
+def read_wind_export(
+    file_path: Union[str, Path],
+    sheet_name: str,
+    report_type: str = DEFAULT_REPORT_TYPE,
+    chunk_rows: int = CHUNK_ROWS,
+) -> pd.DataFrame:
+    """
+    读取Wind宽表导出，转换为 数据日期、机构名称 + 指标列 的宽表（与标准表的结构一致）
+
+    Args:
+        file_path: Wind导出文件
+        sheet_name: sheet名称
+        report_type: 同一指标、同一报告期有多种报表类型时优先采用的报表类型
+        chunk_rows: 每块读取和转换的行数
+
+    Returns:
+        数据日期、机构名称以及各指标列，全部为空的指标列不保留
+    """
+    file_path = Path(file_path)
+    source = f"{file_path.name}[{sheet_name}]"
+    layout = None
+    frames = []
+    for header, rows in _iter_row_chunks(file_path, sheet_name, chunk_rows):
+        if layout is None:
+            layout = WindLayout(header, report_type=report_type, source=source)
+        frames.append(layout.reshape(list(rows)))
+    if layout is None:
+        raise ValueError(f"{source} 为空表")
+
+    result = pd.concat(frames, ignore_index=True) if frames else layout.reshape([])
+    if layout.bad_cells:
+        logger.warning("%s 有%s个单元格无法转换为数值，已置为空值", source, layout.bad_cells)
+    empty_columns = [col for col in layout.indicators if result[col].isna().all()]
+    if empty_columns:
+        result = result.drop(columns=empty_columns)
+    result["数据日期"] = pd.to_datetime(result["数据日期"])
+    logger.info("%s 转换完成：%s行，%s个指标", source, len(result), len(result.columns) - 2)
+    return result
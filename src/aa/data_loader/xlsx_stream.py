@@ -0,0 +1,153 @@
+"""流式Excel写入模块
+
+使用openpyxl的只写（write-only）模式逐块写入DataFrame，内存占用与数据总量无关。
+单个sheet达到Excel行数上限（1,048,576行，含表头）时自动续写到 名称_2、名称_3 …，
+读取时用 read_split_sheet 将拆分的sheet按顺序拼接。
+"""
+import logging
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+logger = logging.getLogger(__name__)
+
+EXCEL_MAX_ROWS = 1_048_576
+SHEET_NAME_MAX_LEN = 31
+CONVERT_ROWS = 50_000
+
+
+def split_sheet_name(base_name: str, part: int) -> str:
+    """第part个拆分sheet的名称，第1个为原名称，之后为 名称_2、名称_3 …"""
+    if part == 1:
+        return base_name[:SHEET_NAME_MAX_LEN]
+    suffix = f"_{part}"
+    return base_name[: SHEET_NAME_MAX_LEN - len(suffix)] + suffix
+
+
+def _frame_rows(df: pd.DataFrame):
+    """将DataFrame转换为单元格取值的行迭代器，缺失值写为空单元格"""
+    columns = []
+    for _, series in df.items():
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = np.array(series.dt.to_pydatetime(), dtype=object)
+        else:
+            values = series.to_numpy(dtype=object)
+        mask = pd.isna(series).to_numpy()
+        if mask.any():
+            values = values.copy()
+            values[mask] = None
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+class SheetStream:
+    """一个可拆分的只写sheet，按块追加DataFrame"""
+
+    def __init__(self, workbook: Workbook, base_name: str, columns: List[str], max_rows: int):
+        self.workbook = workbook
+        self.base_name = base_name
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.part = 0
+        self.row_count = 0  # 当前sheet已写入的行数（含表头）
+        self.total_rows = 0
+        self.sheet_names: List[str] = []
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.part += 1
+        name = split_sheet_name(self.base_name, self.part)
+        self.sheet = self.workbook.create_sheet(title=name)
+        self.sheet.append(self.columns)
+        self.sheet_names.append(name)
+        self.row_count = 1
+        if self.part > 1:
+            logger.info("sheet %s 达到行数上限，续写到 %s", self.base_name, name)
+
+    def append(self, df: pd.DataFrame):
+        """追加一块数据，列按首块的列顺序对齐"""
+        if df.empty:
+            return
+        df = df.reindex(columns=self.columns)
+        # 分段转换为单元格取值，避免一次性复制整块数据
+        for start in range(0, len(df), CONVERT_ROWS):
+            for row in _frame_rows(df.iloc[start: start + CONVERT_ROWS]):
+                if self.row_count >= self.max_rows:
+                    self._new_sheet()
+                self.sheet.append(row)
+                self.row_count += 1
+        self.total_rows += len(df)
+
+
+class StreamingXlsxWriter:
+    """流式Excel写入器"""
+
+    def __init__(self, path: Union[str, Path], max_rows: int = EXCEL_MAX_ROWS):
+        """
+        Args:
+            path: 输出文件路径
+            max_rows: 单个sheet的最大行数（含表头），默认为Excel的上限
+        """
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+
+    def sheet(self, base_name: str, columns: Iterable[str]) -> SheetStream:
+        """创建一个可按块追加的sheet，多个sheet可以交替追加"""
+        return SheetStream(self.workbook, base_name, list(columns), self.max_rows)
+
+    def write_sheet(
+        self, base_name: str, chunks: Iterable[pd.DataFrame], columns: Optional[List[str]] = None
+    ) -> SheetStream:
+        """
+        从数据块迭代器写入一个sheet
+
+        Args:
+            base_name: sheet名称
+            chunks: DataFrame数据块迭代器
+            columns: 列名，默认取第一块的列
+        """
+        stream = None
+        for chunk in chunks:
+            if stream is None:
+                stream = self.sheet(base_name, columns or list(chunk.columns))
+            stream.append(chunk)
+        if stream is None:
+            stream = self.sheet(base_name, columns or [])
+        return stream
+
+    def close(self):
+        """保存文件"""
+        self.workbook.save(self.path)
+
+    def __enter__(self) -> "StreamingXlsxWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def read_split_sheet(path: Union[str, Path], base_name: str) -> pd.DataFrame:
+    """
+    读取可能被拆分的sheet（名称、名称_2、名称_3 …），按顺序拼接
+
+    Raises:
+        ValueError: 文件中不存在该sheet时
+    """
+    with pd.ExcelFile(path) as xls:
+        pattern = re.compile(rf"^{re.escape(base_name)}(?:_(\d+))?$")
+        parts = []
+        for name in xls.sheet_names:
+            matched = pattern.match(name)
+            if matched:
+                parts.append((int(matched.group(1) or 1), name))
+        if not parts:
+            raise ValueError(f"Worksheet named '{base_name}' not found")
+        frames = [pd.read_excel(xls, sheet_name=name) for _, name in sorted(parts)]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,160 @@
+"""批量报告任务模块
+
+按任务文件批量生成报告。任务文件中每个任务指定报告配置文件、机构列表和数据日期，
+数据预处理配置和预处理数据只加载一次，所有任务共享同一数据集、指标目录和算子缓存。
+任务也可以指定另一套数据预处理配置和预处理数据（如零售业和银行业的报告放在同一个任务文件中），
+每套数据同样只加载一次。
+
+数据集只读，每份报告的状态都在各自的运行上下文中，workers大于1时任务在线程池中并行执行。
+
+任务文件示例（YAML）：
+    jobs:
+      - report_config_file: config/X公司样例_零售业/report_config_X公司样例_零售业_分店.yaml
+        org_name: "上海分店 杭州分店"   # 可选，也可以写成列表，默认取报告配置中的org_name
+        data_dt: "2024-12-31"          # 可选，默认取报告配置中的data_dt
+        data_extraction_config_file: … # 可选，默认取命令行参数
+        data_output_file: …            # 可选，默认取命令行参数
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+from aa.report_generators.report_dataset import ReportDataset
+from aa.report_generators.report_generator import ReportGenerator
+from aa.utils.config_loader import load_config
+from aa.utils.error_handler import ConfigurationError
+from aa.utils.run_metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+
+def load_jobs(job_file: Union[str, Path]) -> list:
+    """
+    读取并校验任务文件
+
+    Args:
+        job_file: 任务文件路径
+
+    Returns:
+        任务列表
+
+    Raises:
+        ConfigurationError: 任务文件格式错误时
+    """
+    config = load_config(job_file) or {}
+    jobs = config.get("jobs")
+    if not isinstance(jobs, list) or not jobs:
+        raise ConfigurationError(f"任务文件中缺少jobs列表：{job_file}")
+    for index, job in enumerate(jobs, start=1):
+        if not isinstance(job, dict) or "report_config_file" not in job:
+            raise ConfigurationError(f"任务文件第{index}个任务缺少report_config_file")
+    return jobs
+
+
+def job_head_overrides(job: dict) -> dict:
+    """从任务中提取需要覆盖的head参数"""
+    overrides = {}
+    if job.get("org_name"):
+        org_name = job["org_name"]
+        overrides["org_name"] = " ".join(org_name) if isinstance(org_name, list) else str(org_name)
+    if job.get("data_dt"):
+        overrides["data_dt"] = str(job["data_dt"])
+    return overrides
+
+
+class BatchReportRunner:
+    """批量报告任务执行器"""
+
+    def __init__(
+        self,
+        data_extraction_config_file: Union[str, Path],
+        data_output_file: Union[str, Path],
+        metrics: Optional[RunMetrics] = None,
+    ):
+        """
+        Args:
+            data_extraction_config_file: 数据预处理配置文件路径
+            data_output_file: 预处理后的数据文件路径
+            metrics: 运行指标，所有任务、所有数据集共用
+        """
+        self.metrics = metrics if metrics is not None else RunMetrics()
+        self.data_extraction_config_file = str(data_extraction_config_file)
+        self.data_output_file = str(data_output_file)
+        # (数据预处理配置文件, 预处理数据文件) -> 数据集
+        self._datasets: Dict[Tuple[str, str], ReportDataset] = {}
+        self._lock = threading.Lock()
+        self.load_seconds = 0.0
+        self.dataset = self._load_dataset(self._dataset_key({}))
+
+    def _dataset_key(self, job: dict) -> Tuple[str, str]:
+        """任务使用的数据集，未指定时使用默认数据集"""
+        return (
+            str(job.get("data_extraction_config_file") or self.data_extraction_config_file),
+            str(job.get("data_output_file") or self.data_output_file),
+        )
+
+    def _load_dataset(self, key: Tuple[str, str]) -> ReportDataset:
+        """加载数据集，同一套数据只加载一次"""
+        with self._lock:
+            if key not in self._datasets:
+                start = time.perf_counter()
+                self._datasets[key] = ReportDataset(*key, metrics=self.metrics)
+                seconds = time.perf_counter() - start
+                self.load_seconds += seconds
+                logger.info("批量任务数据加载完成：%s，耗时%.2f秒", key[1], seconds)
+            return self._datasets[key]
+
+    def run_job(self, job: dict) -> dict:
+        """执行单个任务，返回任务状态和耗时"""
+        start = time.perf_counter()
+        result = {"report_config_file": str(job["report_config_file"])}
+        try:
+            generator = ReportGenerator(
+                report_config_file=job["report_config_file"],
+                dataset=self._load_dataset(self._dataset_key(job)),
+                head_overrides=job_head_overrides(job),
+            )
+            report = generator.generate({})
+            result.update(status="success", org_name=report["org_name"])
+        except Exception as e:
+            logger.exception("任务执行失败：%s", job["report_config_file"])
+            result.update(status="error", message=str(e))
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(
+            "任务[%s]%s，耗时%.2f秒", result["report_config_file"], result["status"], result["seconds"]
+        )
+        return result
+
+    def run(self, job_file: Union[str, Path], workers: int = 1) -> dict:
+        """
+        执行任务文件中的所有任务
+
+        Args:
+            job_file: 任务文件路径
+            workers: 并行执行任务的线程数，默认按顺序执行
+
+        Returns:
+            汇总结果，包括每个任务的状态和耗时，任务顺序与任务文件一致
+        """
+        jobs = load_jobs(job_file)
+        # 先在主线程加载全部数据集，线程池中只读共享
+        for job in jobs:
+            try:
+                self._load_dataset(self._dataset_key(job))
+            except Exception:
+                logger.exception("任务数据加载失败：%s", job["report_config_file"])
+        if workers > 1 and len(jobs) > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as pool:
+                results = list(pool.map(self.run_job, jobs))
+        else:
+            results = [self.run_job(job) for job in jobs]
+        failed = sum(1 for r in results if r["status"] != "success")
+        return {
+            "status": "success" if failed == 0 else "error",
+            "job_count": len(results),
+            "failed_count": failed,
+            "load_seconds": round(self.load_seconds, 3),
+            "jobs": results,
+        }
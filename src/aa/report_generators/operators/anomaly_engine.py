@@ -0,0 +1,181 @@
+"""
+异常波动计算引擎
+
+复用趋势引擎按数据集构建一次的 (机构, 指标) × 月份 稠密矩阵（按指标分块即为各指标的 机构 × 月份 矩阵），
+对同一数据日期的所有序列一次性向量化计算两类稳健Z值：
+- 历史：当期值相对本机构该指标近N期（不含当期）的中位数偏离多少个稳健标准差（1.4826×MAD）；
+- 同组：当期值相对同一机构分组、同一指标、同一数据日期各机构的中位数偏离多少个稳健标准差。
+MAD为0时改用平均绝对偏差（×1.2533）估计标准差，仍为0时偏离中位数即视为无穷大。
+同一数据日期、同一窗口长度的结果被缓存，异常波动算子只按序列行号读取结论。
+"""
+import logging
+import threading
+import warnings
+from dataclasses import dataclass
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from aa.report_generators.operators import frame_cache
+from aa.report_generators.operators.trend_engine import TrendEngine, month_id
+
+logger = logging.getLogger(__name__)
+
+# MAD、平均绝对偏差换算为正态分布标准差的系数
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+# 计算历史稳健Z值至少需要的历史期数、计算同组稳健Z值至少需要的机构数
+MIN_HISTORY = 3
+MIN_PEERS = 3
+
+
+def robust_scores(deviation: np.ndarray, mad: np.ndarray, mean_ad: np.ndarray) -> np.ndarray:
+    """
+    稳健Z值 = 偏离中位数 / 稳健标准差
+
+    Args:
+        deviation: 当期值减中位数
+        mad: 绝对偏差的中位数
+        mean_ad: 绝对偏差的平均数，MAD为0时使用
+    """
+    scale = MAD_SCALE * mad
+    scale = np.where(scale > 0, scale, MEAN_AD_SCALE * mean_ad)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = deviation / scale
+    degenerate = ~(scale > 0) & ~np.isnan(deviation) & ~np.isnan(scale)
+    scores[degenerate] = 0.0
+    scores[degenerate & (deviation > 0)] = np.inf
+    scores[degenerate & (deviation < 0)] = -np.inf
+    return scores
+
+
+@dataclass(frozen=True)
+class AnomalyWindow:
+    """一个数据日期上所有序列的稳健Z值，各数组按趋势引擎的序列行号对齐"""
+
+    current: np.ndarray         # 当期值
+    history_median: np.ndarray  # 近N期（不含当期）的中位数
+    history_count: np.ndarray   # 近N期中有数据的期数
+    history_score: np.ndarray   # 历史稳健Z值，历史期数不足或当期无数据时为NaN
+    peer_median: np.ndarray     # 同组同指标各机构当期值的中位数
+    peer_count: np.ndarray      # 同组同指标当期有数据的机构数
+    peer_score: np.ndarray      # 同组稳健Z值，机构数不足或当期无数据时为NaN
+
+
+class AnomalyEngine:
+    """按数据集构建的异常波动计算引擎"""
+
+    def __init__(self, trend_engine: TrendEngine, org_groups: Dict[str, str]):
+        """
+        Args:
+            trend_engine: 数据集的趋势引擎，提供 (机构, 指标) × 月份 矩阵
+            org_groups: 机构名称 -> 机构分组
+        """
+        self.trend_engine = trend_engine
+        n_series = len(trend_engine.series_index)
+        orgs = np.empty(n_series, dtype=object)
+        indicators = np.empty(n_series, dtype=object)
+        for (org, indicator), row in trend_engine.series_index.items():
+            orgs[row] = org
+            indicators[row] = indicator
+
+        # 同组比较的分组键：(指标, 机构分组) 编码，未配置机构分组的序列为-1，不参与同组比较
+        indicator_codes, _ = pd.factorize(pd.Series(indicators, dtype=object))
+        groups = pd.Series(orgs, dtype=object).map(org_groups)
+        group_codes, group_values = pd.factorize(groups)
+        n_groups = max(len(group_values), 1)
+        self.peer_keys = np.where(
+            group_codes >= 0, indicator_codes.astype("int64") * n_groups + group_codes, -1
+        )
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_frame(cls, all_data_melted_df: pd.DataFrame) -> "AnomalyEngine":
+        """获取数据集对应的引擎实例，同一数据集只构建一次"""
+        def build():
+            store = frame_cache.get(all_data_melted_df, "metric_store")
+            if store is not None:
+                org_groups = store.org_groups()
+            else:
+                mapping = all_data_melted_df[["机构名称", "机构分组"]].dropna()
+                mapping = mapping.drop_duplicates(subset=["机构名称"], keep="last")
+                org_groups = dict(zip(mapping["机构名称"].astype(str), mapping["机构分组"]))
+            return cls(TrendEngine.for_frame(all_data_melted_df), org_groups)
+
+        return frame_cache.get_or_build(all_data_melted_df, "anomaly_engine", build)
+
+    def series_row(self, org: str, indicator: str) -> Optional[int]:
+        """返回 (机构, 指标) 序列的行号，不存在时返回None"""
+        return self.trend_engine.series_row(org, indicator)
+
+    def window(self, length: int, target_date: pd.Timestamp) -> AnomalyWindow:
+        """
+        计算数据日期上所有序列的稳健Z值
+
+        Args:
+            length: 历史期数N（不含当期）
+            target_date: 数据日期
+        """
+        column = month_id(target_date) - self.trend_engine.base_month
+        key = (length, column)
+        with self._lock:
+            cached = self._windows.get(key)
+        if cached is not None:
+            return cached
+
+        matrix = self.trend_engine.values
+        n_series, n_months = matrix.shape
+        current = np.full(n_series, np.nan)
+        if 0 <= column < n_months:
+            current = matrix[:, column].copy()
+        history = np.full((n_series, length), np.nan)
+        columns = column - np.arange(length, 0, -1)
+        in_range = (columns >= 0) & (columns < n_months)
+        history[:, in_range] = matrix[:, columns[in_range]]
+
+        history_count = (~np.isnan(history)).sum(axis=1)
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            # 历史全为空值的序列求中位数时numpy会告警，结果为NaN即可
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            history_median = np.nanmedian(history, axis=1)
+            deviation = np.abs(history - history_median[:, None])
+            history_score = robust_scores(
+                current - history_median,
+                np.nanmedian(deviation, axis=1),
+                np.nanmean(deviation, axis=1),
+            )
+        history_score[(history_count < MIN_HISTORY) | np.isnan(current)] = np.nan
+
+        peer_median = np.full(n_series, np.nan)
+        peer_count = np.zeros(n_series, dtype=int)
+        peer_score = np.full(n_series, np.nan)
+        valid = ~np.isnan(current) & (self.peer_keys >= 0)
+        if valid.any():
+            values = pd.Series(current[valid])
+            keys = self.peer_keys[valid]
+            grouped = values.groupby(keys)
+            median = grouped.transform("median").to_numpy()
+            abs_dev = (values - median).abs().groupby(keys)
+            count = grouped.transform("size").to_numpy()
+            scores = robust_scores(
+                values.to_numpy() - median,
+                abs_dev.transform("median").to_numpy(),
+                abs_dev.transform("mean").to_numpy(),
+            )
+            scores[count < MIN_PEERS] = np.nan
+            peer_median[valid] = median
+            peer_count[valid] = count
+            peer_score[valid] = scores
+
+        result = AnomalyWindow(
+            current=current,
+            history_median=history_median,
+            history_count=history_count,
+            history_score=history_score,
+            peer_median=peer_median,
+            peer_count=peer_count,
+            peer_score=peer_score,
+        )
+        with self._lock:
+            return self._windows.setdefault(key, result)
+
@@ -4,9 +4,20 @@
 """
 import logging
 from abc import ABC, abstractmethod
+from typing import List, Optional
 import pandas as pd
 
 logger = logging.getLogger(__name__)
+
+
+class OperatorError(str):
+    """
+    算子的出错说明
+    与正常结果一样作为文本写入报告，生成器按类型统计出错次数，不解析文本内容；
+    自定义算子出错时也应返回OperatorError，否则不计入出错次数
+    """
+
+
 class BaseOperator(ABC):
     """操作符处理基类"""
 
@@ -18,6 +29,30 @@ class BaseOperator(ABC):
         """
         处理操作符的抽象方法
         :param config: 操作符配置信息
-        :return: 生成的文本内容
+        :return: 生成的文本内容，出错时返回OperatorError
         """
         raise NotImplementedError("Operator must implement handle method")
+
+    @classmethod
+    def handle_batch(
+        cls, configs: List[dict], all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
+    ) -> List[str]:
+        """
+        批量处理操作符，一次接收本次生成中该算子的全部 (机构, 指标, 数据日期) 请求
+        默认逐个调用handle；可以向量化计算的算子覆盖此方法，一次算出所有结果
+        :param configs: 各请求的操作符配置信息
+        :return: 与configs一一对应的文本内容
+        """
+        return [cls.handle(config, all_data_df, all_data_melted_df) for config in configs]
+
+    @classmethod
+    def required_periods(
+        cls, config: dict, all_data_melted_df: pd.DataFrame
+    ) -> Optional[List[int]]:
+        """
+        算子计算所需的月份（月序号 = 年×12+月-1），供预检判断数据是否齐全
+        默认返回None，表示不参与预检
+        :param config: 操作符配置信息
+        :return: 月序号列表
+        """
+        return None
@@ -0,0 +1,89 @@
+"""
+日历索引模块
+
+加载数据时将所有数据日期整理为日历维度：每个数据日期对应一个整数期号（月序号），
+并标记是否为月末、季末、年末，预先计算 T-1、T-12（上月、去年同期）对应日期在日历中的下标。
+年同比、月环比算子确定比较期日期时只做数组下标查询，不再逐次进行 DateOffset / MonthEnd 日期运算；
+比较期的取值仍按日期经 query_values 查询，保留记录数检查。
+"""
+import logging
+from typing import Dict, Iterable
+import numpy as np
+import pandas as pd
+from aa.report_generators.operators import frame_cache
+from aa.report_generators.operators.trend_engine import month_id
+
+logger = logging.getLogger(__name__)
+
+# 预先计算的比较期偏移（月数）：上月、去年同期
+OFFSETS = (1, 12)
+
+
+def month_end_of(period_id: int) -> pd.Timestamp:
+    """期号对应月份的月末日期"""
+    year, month = divmod(int(period_id), 12)
+    return pd.Timestamp(year=year, month=month + 1, day=1) + pd.offsets.MonthEnd(0)
+
+
+class CalendarIndex:
+    """数据日期的日历索引"""
+
+    def __init__(self, dates: Iterable):
+        """
+        Args:
+            dates: 数据中出现的数据日期
+        """
+        index = pd.DatetimeIndex(pd.to_datetime(pd.Series(list(dates)), errors="coerce").dropna())
+        self.dates = index.normalize().unique().sort_values()
+        self.period_ids = (self.dates.year * 12 + self.dates.month - 1).to_numpy(dtype="int64")
+        self.is_month_end = np.asarray(self.dates.is_month_end)
+        self.is_quarter_end = np.asarray(self.dates.is_quarter_end)
+        self.is_year_end = np.asarray(self.dates.is_year_end)
+        self.position: Dict[pd.Timestamp, int] = {date: i for i, date in enumerate(self.dates)}
+
+        # 月末日期按期号建立下标，T-k 即期号减k对应的月末日期的下标，数据中没有该日期时为-1
+        month_end_position = np.full(
+            (self.period_ids.max() - self.period_ids.min() + 1) if len(self.dates) else 0, -1
+        )
+        base = int(self.period_ids.min()) if len(self.dates) else 0
+        month_end_position[self.period_ids[self.is_month_end] - base] = np.flatnonzero(
+            self.is_month_end
+        )
+        self.offsets: Dict[int, np.ndarray] = {}
+        for k in OFFSETS:
+            target = self.period_ids - k - base
+            valid = (target >= 0) & (target < len(month_end_position))
+            offset = np.full(len(self.dates), -1)
+            offset[valid] = month_end_position[target[valid]]
+            self.offsets[k] = offset
+
+    @classmethod
+    def for_frame(cls, all_data_melted_df: pd.DataFrame) -> "CalendarIndex":
+        """获取数据集对应的日历索引，同一数据集只构建一次；使用SQLite指标库时读取库中的日期"""
+        def build():
+            store = frame_cache.get(all_data_melted_df, "metric_store")
+            if store is not None:
+                return cls(store.dates())
+            return cls(all_data_melted_df["数据日期"].unique())
+
+        return frame_cache.get_or_build(all_data_melted_df, "calendar", build)
+
+    def period_id(self, date: pd.Timestamp) -> int:
+        """数据日期的期号（月序号）"""
+        i = self.position.get(date)
+        return int(self.period_ids[i]) if i is not None else month_id(date)
+
+    def offset_date(self, date: pd.Timestamp, months: int) -> pd.Timestamp:
+        """
+        比较期日期：数据日期所在月份往前months个月的月末
+
+        数据日期在日历中且偏移已预先计算时直接按下标取得；比较期不在数据中时按期号推算，
+        调用方据此查询得到空结果并给出数据缺失的提示。
+        """
+        i = self.position.get(date)
+        if i is not None and months in self.offsets:
+            j = self.offsets[months][i]
+            if j >= 0:
+                return self.dates[j]
+            return month_end_of(self.period_ids[i] - months)
+        return month_end_of(month_id(date) - months)
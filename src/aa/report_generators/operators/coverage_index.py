@@ -0,0 +1,109 @@
+"""
+数据覆盖索引模块
+
+加载数据时为每个 (机构, 指标) 记录一个按月份排列的位图（该月是否有数据）以及最新数据日期。
+最新数据日期与原先过滤窄表的结果一致，取所有记录（含指标值为空的记录）的最大数据日期；
+位图只记录指标值不为空的月份。
+data_dt_rule 取最新数据日期、预检（--preflight）判断算子所需期间是否齐全时，
+都只做字典查找和位运算，不再过滤窄表。
+"""
+import logging
+from typing import Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from aa.report_generators.operators import frame_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CoverageIndex:
+    """(机构, 指标) 的数据覆盖位图和最新数据日期"""
+
+    def __init__(
+        self,
+        orgs: Iterable,
+        indicators: Iterable,
+        dates: Iterable,
+        present: Optional[Iterable] = None,
+    ):
+        """
+        Args:
+            orgs, indicators, dates: 各记录的机构名称、指标名称、数据日期，长度一致
+            present: 各记录的指标值是否不为空，默认均不为空
+        """
+        dates = pd.to_datetime(pd.Series(np.asarray(dates)), errors="coerce")
+        valid = dates.notna().to_numpy()
+        dates = dates[valid]
+        present = (
+            np.ones(int(valid.sum()), dtype=bool)
+            if present is None
+            else np.asarray(present, dtype=bool)[valid]
+        )
+        org_codes, org_values = pd.factorize(pd.Series(np.asarray(orgs, dtype=object)[valid]))
+        indicator_codes, indicator_values = pd.factorize(
+            pd.Series(np.asarray(indicators, dtype=object)[valid])
+        )
+        n_indicators = max(len(indicator_values), 1)
+        pairs, codes = np.unique(
+            org_codes.astype("int64") * n_indicators + indicator_codes, return_inverse=True
+        )
+        self.series_index = {
+            (str(org_values[p // n_indicators]), str(indicator_values[p % n_indicators])): i
+            for i, p in enumerate(pairs)
+        }
+
+        months = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype="int64")
+        self.base_month = int(months.min()) if len(months) else 0
+        n_months = int(months.max()) - self.base_month + 1 if len(months) else 0
+        offsets = months[present] - self.base_month
+
+        # 每个序列一行，每个月一位
+        self.bitmap = np.zeros((len(pairs), (n_months + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(
+            self.bitmap,
+            (codes[present], offsets >> 3),
+            (1 << (7 - (offsets & 7))).astype(np.uint8),
+        )
+        self.n_months = n_months
+
+        latest = np.full(len(pairs), np.iinfo("int64").min, dtype="int64")
+        np.maximum.at(latest, codes, dates.to_numpy(dtype="datetime64[ns]").view("int64"))
+        self.latest = latest.view("datetime64[ns]")
+        logger.info("已构建数据覆盖索引：%s个序列，%s个月", len(pairs), n_months)
+
+    @classmethod
+    def for_frame(cls, all_data_melted_df: pd.DataFrame) -> "CoverageIndex":
+        """获取数据集对应的覆盖索引，同一数据集只构建一次；使用SQLite指标库时读取库中的记录"""
+        def build():
+            store = frame_cache.get(all_data_melted_df, "metric_store")
+            rows = store.coverage_frame() if store is not None else all_data_melted_df
+            return cls(
+                rows["机构名称"], rows["指标名称"], rows["数据日期"], rows["指标值"].notna()
+            )
+
+        return frame_cache.get_or_build(all_data_melted_df, "coverage", build)
+
+    def has(self, org: str, indicator: str, month: int) -> bool:
+        """(机构, 指标) 在月序号为month的月份是否有数据"""
+        row = self.series_index.get((str(org), str(indicator)))
+        offset = int(month) - self.base_month
+        if row is None or offset < 0 or offset >= self.n_months:
+            return False
+        return bool(self.bitmap[row, offset >> 3] >> (7 - (offset & 7)) & 1)
+
+    def missing(self, org: str, indicator: str, months: Iterable[int]) -> List[int]:
+        """months中没有数据的月序号"""
+        return [month for month in months if not self.has(org, indicator, month)]
+
+    def latest_date(self, org: str, indicator: str) -> Optional[pd.Timestamp]:
+        """(机构, 指标) 的最新数据日期（含指标值为空的记录），无记录时返回None"""
+        row = self.series_index.get((str(org), str(indicator)))
+        if row is None:
+            return None
+        return pd.Timestamp(self.latest[row])
+
+
+def month_label(month: int) -> str:
+    """月序号的展示形式，如 2024-12"""
+    year, month0 = divmod(int(month), 12)
+    return f"{year}-{month0 + 1:02d}"
@@ -4,23 +4,45 @@
 该模块包含了一系列用于生成报告的默认操作符类，包括:
 - 当期值操作符
 - 排名操作符
-- 趋势操作符
+- 组内分位操作符
+- 趋势操作符（近N月/季度/年趋势、连续趋势）
 - 完成率操作符
 - 同比操作符
 - 环比操作符
+- 异常波动操作符
 
 每个操作符都继承自BaseOperator基类，实现了特定的数据处理和格式化逻辑。
 """
 
 import logging
-from typing import Union
+import re
+from functools import lru_cache
+from typing import Optional, Union
+import numpy as np
 import pandas as pd
-from aa.report_generators.operators.base_operator import BaseOperator
+from aa.report_generators.operators import frame_cache
+from aa.report_generators.operators.anomaly_engine import MIN_HISTORY, AnomalyEngine
+from aa.report_generators.operators.base_operator import BaseOperator, OperatorError
+from aa.report_generators.operators.calendar_index import CalendarIndex
+from aa.report_generators.operators.indicator_catalog import RANK, IndicatorCatalog
+from aa.report_generators.operators.rank_cube import (
+    ALL_ORGS_LEVEL,
+    PRIMARY_LEVEL,
+    GroupDistribution,
+    level_group,
+    level_members,
+)
+from aa.report_generators.operators.trend_engine import (
+    PERIOD_LABELS,
+    TrendEngine,
+    month_id,
+    window_months,
+)
 
 logger = logging.getLogger(__name__)
 
-# 默认值，将在初始化时被替换
-ASC_ORDERED_KEYWORDS = [
+# 默认关键词，报告生成时由数据预处理配置构建的指标目录经运行上下文传入算子
+ASC_ORDERED_KEYWORDS = (
     "不良率",
     "成本率",
     "同业排名",
@@ -29,112 +51,258 @@ ASC_ORDERED_KEYWORDS = [
     "退货率",
     "成本",
     "库存量（件）",
-]
-PERCENTAGE_KEYWORDS = ["率", "占比", "定价", "比例"]
+)
+PERCENTAGE_KEYWORDS = ("率", "占比", "定价", "比例")
 
+# 未传入运行上下文时使用的默认指标目录（只读）
+DEFAULT_CATALOG = IndicatorCatalog(list(ASC_ORDERED_KEYWORDS), list(PERCENTAGE_KEYWORDS))
 
-# 用于更新关键词列表的函数
-def update_keywords(asc_ordered_keywords=None, percentage_keywords=None):
+
+def catalog_of(config: dict) -> IndicatorCatalog:
+    """算子配置中运行上下文的指标目录，未传入运行上下文时返回默认指标目录"""
+    context = config.get("context")
+    return DEFAULT_CATALOG if context is None else context.catalog
+
+
+def pp(indicator, value, catalog: IndicatorCatalog = DEFAULT_CATALOG) -> str:
+    """美化输出值，格式由指标目录决定；指标名称以 _同比/_环比 结尾时按变动格式输出"""
+    return catalog.format(indicator, value)
+
+
+def query_values(
+    all_data_melted_df: pd.DataFrame, target_date: pd.Timestamp, org: str, indicator: str
+) -> np.ndarray:
     """
-    更新模块中使用的关键词列表
+    查询 (数据日期, 机构, 指标) 的非空取值
 
-    Args:
-        asc_ordered_keywords: 升序排序关键词列表
-        percentage_keywords: 百分比关键词列表
+    报告生成器映射了指标立方体且立方体能代表该记录时直接按下标读取；
+    使用SQLite指标库时按参数化查询取数；否则从窄表中取数。
+
+    Returns:
+        非空取值数组（预处理未保证唯一时去重），无数据时为空数组
+    """
+    cube = frame_cache.get(all_data_melted_df, "metric_cube")
+    # 立方体未导出的指标、有重复记录的机构和日期从窄表取数，保留记录数检查
+    if cube is not None and cube.covers(target_date, org, indicator):
+        value = cube.value(target_date, org, indicator)
+        return np.array([]) if np.isnan(value) else np.array([value])
+
+    store = frame_cache.get(all_data_melted_df, "metric_store")
+    if store is not None:
+        return store.values(target_date, org, indicator)
+
+    rows = date_indicator_rows(all_data_melted_df, target_date, indicator)
+    values = rows.loc[rows["机构名称"] == org, "指标值"].dropna()
+    return values.to_numpy() if keys_unique(all_data_melted_df) else values.unique()
+
+
+def keys_unique(all_data_melted_df: pd.DataFrame) -> bool:
+    """预处理时是否已保证 (数据日期, 机构名称, 指标名称) 唯一，是时算子不再去重和检查记录数"""
+    return frame_cache.get(all_data_melted_df, "unique_keys", False)
+
+
+def query_org_group(
+    all_data_melted_df: pd.DataFrame, target_date: pd.Timestamp, org: str, indicator: str
+) -> tuple:
+    """
+    查询机构在 (数据日期, 指标) 下的机构分组
+
+    Returns:
+        (是否存在该机构的记录, 机构分组)
+    """
+    store = frame_cache.get(all_data_melted_df, "metric_store")
+    if store is not None:
+        return store.org_group(target_date, org, indicator)
+
+    rows = date_indicator_rows(all_data_melted_df, target_date, indicator)
+    current_org_data = rows[rows["机构名称"] == org]
+    if current_org_data.empty:
+        return False, None
+    return True, current_org_data["机构分组"].iloc[0]
+
+
+def date_indicator_rows(
+    all_data_melted_df: pd.DataFrame, target_date: pd.Timestamp, indicator: str
+) -> pd.DataFrame:
+    """
+    返回窄表中 (数据日期, 指标) 的所有行，保持原有行序
+
+    按 (数据日期, 指标名称) 分组的行号索引在数据集上只构建一次，
+    之后每次查询只取出对应的小表，不再对整张窄表做布尔过滤。
+    """
+    index = frame_cache.get_or_build(
+        all_data_melted_df,
+        "date_indicator_index",
+        lambda: all_data_melted_df.groupby(
+            ["数据日期", "指标名称"], observed=True, sort=False
+        ).indices,
+    )
+    positions = index.get((target_date, indicator))
+    if positions is None:
+        return all_data_melted_df.iloc[0:0]
+    return all_data_melted_df.iloc[positions]
+
+
+def group_ranking(
+    all_data_melted_df: pd.DataFrame,
+    target_date: pd.Timestamp,
+    indicator: str,
+    branch_group,
+    ascending: bool,
+    level: str = PRIMARY_LEVEL,
+) -> tuple:
     """
-    global ASC_ORDERED_KEYWORDS, PERCENTAGE_KEYWORDS
-    if (asc_ordered_keywords is not None) and (percentage_keywords is not None):
-        ASC_ORDERED_KEYWORDS = asc_ordered_keywords
-        PERCENTAGE_KEYWORDS = percentage_keywords
-        logger.info(f"已更新ASC_ORDERED_KEYWORDS: {ASC_ORDERED_KEYWORDS}")
-        logger.info(f"已更新PERCENTAGE_KEYWORDS: {PERCENTAGE_KEYWORDS}")
-
-
-def pp(indicator, value) -> str:
-    """美化输出值"""
-    # 用于格式化输出数值
-    if "排名" in indicator and ("同比" in indicator or "环比" in indicator):
-        rank_change = int(value)
-        if rank_change == 0:
-            res = "排名位次不变"
+    计算 (分组层级, 数据日期, 分组, 指标) 的组内排名
+
+    数据集加载时构建了排名立方体的，直接读取预先计算的排名；
+    否则现场计算并按数据集缓存，同组各机构、同一日期在多份报告之间共用一次排名结果。
+
+    Returns:
+        (机构名称数组, 指标值数组, 排名数组)，机构分组数据为空时返回None
+    """
+    rank_cube = frame_cache.get(all_data_melted_df, "rank_cube")
+    if rank_cube is not None:
+        try:
+            return rank_cube.ranking(level, target_date, indicator, branch_group, ascending)
+        except KeyError:
+            pass
+
+    def build():
+        store = frame_cache.get(all_data_melted_df, "metric_store")
+        if store is not None:
+            if level == PRIMARY_LEVEL:
+                orgs, values = store.group_rows(target_date, indicator, branch_group)
+            else:
+                orgs, values = store.date_indicator_rows(target_date, indicator)
+            group_data = pd.DataFrame({"机构名称": orgs, "指标值": values})
         else:
-            res = f"排名位次{"上升" if value <0 else "下降" }{abs(int(value)):d}位"
-    elif "排名" in indicator:
-        rank_change = int(value)
-        res = f"第{rank_change:d}名"
-    elif any(keyword in indicator for keyword in ["成本率", "定价"]) and (
-        "同比" in indicator or "环比" in indicator
-    ):
-        bps = int(value * 10000)
-        res = f"{bps:+d}Bps"
-    elif any(keyword in indicator for keyword in ["占比", "比例"]) and (
-        "同比" in indicator or "环比" in indicator
-    ):
-        percentage = value * 100
-        res = f"{percentage:.2f}个百分点"
-    elif any(keyword in indicator for keyword in PERCENTAGE_KEYWORDS):
-        res = f"{value:.2%}"
-    elif (
-        "客户数" in indicator or "降级至其它" in indicator or "升级至其它" in indicator
-    ):
-        res = f"{int(value)}"
-    elif "零售综合考评等级" in indicator:
-        mapping = {1: "A", 2: "B", 3: "C"}
-        res = mapping.get(value)
-    else:
-        res = f"{value:.1f}"
-    return res
+            rows = date_indicator_rows(all_data_melted_df, target_date, indicator)
+            group_data = rows[rows["机构分组"] == branch_group] if level == PRIMARY_LEVEL else rows
+        if level != PRIMARY_LEVEL:
+            group_levels = frame_cache.get(all_data_melted_df, "group_levels", {})
+            members = level_members(group_levels, level, branch_group)
+            if members is not None:
+                group_data = group_data[group_data["机构名称"].astype(str).isin(members)]
+        if group_data.empty:
+            return None
+        # 去除重复机构数据（保留最后一个），预处理时已保证唯一的跳过
+        dedup_data = group_data
+        if not keys_unique(all_data_melted_df):
+            dedup_data = group_data.drop_duplicates(subset=["机构名称"], keep="last")
+        values = dedup_data["指标值"].to_numpy(dtype="float64")
+        orgs = dedup_data["机构名称"].to_numpy()
+        # 计算排名（处理并列情况）
+        ranks = pd.Series(values).rank(method="min", ascending=ascending).to_numpy(dtype=int)
+        return orgs, values, ranks
+
+    key = ("group_ranking", level, target_date, indicator, branch_group, ascending)
+    return frame_cache.get_or_build(all_data_melted_df, key, build)
+
+
+def group_distribution(
+    all_data_melted_df: pd.DataFrame,
+    target_date: pd.Timestamp,
+    indicator: str,
+    branch_group,
+    ascending: bool,
+    level: str = PRIMARY_LEVEL,
+) -> Optional[GroupDistribution]:
+    """
+    (分组层级, 数据日期, 分组, 指标) 的取值分布
+
+    数据集加载时构建了排名立方体的，读取按层级一次性排序得到的分布；
+    否则由组内排名的结果现场构建，并按数据集缓存。
+
+    Returns:
+        GroupDistribution，机构分组数据为空时返回None
+    """
+    rank_cube = frame_cache.get(all_data_melted_df, "rank_cube")
+    if rank_cube is not None:
+        try:
+            return rank_cube.distribution(level, target_date, indicator, branch_group, ascending)
+        except KeyError:
+            pass
+
+    def build():
+        ranking = group_ranking(
+            all_data_melted_df, target_date, indicator, branch_group, ascending, level
+        )
+        if ranking is None:
+            return None
+        orgs, values, _ = ranking
+        return GroupDistribution.from_values(orgs, values, ascending)
+
+    key = ("group_distribution", level, target_date, indicator, branch_group, ascending)
+    return frame_cache.get_or_build(all_data_melted_df, key, build)
+
+
+def target_month(config: dict) -> int:
+    """算子配置中数据日期的月序号"""
+    return month_id(pd.to_datetime(config["data_dt_rule"]).normalize())
+
+
+def rollup_indicators(all_data_melted_df: pd.DataFrame, period_kind: str) -> set:
+    """配置了聚合方式、季度或年度趋势读取汇总值的指标"""
+    def build():
+        rollup_df = frame_cache.get(all_data_melted_df, "rollup")
+        if rollup_df is None:
+            return set()
+        return set(rollup_df.loc[rollup_df["周期类型"] == period_kind, "指标名称"].unique())
+
+    return frame_cache.get_or_build(all_data_melted_df, ("rollup_indicators", period_kind), build)
 
 
 class CurrentValueOperator(BaseOperator):
     """处理当期值操作符"""
 
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        return [target_month(config)]
+
     @classmethod
     def handle(
         cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
     ) -> str:
+        catalog = catalog_of(config)
         # 获取查询参数
         try:
             target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
             org = config["org_name"]
             indicator = config["indicator"]
         except KeyError as e:
-            return f"计算当期值时：查询指标数据出错{str(e)}"
+            return OperatorError(f"计算当期值时：查询指标数据出错{str(e)}")
 
         # 执行数据查询
         try:
-            filtered = all_data_melted_df[
-                (
-                    pd.to_datetime(all_data_melted_df["数据日期"]).dt.normalize()
-                    == target_date
-                )
-                & (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-            ]
+            values = query_values(all_data_melted_df, target_date, org, indicator)
 
             # 检查查询结果有效性
-            if len(filtered) == 0:
-                return "计算当期值时：查询指标数据出错，记录数为0，请检查数据是否完整"
+            if len(values) == 0:
+                return OperatorError("计算当期值时：查询指标数据出错，记录数为0，请检查数据是否完整")
 
-            values = filtered["指标值"].dropna().unique()
-            if len(values) != 1:
-                return "计算当期值时：查询指标数据出错，记录数不为1，请检查数据是否重复"
+            if not keys_unique(all_data_melted_df) and len(values) != 1:
+                return OperatorError("计算当期值时：查询指标数据出错，记录数不为1，请检查数据是否重复")
 
             sentiment = get_sentiment(
-                operator="CurrentValueOperator", indicator=indicator
+                operator="CurrentValueOperator", indicator=indicator, catalog=catalog
             )
-            return f"{sentiment}当期值：{pp(indicator,values[0])}"
+            return f"{sentiment}当期值：{pp(indicator,values[0], catalog)}"
 
         except Exception as e:
-            return f"计算当期值时：查询指标数据出错{str(e)}"
+            return OperatorError(f"计算当期值时：查询指标数据出错{str(e)}")
 
 class RankingOperator(BaseOperator):
     """处理组内排名操作符"""
 
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        return [target_month(config)]
+
     @classmethod
     def handle(
         cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
     ) -> str:
+        catalog = catalog_of(config)
         try:
             # 获取查询参数
             target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
@@ -142,366 +310,433 @@ class RankingOperator(BaseOperator):
             indicator = config["indicator"]
             format = config["format"]
         except KeyError as e:
-            return f"计算组内排名时：查询指标数据出错{str(e)}"
+            return OperatorError(f"计算组内排名时：查询指标数据出错{str(e)}")
+
+        # 分组层级：指标排名表指定的层级优先，其次为算子参数“层级”，默认为机构分组
+        options = dict(config.get("operator_options") or {})
+        level = config.get("rank_level") or options.pop("层级", None) or PRIMARY_LEVEL
+        options.pop("层级", None)
+        group_levels = frame_cache.get(all_data_melted_df, "group_levels", {})
+        if level not in (PRIMARY_LEVEL, ALL_ORGS_LEVEL) and level not in group_levels:
+            return OperatorError(f"计算组内排名时：查询指标数据出错，分组层级不存在：{level}")
+        try:
+            display = ranking_display_options(options or config.get("ranking_display") or {})
+        except ValueError as e:
+            return OperatorError(f"计算组内排名时：算子参数出错，{e}")
 
         try:
             # 获取当前机构的机构分组
-            current_org_data = all_data_melted_df[
-                (
-                    pd.to_datetime(all_data_melted_df["数据日期"]).dt.normalize()
-                    == target_date
+            found, branch_group = query_org_group(all_data_melted_df, target_date, org, indicator)
+
+            if not found:
+                return OperatorError("计算组内排名时：查询指标数据出错，请检查数据是否完整")
+            branch_group = level_group(group_levels, level, org, branch_group)
+
+            # 获取同分组所有机构的排名，排序方向由指标目录决定
+            ranking = group_ranking(
+                all_data_melted_df,
+                target_date,
+                indicator,
+                branch_group,
+                catalog.is_ascending(indicator),
+                level,
+            )
+
+            if ranking is None:
+                return OperatorError("计算组内排名时：查询指标数据出错，机构分组数据为空，请检查机构分组参数是否配置")
+            orgs, values, ranks = ranking
+
+            # 查找当前机构排名
+            org_positions = np.flatnonzero(orgs == org)
+            if len(org_positions) == 0:
+                return OperatorError("计算组内排名时：查询指标数据出错，记录数为0，请检查数据是否完整")
+            org_rank = ranks[org_positions[-1]]
+            participant_count = len(ranks)
+
+            if format != "A":
+                return "=====" * (participant_count + 1 - org_rank) + f"（第{org_rank}名）"
+
+            # 生成组内排名详情，只格式化需要展示的机构
+            segments = select_ranking_rows(ranks, org_positions[-1], **display)
+            rank_details = "， …， ".join(
+                "， ".join(
+                    f"No{ranks[i]}.{orgs[i]}（{pp(indicator, values[i], catalog)}）" for i in segment
                 )
-                & (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-            ]
+                for segment in segments
+            )
 
-            if current_org_data.empty:
-                return "计算组内排名时：查询指标数据出错，请检查数据是否完整"
+            sentiment = get_sentiment(
+                operator="RankingOperator",
+                indicator=indicator,
+                group_rank_participant_count=participant_count,
+                rank=org_rank,
+                catalog=catalog,
+            )
+            label = "组内排名" if level == PRIMARY_LEVEL else f"{level}排名"
+            return f"{sentiment}{label}：第{org_rank}名（组内共{participant_count}家机构）；{label}顺序为：{rank_details}"
 
-            branch_group = current_org_data["机构分组"].iloc[0]
+        except Exception as e:
+            return OperatorError(f"计算组内排名时：查询指标数据出错 {str(e)}")
 
-            # 获取同分组所有机构数据
-            group_data = all_data_melted_df[
-                (
-                    pd.to_datetime(all_data_melted_df["数据日期"]).dt.normalize()
-                    == target_date
-                )
-                & (all_data_melted_df["机构分组"] == branch_group)
-                & (all_data_melted_df["指标名称"] == indicator)
-            ]
 
-            if group_data.empty:
-                return "计算组内排名时：查询指标数据出错，机构分组数据为空，请检查机构分组参数是否配置"
+# 组内排名展示范围的参数
+RANKING_DISPLAY_KEYS = ("top", "bottom", "neighbors")
 
-            # 去除重复机构数据（保留最后一个）
-            dedup_data = group_data.drop_duplicates(subset=["机构名称"], keep="last")
 
-            # 检查 indicator 是否包含列表中的关键词
-            ascending_sort = any(
-                keyword in indicator for keyword in ASC_ORDERED_KEYWORDS
-            )
+def ranking_display_options(display) -> dict:
+    """
+    校验组内排名的展示范围参数，取值转换为整数
 
-            sorted_df = dedup_data.sort_values(by="指标值", ascending=ascending_sort)
+    Raises:
+        ValueError: 参数名不是 top、bottom、neighbors，或取值不是非负整数
+    """
+    unknown = [key for key in display if key not in RANKING_DISPLAY_KEYS]
+    if unknown:
+        raise ValueError(
+            f"组内排名参数不支持：{'、'.join(map(str, unknown))}，可用参数为 top、bottom、neighbors、层级"
+        )
+    result = {}
+    for key, value in display.items():
+        try:
+            result[key] = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"组内排名参数{key}应为整数：{value}") from None
+        if result[key] < 0:
+            raise ValueError(f"组内排名参数{key}不能为负数：{value}")
+    return result
 
-            # 计算排名（处理并列情况）
-            sorted_df["排名"] = (
-                sorted_df["指标值"]
-                .rank(method="min", ascending=ascending_sort)
-                .astype(int)
-            )
 
-            # 查找当前机构排名
-            org_rank = sorted_df.loc[sorted_df["机构名称"] == org, "排名"].values
-
-            if len(org_rank) == 0:
-                return "计算组内排名时：查询指标数据出错，记录数为0，请检查数据是否完整"
-            # 生成组内分行排名详情
-            rank_details = []
-            for idx, row in sorted_df.iterrows():
-                rank = row["排名"]
-                branch = row["机构名称"]
-                value = row["指标值"]
-                rank_details.append(f"No{rank}.{branch}（{pp(indicator,value)}）")
-
-            if format == "A":
-                sentiment = get_sentiment(
-                    operator="RankingOperator",
-                    indicator=indicator,
-                    group_rank_participant_count=len(sorted_df),
-                    rank=org_rank[0]
-                )
-                return f"{sentiment}组内排名：第{org_rank[0]}名（组内共{len(sorted_df)}家机构）；组内排名顺序为：{'， '.join(rank_details)}"
-            else:
-                return (
-                    "=====" * (len(sorted_df) + 1 - org_rank[0])
-                    + f"（第{org_rank[0]}名）"
-                )
+def select_ranking_rows(
+    ranks: np.ndarray, org_position: int, top: int = None, bottom: int = None, neighbors: int = None
+) -> list:
+    """
+    选出组内排名中需要展示的机构
 
-        except Exception as e:
-            return f"计算组内排名时：查询指标数据出错 {str(e)}"
+    未配置任何参数时展示全部机构；否则只展示前top名、后bottom名以及当前机构前后neighbors名，
+    通过对排名向量做部分排序（argpartition）选取，不对整组排序。
 
+    Args:
+        ranks: 各机构的排名
+        org_position: 当前机构在ranks中的下标
+        top: 展示前几名
+        bottom: 展示后几名
+        neighbors: 展示当前机构前后各几名
 
-class TrendLast3MonthsOperator(BaseOperator):
-    """处理近3月趋势操作符"""
+    Returns:
+        按排名顺序排列的下标片段列表，片段之间存在省略的机构
+    """
+    count = len(ranks)
+    # 排名相同时保持原有顺序，order_key 各不相同
+    order_key = ranks.astype("int64") * count + np.arange(count)
+    if top is None and bottom is None and neighbors is None:
+        return [list(np.argsort(order_key, kind="stable"))]
+
+    def first_k(key: np.ndarray, k: int) -> np.ndarray:
+        """key 最小的 k 个下标（无序）"""
+        if k <= 0:
+            return np.array([], dtype=int)
+        if k >= count:
+            return np.arange(count)
+        return np.argpartition(key, k - 1)[:k]
+
+    selected = [first_k(order_key, top or 0), first_k(-order_key, bottom or 0), [org_position]]
+    if neighbors:
+        position = int((order_key < order_key[org_position]).sum())
+        low, high = max(position - neighbors, 0), min(position + neighbors, count - 1)
+        selected.append(np.argpartition(order_key, [low, high])[low: high + 1])
+
+    chosen = np.unique(np.concatenate(selected).astype(int))
+    chosen = chosen[np.argsort(order_key[chosen], kind="stable")]
+    # 只对选中的机构计算其在整组中的位置，按位置是否相邻切分为片段
+    positions = (order_key[None, :] < order_key[chosen][:, None]).sum(axis=1)
+    breaks = np.flatnonzero(np.diff(positions) > 1) + 1
+    return [list(segment) for segment in np.split(chosen, breaks)]
+
+
+class PercentileOperator(BaseOperator):
+    """处理组内分位操作符：机构在组内分布中的百分位、四分位区间，与组内中位数、组内最优的差距"""
+
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        return [target_month(config)]
 
     @classmethod
     def handle(
         cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
     ) -> str:
+        catalog = catalog_of(config)
         try:
-            # 解析基础参数
             target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
             org = config["org_name"]
             indicator = config["indicator"]
         except KeyError as e:
-            return f"计算近3月趋势时：查询指标数据出错{str(e)}"
-
-        try:
-            # 生成需要查询的三个月范围（T-2、T-1、T）
-            months = [target_date - pd.DateOffset(months=x) for x in [2, 1, 0]]
-            # 对 months 中的每个日期加上 pd.offsets.MonthEnd(0)
-            month_ends = [date + pd.offsets.MonthEnd(0) for date in months]
-
-            # 过滤目标数据
-            filtered = all_data_melted_df[
-                (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-                & (all_data_melted_df["数据日期"].isin(month_ends))
-            ]
-
-            # 有效性检查基础数据
-            if filtered.empty:
-                return "计算近3月趋势时：查询指标数据出错，数据集为空"
-
-            # 按日期排序后去重（保留每个月份最后一个记录）
-            filtered = filtered.sort_values("数据日期")
-            dedup_data = filtered.drop_duplicates(subset=["数据日期"], keep="last")
-
-            # 检查是否包含完整三个月数据
-            existing_months = dedup_data["数据日期"].unique()
-            if not all(m in existing_months for m in month_ends):
-                return "计算近3月趋势时：查询指标数据出错，数据日期不完整，数据应包含近3个月末的数据"
+            return OperatorError(f"计算组内分位时：查询指标数据出错{str(e)}")
 
-            # 按时间顺序提取指标值（T-2、T-1、T）
-            trend_data = dedup_data.set_index("数据日期").loc[month_ends]
-            values = trend_data["指标值"].tolist()
+        # 分组层级：算子参数“层级”，默认为机构分组
+        options = config.get("operator_options") or {}
+        level = options.get("层级") or PRIMARY_LEVEL
+        group_levels = frame_cache.get(all_data_melted_df, "group_levels", {})
+        if level not in (PRIMARY_LEVEL, ALL_ORGS_LEVEL) and level not in group_levels:
+            return OperatorError(f"计算组内分位时：查询指标数据出错，分组层级不存在：{level}")
 
-            # 最终有效性检查
-            if len(values) != 3 or any(pd.isnull(values)):
-                return "计算近3月趋势时：查询指标数据出错，数据日期不完整，数据应包含近3个月末的数据"
-
-            v1, v2, v3 = values
-
-            indicator_value = f"近3月指标值为：{pp(indicator,v1)} {pp(indicator,v2)} {pp(indicator,v3)}"
-
-            # 检查 indicator 是否包含列表中的关键词
-            if any(keyword in indicator for keyword in ASC_ORDERED_KEYWORDS):
-                rank = "ASC"
-            else:
-                rank = "DESC"
-
-            # 判断趋势类型
-            result = ""
-            if v1 < v2 < v3:
-                mean_of_trend = et("up", rank)
-                result = f"近3月趋势：连续2月{mean_of_trend}。{indicator_value}"
-            elif v1 > v2 > v3:
-                mean_of_trend = et("down", rank)
-                result = f"近3月趋势：连续2月{mean_of_trend}。{indicator_value}"
-            elif v1 <= v2 and v2 > v3:
-                mean_of_trend = et("down", rank)
-                result = f"近3月趋势：出现拐点，开始{mean_of_trend}。{indicator_value}"
-            elif v1 >= v2 and v2 < v3:
-                mean_of_trend = et("up", rank)
-                result = f"近3月趋势：出现拐点，开始{mean_of_trend}。{indicator_value}"
-            elif v1 == v2 and v2 == v3:
-                result = f"近3月趋势：持平。{indicator_value}"
-            else:
-                result = f"近3月趋势：波动。{indicator_value}"
+        try:
+            values = query_values(all_data_melted_df, target_date, org, indicator)
+            if len(values) == 0:
+                return OperatorError("计算组内分位时：查询指标数据出错，记录数为0，请检查数据是否完整")
+            value = float(values[-1])
+            if np.isnan(value):
+                return OperatorError("计算组内分位时：查询指标数据出错，当期值为空，未参与组内分位，请检查数据是否完整")
+
+            found, branch_group = query_org_group(all_data_melted_df, target_date, org, indicator)
+            if not found:
+                return OperatorError("计算组内分位时：查询指标数据出错，请检查数据是否完整")
+            branch_group = level_group(group_levels, level, org, branch_group)
+
+            # 组内分布按层级只排序一次，当前机构在其中二分查找
+            distribution = group_distribution(
+                all_data_melted_df,
+                target_date,
+                indicator,
+                branch_group,
+                catalog.is_ascending(indicator),
+                level,
+            )
+            if distribution is None:
+                return OperatorError("计算组内分位时：查询指标数据出错，机构分组数据为空，请检查机构分组参数是否配置")
 
+            percentile = distribution.percentile(value)
+            participant_count = len(distribution.values)
             sentiment = get_sentiment(
-                operator="TrendLast3MonthsOperator",
+                operator="PercentileOperator",
                 indicator=indicator,
-                result_str=result
+                change_value=percentile,
+                catalog=catalog,
+            )
+            label = "组内" if level == PRIMARY_LEVEL else level
+            return (
+                f"{sentiment}{label}分位：第{percentile:.0f}百分位，处于{distribution.quartile_band(value)}"
+                f"（组内共{participant_count}家机构）；"
+                f"较{label}中位数 {pp(indicator, distribution.median, catalog)} "
+                f"差距 {pp(f'{indicator}_环比', value - distribution.median, catalog)}，"
+                f"较{label}最优 No1.{distribution.orgs[0]}（{pp(indicator, distribution.best, catalog)}）"
+                f"差距 {pp(f'{indicator}_环比', value - distribution.best, catalog)}"
             )
-            return f"{sentiment}{result}"
 
         except Exception as e:
-            return f"计算近3月趋势时：查询指标数据出错{str(e)}"
+            return OperatorError(f"计算组内分位时：查询指标数据出错 {str(e)}")
 
 
-class TrendLast3QuartersOperator(BaseOperator):
-    """处理近3季度趋势操作符"""
+class TrendOperator(BaseOperator):
+    """处理近N期趋势操作符，由周期类型（月/季度/年）和窗口长度参数化"""
+
+    period_kind = "月"
+    window = 3
+
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        rollup = config["indicator"] in rollup_indicators(all_data_melted_df, cls.period_kind)
+        target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
+        return window_months(cls.period_kind, cls.window, target_date, rollup)
 
     @classmethod
     def handle(
         cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
     ) -> str:
+        catalog = catalog_of(config)
+        name = f"近{cls.window}{cls.period_kind}趋势"
         try:
             # 解析基础参数
-            target_date = pd.to_datetime(config["data_dt"]).normalize()
+            target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
             org = config["org_name"]
             indicator = config["indicator"]
         except KeyError as e:
-            return f"计算近3季度趋势时：查询指标数据出错{str(e)}"
+            return OperatorError(f"计算{name}时：查询指标数据出错{str(e)}")
 
         try:
-            # 生成需要查询的三个季度范围（T-2、T-1、T）
-            # 计算当前季度末
-            current_quarter_end = target_date + pd.offsets.QuarterEnd(0)
-
-            # 生成三个季度的季末日期
-            quarters = [target_date - pd.DateOffset(months=x) for x in [6, 3, 0]]
-            quarter_ends = [date + pd.offsets.MonthEnd(0) for date in quarters]
-
-            # 过滤目标数据
-            filtered = all_data_melted_df[
-                (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-                & (all_data_melted_df["数据日期"].isin(quarter_ends))
-            ]
+            # 同一数据日期、同一窗口的趋势结果对所有机构只计算一次
+            engine = TrendEngine.for_frame(all_data_melted_df)
+            window = engine.window(cls.period_kind, cls.window, target_date)
+            row = engine.series_row(org, indicator)
 
             # 有效性检查基础数据
-            if filtered.empty:
-                return "计算近3季度趋势时：查询指标数据出错，数据集为空"
-
-            # 按日期排序后去重（保留每个季度最后一个记录）
-            filtered = filtered.sort_values("数据日期")
-            dedup_data = filtered.drop_duplicates(subset=["数据日期"], keep="last")
-
-            # 检查是否包含完整三个季度数据
-            existing_quarters = dedup_data["数据日期"].unique()
-            if not all(q in existing_quarters for q in quarter_ends):
-                return "计算近3季度趋势时：查询指标数据出错，数据日期不完整，数据应包含近3个季度末的数据"
-
-            # 按时间顺序提取指标值（T-2、T-1、T）
-            trend_data = dedup_data.set_index("数据日期").loc[quarter_ends]
-            values = trend_data["指标值"].tolist()
-
-            # 最终有效性检查
-            if len(values) != 3 or any(pd.isnull(values)):
-                return "计算近3季度趋势时：查询指标数据出错，数据日期不完整，数据应包含近3个季度末的数据"
-
-            v1, v2, v3 = values
-            indicator_value = f"近3季度指标值为：{pp(indicator,v1)} {pp(indicator,v2)} {pp(indicator,v3)}"
-
-            # 检查 indicator 是否包含列表中的关键词
-            if any(keyword in indicator for keyword in ASC_ORDERED_KEYWORDS):
-                rank = "ASC"
-            else:
-                rank = "DESC"
-
-            # 判断趋势类型
-            result = ""
-            if v1 < v2 < v3:
-                mean_of_trend = et("up", rank)
-                result = f"近3季度趋势：连续2季度{mean_of_trend}。{indicator_value}"
-            elif v1 > v2 > v3:
-                mean_of_trend = et("down", rank)
-                result = f"近3季度趋势：连续2季度{mean_of_trend}。{indicator_value}"
-            elif v1 <= v2 and v2 > v3:
-                mean_of_trend = et("down", rank)
-                result = (
-                    f"近3季度趋势：出现拐点，开始{mean_of_trend}。{indicator_value}"
+            if row is None or not window.has_any[row]:
+                return OperatorError(f"计算{name}时：查询指标数据出错，数据集为空")
+            if not window.complete[row]:
+                return OperatorError(
+                    f"计算{name}时：查询指标数据出错，数据日期不完整，"
+                    f"数据应包含近{cls.window}{PERIOD_LABELS[cls.period_kind]}的数据"
                 )
-            elif v1 >= v2 and v2 < v3:
-                mean_of_trend = et("up", rank)
-                result = (
-                    f"近3季度趋势：出现拐点，开始{mean_of_trend}。{indicator_value}"
+
+            values = window.values[row]
+            indicator_value = (
+                f"近{cls.window}{cls.period_kind}指标值为："
+                + " ".join(pp(indicator, v, catalog) for v in values)
+            )
+            # 窗口较长时补充线性趋势，帮助判断整体走向
+            if cls.window > 3:
+                indicator_value += (
+                    f"，平均每{cls.period_kind}变动"
+                    f"{pp(f'{indicator}_环比', window.slope[row], catalog)}"
                 )
-            elif v1 == v2 and v2 == v3:
-                result = f"近3季度趋势：持平。{indicator_value}"
-            else:
-                result = f"近3季度趋势：波动。{indicator_value}"
+
+            trend = describe_trend(
+                window.last_direction[row],
+                window.streak[row],
+                window.flat[row],
+                cls.period_kind,
+                cls.window,
+                "ASC" if catalog.is_ascending(indicator) else "DESC",
+            )
+            result = f"{name}：{trend}。{indicator_value}"
 
             sentiment = get_sentiment(
-                operator="TrendLast3QuartersOperator",
+                operator="TrendOperator",
                 indicator=indicator,
                 result_str=result,
+                catalog=catalog,
             )
             return f"{sentiment}{result}"
 
         except Exception as e:
-            return f"计算近3季度趋势时：查询指标数据出错{str(e)}"
+            return OperatorError(f"计算{name}时：查询指标数据出错{str(e)}")
+
+
+class TrendLast3MonthsOperator(TrendOperator):
+    """处理近3月趋势操作符"""
 
+    period_kind = "月"
+    window = 3
+
+
+class TrendLast3QuartersOperator(TrendOperator):
+    """处理近3季度趋势操作符"""
 
-class TrendLast3YearsOperator(BaseOperator):
+    period_kind = "季度"
+    window = 3
+
+
+class TrendLast3YearsOperator(TrendOperator):
     """处理近3年趋势操作符"""
 
+    period_kind = "年"
+    window = 3
+
+
+class StreakOperator(BaseOperator):
+    """处理连续趋势操作符，检测截至当期同方向连续变动的期数"""
+
+    period_kind = "月"
+
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        # 至少需要最近2期
+        rollup = config["indicator"] in rollup_indicators(all_data_melted_df, cls.period_kind)
+        target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
+        return window_months(cls.period_kind, 2, target_date, rollup)
+
     @classmethod
     def handle(
         cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
     ) -> str:
+        catalog = catalog_of(config)
+        name = f"连续{cls.period_kind}趋势"
         try:
-            # 解析基础参数
-            # normalize()将时间戳规范化到当天的午夜时间点(00:00:00)
-            # 例如: 2024-03-14 13:45:30 -> 2024-03-14 00:00:00
-            # 这样可以确保在比较日期时忽略具体时分秒,只关注年月日
-            target_date = pd.to_datetime(config["data_dt"]).normalize()
+            target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
             org = config["org_name"]
             indicator = config["indicator"]
         except KeyError as e:
-            return f"计算近3年趋势时：查询指标数据出错{str(e)}"
-
-        # 判断是否为年末
-        if target_date.month == 12 and target_date.day == 31:
-            current_year_end = target_date
-        else:
-            # 获取target_date所在年的年末日期
-            # target_date是pd.Timestamp类型,为保持一致也使用pd.Timestamp
-            current_year_end = pd.Timestamp(target_date.year - 1, 12, 31).normalize()
+            return OperatorError(f"计算{name}时：查询指标数据出错{str(e)}")
 
         try:
-            # 生成需要查询的三个年度范围（T-2、T-1、T）
-            years = [current_year_end - pd.DateOffset(years=x) for x in [12, 1, 0]]
-            # 生成三个年度的年末日期
-            year_ends = [date + pd.offsets.YearEnd(0) for date in years]
-
-            # 过滤目标数据
-            filtered = all_data_melted_df[
-                (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-                & (all_data_melted_df["数据日期"].isin(year_ends))
-            ]
-
-            # 有效性检查基础数据
-            if filtered.empty:
-                return "计算近3年趋势时：查询指标数据出错，数据集为空"
-
-            # 按日期排序后去重（保留每个年度最后一个记录）
-            filtered = filtered.sort_values("数据日期")
-            dedup_data = filtered.drop_duplicates(subset=["数据日期"], keep="last")
-
-            # 检查是否包含完整三个年度数据
-            existing_years = dedup_data["数据日期"].unique()
-            if not all(y in existing_years for y in year_ends):
-                return "计算近3年趋势时：查询指标数据出错，数据日期不完整，数据应包含近3个年末的数据"
-
-            # 按时间顺序提取指标值（T-2、T-1、T）
-            trend_data = dedup_data.set_index("数据日期").loc[year_ends]
-            values = trend_data["指标值"].tolist()
+            engine = TrendEngine.for_frame(all_data_melted_df)
+            window = engine.full_window(cls.period_kind, target_date)
+            row = engine.series_row(org, indicator)
 
-            # 最终有效性检查
-            if len(values) != 3 or any(pd.isnull(values)):
-                return "计算近3年趋势时：查询指标数据出错，数据日期不完整，数据应包含近3个年末的数据"
+            if row is None or window.values.shape[1] < 2 or np.isnan(window.values[row, -2:]).any():
+                return OperatorError(f"计算{name}时：查询指标数据出错，数据应至少包含最近2{PERIOD_LABELS[cls.period_kind]}的数据")
 
-            v1, v2, v3 = values
-            indicator_value = f"近3年指标值为：{pp(indicator,v1)} {pp(indicator,v2)} {pp(indicator,v3)}"
-
-            # 检查 indicator 是否包含列表中的关键词
-            if any(keyword in indicator for keyword in ASC_ORDERED_KEYWORDS):
-                rank = "ASC"
-            else:
-                rank = "DESC"
-
-            # 判断趋势类型
-            result = ""
-            if v1 < v2 < v3:
-                mean_of_trend = et("up", rank)
-                return f"近3年趋势：连续2年{mean_of_trend}。{indicator_value}"
-            elif v1 > v2 > v3:
-                mean_of_trend = et("down", rank)
-                return f"近3年趋势：连续2年{mean_of_trend}。{indicator_value}"
-            elif v1 <= v2 and v2 > v3:
-                mean_of_trend = et("down", rank)
-                return f"近3年趋势：出现拐点，开始{mean_of_trend}。{indicator_value}"
-            elif v1 >= v2 and v2 < v3:
-                mean_of_trend = et("up", rank)
-                return f"近3年趋势：出现拐点，开始{mean_of_trend}。{indicator_value}"
-            elif v1 == v2 and v2 == v3:
-                return f"近3年趋势：持平。{indicator_value}"
+            direction = window.last_direction[row]
+            if direction == 0:
+                result = f"{name}：与上{cls.period_kind}持平"
             else:
-                return f"近3年趋势：波动。{indicator_value}"
+                rank = "ASC" if catalog.is_ascending(indicator) else "DESC"
+                mean_of_trend = et("up" if direction > 0 else "down", rank)
+                result = f"{name}：已连续{window.streak[row]}{cls.period_kind}{mean_of_trend}"
 
             sentiment = get_sentiment(
-                operator="TrendLast3YearsOperator",
+                operator="TrendOperator",
                 indicator=indicator,
                 result_str=result,
+                catalog=catalog,
             )
             return f"{sentiment}{result}"
 
         except Exception as e:
-            return f"计算近3年趋势时：查询指标数据出错{str(e)}"
+            return OperatorError(f"计算{name}时：查询指标数据出错{str(e)}")
+
+
+_TREND_OPERATOR_PATTERN = re.compile(r"^近(\d+)(月|季度|年)趋势$")
+_STREAK_OPERATOR_PATTERN = re.compile(r"^连续(月|季度|年)趋势$")
+
+
+@lru_cache(maxsize=None)
+def resolve_trend_operator(operator_type: str):
+    """
+    根据算子名称生成趋势类算子，如 近6月趋势、近12月趋势、近5年趋势、连续月趋势
+
+    Args:
+        operator_type: 算子名称
+
+    Returns:
+        算子类，名称不是趋势类算子时返回None
+    """
+    matched = _TREND_OPERATOR_PATTERN.match(operator_type)
+    if matched:
+        window, period_kind = int(matched.group(1)), matched.group(2)
+        if window < 2:
+            return None
+        return type(
+            f"TrendLast{window}{period_kind}Operator",
+            (TrendOperator,),
+            {"period_kind": period_kind, "window": window},
+        )
+    matched = _STREAK_OPERATOR_PATTERN.match(operator_type)
+    if matched:
+        return type(
+            f"Streak{matched.group(1)}Operator",
+            (StreakOperator,),
+            {"period_kind": matched.group(1)},
+        )
+    return None
+
+
+def describe_trend(
+    direction: int, streak: int, flat: bool, unit: str, length: int, rank: str
+) -> str:
+    """
+    根据最后一期变动方向和连续变动期数描述趋势
+
+    Args:
+        direction: 最后一期相对上一期的变动方向 1/-1/0
+        streak: 截至最后一期同方向连续变动的期数
+        flat: 窗口内各期是否完全持平
+        unit: 周期单位，月/季度/年
+        length: 窗口期数
+        rank: DESC 越大越好 ASC 越小越好
+
+    Returns:
+        趋势描述
+    """
+    if flat:
+        return "持平"
+    original_trend = "up" if direction > 0 else "down"
+    if length == 2 and streak == 1:
+        return f"较上{unit}{et(original_trend, rank)}"
+    if streak >= 2:
+        return f"连续{streak}{unit}{et(original_trend, rank)}"
+    if streak == 1:
+        return f"出现拐点，开始{et(original_trend, rank)}"
+    return "波动"
 
 
 # class CompletionRateOperator(BaseOperator):
@@ -517,57 +752,50 @@ class TrendLast3YearsOperator(BaseOperator):
 class YearOverYearOperator(BaseOperator):
     """处理指标同比操作符"""
 
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        month = target_month(config)
+        return [month - 12, month]
+
     @classmethod
     def handle(
         cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
     ) -> str:
+        catalog = catalog_of(config)
         try:
             # 获取基础参数
             target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
             org = config["org_name"]
             indicator = config["indicator"]
         except KeyError as e:
-            return f"计算年同比时：查询指标数据基础参数出错{str(e)}"
+            return OperatorError(f"计算年同比时：查询指标数据基础参数出错{str(e)}")
 
         try:
-            # 计算去年同期日期
-            last_year_date = target_date - pd.DateOffset(years=1)
-            last_year_month_end = last_year_date + pd.offsets.MonthEnd(0)
+            # 计算去年同期日期（T-12）
+            last_year_month_end = CalendarIndex.for_frame(all_data_melted_df).offset_date(
+                target_date, 12
+            )
 
             # 查询当前数据
-            current_data = all_data_melted_df[
-                (
-                    pd.to_datetime(all_data_melted_df["数据日期"]).dt.normalize()
-                    == target_date
-                )
-                & (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-            ]
+            current_values = query_values(all_data_melted_df, target_date, org, indicator)
 
             # 查询去年同期数据
-            last_year_data = all_data_melted_df[
-                (
-                    pd.to_datetime(all_data_melted_df["数据日期"]).dt.normalize()
-                    == last_year_month_end
-                )
-                & (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-            ]
+            last_year_values = query_values(all_data_melted_df, last_year_month_end, org, indicator)
 
-            # 数据有效性检查
-            for data, period in zip(
-                [current_data, last_year_data], ["当前", "去年同期"]
+            # 数据有效性检查，预处理时已保证唯一的只检查是否有数据
+            unique = keys_unique(all_data_melted_df)
+            for values, period in zip(
+                [current_values, last_year_values], ["当前", "去年同期"]
             ):
-                if len(data) == 0:
-                    return f"计算年同比时：查询指标数据出错，{period}数据记录数为0，请检查数据是否完整"
+                if len(values) == 0:
+                    return OperatorError(f"计算年同比时：查询指标数据出错，{period}数据记录数为0，请检查数据是否完整")
 
-                values = data["指标值"].dropna().unique()
-                if len(values) != 1:
-                    return f"计算年同比时：查询指标数据出错，{period}数据记录数不为1，请检查数据是否重复"
+                if not unique and len(values) != 1:
+                    return OperatorError(f"计算年同比时：查询指标数据出错，{period}数据记录数不为1，请检查数据是否重复")
 
             # 提取数值
-            current_value = current_data["指标值"].iloc[0]
-            last_year_value = last_year_data["指标值"].iloc[0]
+            current_value = current_values[0]
+            last_year_value = last_year_values[0]
 
             # 计算增长额和增幅
             growth_amount = current_value - last_year_value
@@ -578,75 +806,69 @@ class YearOverYearOperator(BaseOperator):
 
             # return f"同比情况: 同比增长{growth_amount:.1f}，同比增幅{growth_rate:.1f}%。去年同期：{last_year_value:.1f}"
             # tmp_str1 = f"同比排名 {pp(f"{indicator}_同比",-growth_amount)}" if "排名" in indicator else f"同比增长 {pp(f"{indicator}_同比",growth_amount)}"
-            tmp_str1 = f"{pp(f"{indicator}_同比",growth_amount)}"
-            tmp_str2 = "" if "排名" in indicator else f"，同比增幅 {growth_rate:.1f}%"
+            tmp_str1 = pp(f"{indicator}_同比", growth_amount, catalog)
+            is_rank = catalog.get(indicator).value_format == RANK
+            tmp_str2 = "" if is_rank else f"，同比增幅 {growth_rate:.1f}%"
 
             sentiment = get_sentiment(
                 operator="YearOverYearOperator",
                 indicator=indicator,
-                change_value=growth_amount
+                change_value=growth_amount,
+                catalog=catalog,
             )
 
-            return f"{sentiment}年同比情况：同比变动 {tmp_str1}{tmp_str2}，去年同期：{pp(indicator,last_year_value)}"
+            return f"{sentiment}年同比情况：同比变动 {tmp_str1}{tmp_str2}，去年同期：{pp(indicator,last_year_value, catalog)}"
 
         except Exception as e:
-            return f"计算年同比时：查询指标数据出错：{str(e)}"
+            return OperatorError(f"计算年同比时：查询指标数据出错：{str(e)}")
 
 
 class MonthOverMonthOperator(BaseOperator):
     """处理指标月环比操作符"""
 
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        month = target_month(config)
+        return [month - 1, month]
+
     @classmethod
     def handle(
         cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
     ) -> str:
+        catalog = catalog_of(config)
         try:
             # 获取基础参数
             target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
             org = config["org_name"]
             indicator = config["indicator"]
         except KeyError as e:
-            return f"计算月环比时：查询指标数据基础参数出错{str(e)}"
+            return OperatorError(f"计算月环比时：查询指标数据基础参数出错{str(e)}")
 
         try:
-            # 计算上月同期日期
-            last_month_date = target_date - pd.DateOffset(months=1)
-
-            last_month_month_end = last_month_date + pd.offsets.MonthEnd(0)
+            # 计算上月同期日期（T-1）
+            last_month_month_end = CalendarIndex.for_frame(all_data_melted_df).offset_date(
+                target_date, 1
+            )
             # 查询当前数据
-            current_data = all_data_melted_df[
-                (
-                    pd.to_datetime(all_data_melted_df["数据日期"]).dt.normalize()
-                    == target_date
-                )
-                & (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-            ]
+            current_values = query_values(all_data_melted_df, target_date, org, indicator)
 
             # 查询上月同期数据
-            last_month_data = all_data_melted_df[
-                (
-                    pd.to_datetime(all_data_melted_df["数据日期"]).dt.normalize()
-                    == last_month_month_end
-                )
-                & (all_data_melted_df["机构名称"] == org)
-                & (all_data_melted_df["指标名称"] == indicator)
-            ]
+            last_month_values = query_values(all_data_melted_df, last_month_month_end, org, indicator)
 
-            # 数据有效性检查
-            for data, period in zip(
-                [current_data, last_month_data], ["当前", "上月同期"]
+            # 数据有效性检查，预处理时已保证唯一的只检查是否有数据
+            unique = keys_unique(all_data_melted_df)
+            for values, period in zip(
+                [current_values, last_month_values], ["当前", "上月同期"]
             ):
-                if len(data) == 0:
-                    return f"计算月环比时：查询指标数据出错，{period}数据记录数为0，请检查数据是否完整"
+                if len(values) == 0:
+                    return OperatorError(f"计算月环比时：查询指标数据出错，{period}数据记录数为0，请检查数据是否完整")
 
-                values = data["指标值"].dropna().unique()
-                if len(values) != 1:
-                    return f"计算月环比时：查询指标数据出错，{period}数据记录数不为1，请检查数据是否重复"
+                if not unique and len(values) != 1:
+                    return OperatorError(f"计算月环比时：查询指标数据出错，{period}数据记录数不为1，请检查数据是否重复")
 
             # 提取数值
-            current_value = current_data["指标值"].iloc[0]
-            last_month_value = last_month_data["指标值"].iloc[0]
+            current_value = current_values[0]
+            last_month_value = last_month_values[0]
 
             # 计算增长额和增幅
             growth_amount = current_value - last_month_value
@@ -658,18 +880,117 @@ class MonthOverMonthOperator(BaseOperator):
             # tmp_str = "" if "排名" in indicator else f"，环比增幅 {growth_rate:.1f}%"
             # return f"环比情况: 环比增长 {pp(f"{indicator}_环比",growth_amount)}{tmp_str}。上月同期：{pp(indicator,last_month_value)}"
 
-            tmp_str1 = f"{pp(f"{indicator}_环比",growth_amount)}"
-            tmp_str2 = "" if "排名" in indicator else f"，环比增幅 {growth_rate:.1f}%"
+            tmp_str1 = pp(f"{indicator}_环比", growth_amount, catalog)
+            is_rank = catalog.get(indicator).value_format == RANK
+            tmp_str2 = "" if is_rank else f"，环比增幅 {growth_rate:.1f}%"
 
             sentiment = get_sentiment(
                 operator="MonthOverMonthOperator",
                 indicator=indicator,
                 change_value=growth_amount,
+                catalog=catalog,
             )
-            return f"{sentiment}月环比情况：环比变动 {tmp_str1}{tmp_str2}，上月同期：{pp(indicator,last_month_value)}"
+            return f"{sentiment}月环比情况：环比变动 {tmp_str1}{tmp_str2}，上月同期：{pp(indicator,last_month_value, catalog)}"
 
         except Exception as e:
-            return f"计算月环比时：查询指标数据出错：{str(e)}"
+            return OperatorError(f"计算月环比时：查询指标数据出错：{str(e)}")
+
+
+class AnomalyOperator(BaseOperator):
+    """处理异常波动操作符：当期值相对本机构近N期历史、相对同组机构的稳健Z值"""
+
+    # 默认的历史期数和稳健Z值阈值，可通过算子参数配置，如 "异常波动: 期数=24, 阈值=3.5"
+    periods = 12
+    threshold = 3.0
+
+    @classmethod
+    def parse_options(cls, config: dict) -> tuple:
+        """算子参数中的 (期数, 阈值)"""
+        options = config.get("operator_options") or {}
+        periods = int(options.get("期数", cls.periods))
+        threshold = float(options.get("阈值", cls.threshold))
+        if periods < 1 or threshold <= 0:
+            raise ValueError(f"期数应为正整数、阈值应大于0：期数={periods}，阈值={threshold}")
+        return periods, threshold
+
+    @classmethod
+    def required_periods(cls, config: dict, all_data_melted_df: pd.DataFrame) -> list:
+        # 当期和判断历史偏离至少需要的期数，近N期中其余月份缺失不影响输出
+        month = target_month(config)
+        periods, _ = cls.parse_options(config)
+        return list(range(month - min(periods, MIN_HISTORY), month + 1))
+
+    @classmethod
+    def handle(
+        cls, config: dict, all_data_df: pd.DataFrame, all_data_melted_df: pd.DataFrame
+    ) -> str:
+        catalog = catalog_of(config)
+        try:
+            target_date = pd.to_datetime(config["data_dt_rule"]).normalize()
+            org = config["org_name"]
+            indicator = config["indicator"]
+        except KeyError as e:
+            return OperatorError(f"计算异常波动时：查询指标数据出错{str(e)}")
+
+        try:
+            periods, threshold = cls.parse_options(config)
+            # 同一数据日期所有机构、指标的稳健Z值只计算一次
+            engine = AnomalyEngine.for_frame(all_data_melted_df)
+            row = engine.series_row(org, indicator)
+            if row is None:
+                return OperatorError("计算异常波动时：查询指标数据出错，该机构该指标没有数据，请检查数据是否完整")
+            window = engine.window(periods, target_date)
+            current = window.current[row]
+            if np.isnan(current):
+                return OperatorError("计算异常波动时：查询指标数据出错，当期数据记录数为0，请检查数据是否完整")
+
+            details = []
+            flagged = []
+            history_score = window.history_score[row]
+            if np.isnan(history_score):
+                details.append(f"近{periods}期历史数据不足（{window.history_count[row]}期）")
+            else:
+                details.append(
+                    f"较近{periods}期中位数 {pp(indicator, window.history_median[row], catalog)} "
+                    f"偏离 {z_text(history_score)} 个稳健标准差"
+                )
+                if abs(history_score) >= threshold:
+                    flagged.append(history_score)
+            peer_score = window.peer_score[row]
+            if np.isnan(peer_score):
+                details.append(f"同组机构数据不足（{window.peer_count[row]}家）")
+            else:
+                details.append(
+                    f"较同组{window.peer_count[row]}家机构中位数 "
+                    f"{pp(indicator, window.peer_median[row], catalog)} "
+                    f"偏离 {z_text(peer_score)} 个稳健标准差"
+                )
+                if abs(peer_score) >= threshold:
+                    flagged.append(peer_score)
+
+            if flagged:
+                direction = np.sign(max(flagged, key=abs))
+                verdict = f"当期值 {pp(indicator, current, catalog)} 异常{'偏高' if direction > 0 else '偏低'}"
+            else:
+                direction = 0
+                verdict = "未见异常"
+            sentiment = get_sentiment(
+                operator="AnomalyOperator",
+                indicator=indicator,
+                change_value=direction,
+                catalog=catalog,
+            )
+            return f"{sentiment}异常波动：{verdict}（阈值{threshold:g}）。{'；'.join(details)}"
+
+        except Exception as e:
+            return OperatorError(f"计算异常波动时：查询指标数据出错：{str(e)}")
+
+
+def z_text(score: float) -> str:
+    """稳健Z值的展示形式，如 +3.2、-∞"""
+    if np.isinf(score):
+        return "+∞" if score > 0 else "-∞"
+    return f"{score:+.1f}"
 
 
 def et(origianl_trend: str, rank: str) -> str:
@@ -697,6 +1018,7 @@ def get_sentiment(
     change_value: float = None,
     group_rank_participant_count: int = None,
     rank: int = None,
+    catalog: IndicatorCatalog = DEFAULT_CATALOG,
 ) -> str:
     """
     判断指标变动的情绪
@@ -705,12 +1027,11 @@ def get_sentiment(
         operator: 算子名称
         result_str: 算子监测的结果字符串
         indicator: 指标名称，如果为None则从result_str中提取
+        catalog: 指标目录，决定指标的正负向
 
     Returns:
         str: 'Positive' 表示积极情绪，'Negative' 表示消极情绪，'Neutral' 表示中性情绪
     """
-    import re
-
     positive = "🔴"
     negative = "🟢"
     neutral  = "➖"
@@ -724,10 +1045,8 @@ def get_sentiment(
             # 如果无法提取指标名称，使用空字符串
             indicator = ""
 
-    # 判断指标是否为负向指标（在ASC_ORDERED_KEYWORDS中的指标为负向指标）
-    is_negative_indicator = any(
-        keyword in indicator for keyword in ASC_ORDERED_KEYWORDS
-    )
+    # 判断指标是否为负向指标，由指标目录决定
+    is_negative_indicator = catalog.get(indicator).polarity < 0
 
     # 根据算子类型处理不同情况
     # 当期值算子
@@ -736,6 +1055,7 @@ def get_sentiment(
         return neutral
     # 趋势类算子
     elif operator in [
+        "TrendOperator",
         "TrendLast3MonthsOperator",
         "TrendLast3QuartersOperator",
         "TrendLast3YearsOperator",
@@ -748,7 +1068,7 @@ def get_sentiment(
         elif "持平" in result_str or "波动" in result_str:
             return neutral
     # 同环比算子
-    elif operator in ["YearOverYearOperator", "MonthOverMonthOperator"]:
+    elif operator in ["YearOverYearOperator", "MonthOverMonthOperator", "AnomalyOperator"]:
         if is_negative_indicator and change_value > 0:
             return negative
         elif is_negative_indicator and change_value < 0:
@@ -770,6 +1090,14 @@ def get_sentiment(
             return positive
         else:
             return neutral
+    # 组内分位算子，change_value为百分位，已按指标正负向排序
+    elif operator == "PercentileOperator":
+        if change_value >= 75:
+            return positive
+        elif change_value < 25:
+            return negative
+        else:
+            return neutral
     # 其他算子情况
     else:
         return neutral
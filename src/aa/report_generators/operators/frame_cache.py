@@ -0,0 +1,84 @@
+"""
+数据集级缓存模块
+
+算子需要的索引、矩阵等派生结构只依赖于数据本身，按数据集（DataFrame对象）缓存，
+同一份数据在多个机构、多个报告之间只构建一次。数据集被释放后缓存自动清除。
+数据集绑定了运行指标（bind_metrics）时，缓存命中情况记入该运行指标。
+"""
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Hashable
+import pandas as pd
+from aa.utils.run_metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# id(DataFrame) -> (DataFrame的弱引用, {缓存键: 缓存值})
+_cache: dict = {}
+# 数据集缓存中保存运行指标的键
+_METRICS_KEY = "run_metrics"
+
+
+def _evict(frame_id: int):
+    """数据集被回收时清除对应缓存"""
+    with _lock:
+        _cache.pop(frame_id, None)
+
+
+def _store_for(df: pd.DataFrame) -> dict:
+    frame_id = id(df)
+    entry = _cache.get(frame_id)
+    if entry is None or entry[0]() is not df:
+        entry = (weakref.ref(df, lambda _ref, fid=frame_id: _evict(fid)), {})
+        _cache[frame_id] = entry
+    return entry[1]
+
+
+def get_or_build(df: pd.DataFrame, key: Hashable, builder: Callable[[], Any]) -> Any:
+    """
+    获取数据集上的缓存对象，不存在时调用builder构建
+
+    Args:
+        df: 缓存所依附的数据集
+        key: 缓存键
+        builder: 无参构建函数
+
+    Returns:
+        缓存对象
+    """
+    # 命中率按缓存键的类别统计，如 ("group_ranking", …) 记为 group_ranking
+    metric_key = key[0] if isinstance(key, tuple) and key else key
+    with _lock:
+        store = _store_for(df)
+        metrics = store.get(_METRICS_KEY)
+        hit = key in store
+        value = store.get(key)
+    if metrics is not None:
+        metrics.inc("cache_requests_total", key=metric_key, result="hit" if hit else "miss")
+    if hit:
+        return value
+    value = builder()
+    with _lock:
+        return _store_for(df).setdefault(key, value)
+
+
+def bind_metrics(df: pd.DataFrame, metrics: RunMetrics):
+    """将运行指标绑定到数据集，之后该数据集的缓存命中情况记入其中"""
+    put(df, _METRICS_KEY, metrics)
+
+
+def put(df: pd.DataFrame, key: Hashable, value: Any):
+    """将外部构建好的对象登记到数据集缓存"""
+    with _lock:
+        _store_for(df)[key] = value
+
+
+def get(df: pd.DataFrame, key: Hashable, default: Any = None) -> Any:
+    """读取数据集缓存，不存在时返回default"""
+    with _lock:
+        entry = _cache.get(id(df))
+        if entry is None or entry[0]() is not df:
+            return default
+        return entry[1].get(key, default)
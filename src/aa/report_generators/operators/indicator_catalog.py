@@ -0,0 +1,196 @@
+"""
+指标目录模块
+
+根据关键词配置（ASC_ORDERED_KEYWORDS、PERCENTAGE_KEYWORDS）和数据中的指标名称，
+一次性为每个指标确定排序方向、数值格式、变动格式和正负向，并支持在配置文件的
+“指标属性”页中按指标覆盖。算子和格式化函数按指标名称直接查表，不再逐次扫描关键词。
+"""
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Optional
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 数值格式
+RANK = "rank"                # 第N名
+PERCENT = "percent"          # 12.34%
+INTEGER = "integer"          # 123
+GRADE = "grade"              # 等级 A/B/C
+DECIMAL = "decimal"          # 123.4
+# 变动格式（另可使用以上数值格式）
+RANK_CHANGE = "rank_change"  # 排名位次上升N位
+BPS = "bps"                  # +12Bps
+PCT_POINT = "pct_point"      # 1.23个百分点
+
+# “指标属性”页中的中文写法 -> 内部格式代码
+FORMAT_ALIASES = {
+    "排名": RANK,
+    "百分比": PERCENT,
+    "整数": INTEGER,
+    "等级": GRADE,
+    "小数": DECIMAL,
+    "排名变动": RANK_CHANGE,
+    "基点": BPS,
+    "百分点": PCT_POINT,
+}
+SORT_ALIASES = {"升序": True, "asc": True, "降序": False, "desc": False}
+POLARITY_ALIASES = {"正向": 1, "positive": 1, "负向": -1, "negative": -1}
+
+# 变动值格式化时追加在指标名称后的后缀
+DELTA_SUFFIXES = ("_同比", "_环比")
+
+_GRADE_MAPPING = {1: "A", 2: "B", 3: "C"}
+
+
+@dataclass(frozen=True)
+class IndicatorMeta:
+    """指标元数据"""
+
+    name: str
+    ascending: bool      # True 表示升序排名，值越小越好
+    value_format: str    # 指标值的展示格式
+    delta_format: str    # 同比、环比变动值的展示格式
+    polarity: int        # 1 正向指标，-1 负向指标
+
+
+class IndicatorCatalog:
+    """指标目录"""
+
+    def __init__(
+        self,
+        asc_ordered_keywords: Iterable[str],
+        percentage_keywords: Iterable[str],
+        indicator_names: Iterable[str] = (),
+        overrides_df: Optional[pd.DataFrame] = None,
+    ):
+        """
+        Args:
+            asc_ordered_keywords: 升序排序关键词列表
+            percentage_keywords: 百分比关键词列表
+            indicator_names: 数据中的指标名称，构建时即完成推断
+            overrides_df: “指标属性”配置页，按指标覆盖推断结果
+        """
+        self.asc_ordered_keywords = [str(k) for k in asc_ordered_keywords if pd.notna(k)]
+        self.percentage_keywords = [str(k) for k in percentage_keywords if pd.notna(k)]
+        self._overrides = self._parse_overrides(overrides_df)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, IndicatorMeta] = {}
+        for name in indicator_names:
+            self._entries[str(name)] = self._build(str(name))
+
+    def get(self, indicator: str) -> IndicatorMeta:
+        """查询指标元数据，数据中没有的指标首次查询时推断并缓存"""
+        meta = self._entries.get(indicator)
+        if meta is None:
+            meta = self._build(indicator)
+            with self._lock:
+                meta = self._entries.setdefault(indicator, meta)
+        return meta
+
+    def is_ascending(self, indicator: str) -> bool:
+        """指标是否按升序排名（值越小越好）"""
+        return self.get(indicator).ascending
+
+    def format(self, indicator: str, value) -> str:
+        """
+        按指标的展示格式格式化数值
+
+        指标名称以 _同比/_环比 结尾时按变动格式格式化，例如 pp("退货率_同比", -0.01)
+        """
+        for suffix in DELTA_SUFFIXES:
+            if indicator.endswith(suffix):
+                return format_value(self.get(indicator[: -len(suffix)]).delta_format, value)
+        return format_value(self.get(indicator).value_format, value)
+
+    def _build(self, name: str) -> IndicatorMeta:
+        """根据关键词推断指标元数据，并应用配置的覆盖项"""
+        ascending = any(keyword in name for keyword in self.asc_ordered_keywords)
+        meta = IndicatorMeta(
+            name=name,
+            ascending=ascending,
+            value_format=self._infer_value_format(name),
+            delta_format=self._infer_delta_format(name),
+            polarity=-1 if ascending else 1,
+        )
+        override = self._overrides.get(name)
+        if override:
+            meta = replace(meta, **override)
+        return meta
+
+    def _infer_value_format(self, name: str) -> str:
+        if "排名" in name:
+            return RANK
+        if any(keyword in name for keyword in self.percentage_keywords):
+            return PERCENT
+        if "客户数" in name or "降级至其它" in name or "升级至其它" in name:
+            return INTEGER
+        if "零售综合考评等级" in name:
+            return GRADE
+        return DECIMAL
+
+    def _infer_delta_format(self, name: str) -> str:
+        if "排名" in name:
+            return RANK_CHANGE
+        if any(keyword in name for keyword in ["成本率", "定价"]):
+            return BPS
+        if any(keyword in name for keyword in ["占比", "比例"]):
+            return PCT_POINT
+        return self._infer_value_format(name)
+
+    @staticmethod
+    def _parse_overrides(overrides_df: Optional[pd.DataFrame]) -> Dict[str, dict]:
+        """解析“指标属性”配置页：指标名称、排序方向、数值格式、变动格式、正负向"""
+        overrides = {}
+        if overrides_df is None or "指标名称" not in overrides_df.columns:
+            return overrides
+        columns = {
+            "排序方向": ("ascending", SORT_ALIASES),
+            "数值格式": ("value_format", FORMAT_ALIASES),
+            "变动格式": ("delta_format", FORMAT_ALIASES),
+            "正负向": ("polarity", POLARITY_ALIASES),
+        }
+        codes = set(FORMAT_ALIASES.values())
+        for _, row in overrides_df.iterrows():
+            if pd.isna(row["指标名称"]):
+                continue
+            override = {}
+            for column, (field, aliases) in columns.items():
+                if column not in overrides_df.columns or pd.isna(row[column]):
+                    continue
+                raw = str(row[column]).strip()
+                value = aliases.get(raw, aliases.get(raw.lower()))
+                if value is None and field.endswith("_format") and raw in codes:
+                    value = raw
+                if value is None:
+                    logger.warning("指标属性配置无法识别：%s %s=%s", row["指标名称"], column, raw)
+                    continue
+                override[field] = value
+            # 只配置了排序方向时，正负向随排序方向变化
+            if "ascending" in override and "polarity" not in override:
+                override["polarity"] = -1 if override["ascending"] else 1
+            overrides[str(row["指标名称"]).strip()] = override
+        return overrides
+
+
+def format_value(value_format: str, value) -> str:
+    """按格式代码格式化数值"""
+    if value_format == RANK_CHANGE:
+        rank_change = int(value)
+        if rank_change == 0:
+            return "排名位次不变"
+        return f"排名位次{'上升' if value < 0 else '下降'}{abs(rank_change):d}位"
+    if value_format == RANK:
+        return f"第{int(value):d}名"
+    if value_format == BPS:
+        return f"{int(value * 10000):+d}Bps"
+    if value_format == PCT_POINT:
+        return f"{value * 100:.2f}个百分点"
+    if value_format == PERCENT:
+        return f"{value:.2%}"
+    if value_format == INTEGER:
+        return f"{int(value)}"
+    if value_format == GRADE:
+        return _GRADE_MAPPING.get(value)
+    return f"{value:.1f}"
@@ -0,0 +1,319 @@
+"""
+排名立方体模块
+
+“机构分组”配置页除 机构分组 列外，可以再配置多列更高层级的分组（如 区域、机构层级），
+另有内置的“全部机构”层级。加载数据时对每个层级做一次分组排序，得到每个
+(数据日期, 指标名称, 分组) 下各机构的排名向量；组内排名算子和指标排名表直接按下标读取任意层级的排名，
+不再逐次排序。
+组内分位算子用到的分布（各分组由好到差排好序的取值、中位数和四分位数）在第一次使用时按层级一次性构建：
+整个层级只排序一次，各分组的分位数按分组的起止下标向量化计算，之后每个机构只做二分查找。
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from aa.report_generators.operators import frame_cache
+
+logger = logging.getLogger(__name__)
+
+# 默认层级：窄表中的机构分组列
+PRIMARY_LEVEL = "机构分组"
+# 内置层级：全部机构为一组
+ALL_ORGS_LEVEL = "全部机构"
+ALL_ORGS_GROUP = "全部机构"
+
+
+def parse_group_levels(groups_df: Optional[pd.DataFrame]) -> Dict[str, Dict[str, str]]:
+    """
+    解析“机构分组”配置页中的分组层级
+
+    机构名称、机构分组 之外有列名的列均视为分组层级，按列的先后顺序排列，未命名的列（Unnamed: n）忽略。
+
+    Returns:
+        层级名称 -> {机构名称: 分组}，不含默认层级和全部机构层级
+    """
+    levels = {}
+    if groups_df is None or "机构名称" not in groups_df.columns:
+        return levels
+    for column in groups_df.columns:
+        if column in ("机构名称", PRIMARY_LEVEL) or str(column).startswith("Unnamed"):
+            continue
+        mapping = groups_df[["机构名称", column]].dropna()
+        levels[str(column)] = dict(zip(mapping["机构名称"].astype(str), mapping[column].astype(str)))
+    return levels
+
+
+class RankCube:
+    """各分组层级的组内排名"""
+
+    def __init__(
+        self,
+        all_data_melted_df: pd.DataFrame,
+        group_levels: Dict[str, Dict[str, str]],
+        is_ascending: Callable[[str], bool],
+        unique_keys: bool = False,
+    ):
+        """
+        Args:
+            all_data_melted_df: 窄表
+            group_levels: parse_group_levels 的结果
+            is_ascending: 指标是否按升序排名
+            unique_keys: 预处理时是否已保证 (数据日期, 机构名称, 指标名称) 唯一，是时不再去重
+        """
+        self.group_levels = group_levels
+        self.unique_keys = unique_keys
+        self.levels: List[str] = [PRIMARY_LEVEL, *group_levels, ALL_ORGS_LEVEL]
+        melted = all_data_melted_df[["数据日期", "指标名称", "机构名称", "指标值", "机构分组"]]
+        self.ascending = {
+            indicator: bool(is_ascending(indicator))
+            for indicator in melted["指标名称"].dropna().unique()
+        }
+        # 降序指标取相反数，所有指标统一按升序排名
+        sign = melted["指标名称"].map(lambda name: 1.0 if self.ascending.get(name, False) else -1.0)
+        self._signed = melted["指标值"].to_numpy(dtype="float64") * sign.to_numpy(dtype="float64")
+
+        # 层级 -> (机构名称数组, 指标值数组, 排名数组, {(数据日期, 指标名称, 分组): 下标数组}, 排序值数组)
+        self._levels: Dict[str, tuple] = {}
+        for level in self.levels:
+            self._levels[level] = self._build_level(melted, level)
+        # 层级 -> 各分组的分布，第一次使用时构建
+        self._distributions: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        logger.info("已构建排名立方体，层级：%s", self.levels)
+
+    def _build_level(self, melted: pd.DataFrame, level: str) -> tuple:
+        """对一个层级做一次分组排序"""
+        if level == PRIMARY_LEVEL:
+            groups = melted["机构分组"]
+        elif level == ALL_ORGS_LEVEL:
+            groups = pd.Series(ALL_ORGS_GROUP, index=melted.index)
+        else:
+            groups = melted["机构名称"].astype(str).map(self.group_levels[level])
+        frame = pd.DataFrame(
+            {
+                "数据日期": melted["数据日期"].to_numpy(),
+                "指标名称": melted["指标名称"].to_numpy(),
+                "分组": groups.to_numpy(),
+                "机构名称": melted["机构名称"].to_numpy(),
+                "指标值": melted["指标值"].to_numpy(dtype="float64"),
+                "排序值": self._signed,
+            }
+        ).dropna(subset=["分组", "排序值"])
+        if not self.unique_keys:
+            # 同一分组内重复的机构数据保留最后一条
+            frame = frame.drop_duplicates(
+                subset=["数据日期", "指标名称", "分组", "机构名称"], keep="last"
+            )
+        frame = frame.reset_index(drop=True)
+        grouped = frame.groupby(["数据日期", "指标名称", "分组"], sort=False)
+        ranks = grouped["排序值"].rank(method="min").to_numpy()
+        return (
+            frame["机构名称"].to_numpy(),
+            frame["指标值"].to_numpy(),
+            ranks,
+            grouped.indices,
+            frame["排序值"].to_numpy(),
+        )
+
+    @classmethod
+    def for_frame(
+        cls,
+        all_data_melted_df: pd.DataFrame,
+        group_levels: Dict[str, Dict[str, str]],
+        is_ascending: Callable[[str], bool],
+        unique_keys: bool = False,
+    ) -> "RankCube":
+        """获取数据集对应的排名立方体，同一数据集只构建一次"""
+        return frame_cache.get_or_build(
+            all_data_melted_df,
+            "rank_cube",
+            lambda: cls(all_data_melted_df, group_levels, is_ascending, unique_keys),
+        )
+
+    def ranking(
+        self, level: str, target_date: pd.Timestamp, indicator: str, group, ascending: bool
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        读取 (层级, 数据日期, 指标, 分组) 的组内排名
+
+        Returns:
+            (机构名称数组, 指标值数组, 排名数组)，机构按原有行序排列；
+            分组数据为空时返回None
+
+        Raises:
+            KeyError: 层级不存在或排序方向与构建时不一致，调用方应改为现场计算
+        """
+        if self.ascending.get(indicator, ascending) != ascending:
+            raise KeyError(indicator)
+        orgs, values, ranks, index, _ = self._levels[level]
+        positions = index.get((target_date, indicator, group))
+        if positions is None:
+            return None
+        return orgs[positions], values[positions], ranks[positions].astype(int)
+
+    def distribution(
+        self, level: str, target_date: pd.Timestamp, indicator: str, group, ascending: bool
+    ) -> Optional["GroupDistribution"]:
+        """
+        读取 (层级, 数据日期, 指标, 分组) 的取值分布
+
+        Returns:
+            GroupDistribution，分组数据为空时返回None
+
+        Raises:
+            KeyError: 层级不存在或排序方向与构建时不一致，调用方应改为现场计算
+        """
+        if self.ascending.get(indicator, ascending) != ascending:
+            raise KeyError(indicator)
+        with self._lock:
+            if level not in self._distributions:
+                self._distributions[level] = self._build_distributions(level)
+        codes, segments = self._distributions[level]
+        code = codes.get((target_date, indicator, group))
+        if code is None:
+            return None
+        return segments.group(code, 1.0 if ascending else -1.0)
+
+    def _build_distributions(self, level: str) -> tuple:
+        """整个层级按 (分组, 排序值) 排序一次，得到各分组的分布"""
+        orgs, values, _, index, signed = self._levels[level]
+        keys = list(index)
+        members = list(index.values())
+        group_codes = np.empty(len(signed), dtype=np.int64)
+        if members:
+            group_codes[np.concatenate(members)] = np.repeat(
+                np.arange(len(keys)), [len(positions) for positions in members]
+            )
+        segments = SortedSegments(orgs, values, signed, group_codes, len(keys))
+        return {key: code for code, key in enumerate(keys)}, segments
+
+
+@dataclass(frozen=True)
+class GroupDistribution:
+    """一个分组内的取值分布，各机构按由好到差排列"""
+
+    orgs: np.ndarray         # 机构名称
+    values: np.ndarray       # 指标值
+    keys: np.ndarray         # 排序值（降序指标取相反数），升序排列
+    sign: float              # 排序值 = sign × 指标值
+    median: float            # 中位数
+    upper_quartile: float    # 前25%的分界值
+    lower_quartile: float    # 后25%的分界值
+
+    @property
+    def best(self) -> float:
+        """组内最优的指标值"""
+        return float(self.values[0])
+
+    def percentile(self, value: float) -> float:
+        """
+        取值在组内的百分位（0~100）：组内最优为100，最差为0，并列时取中间位置
+
+        按排序值二分查找，不遍历组内机构。
+        """
+        count = len(self.keys)
+        if count <= 1:
+            return 100.0
+        key = self.sign * value
+        left = int(np.searchsorted(self.keys, key, side="left"))
+        right = int(np.searchsorted(self.keys, key, side="right"))
+        worse = count - right
+        ties = max(right - left, 1)
+        return 100.0 * (worse + (ties - 1) / 2) / (count - 1)
+
+    def quartile_band(self, value: float) -> str:
+        """取值所在的四分位区间，按组内的四分位数和中位数划分"""
+        key = self.sign * value
+        if key <= self.sign * self.upper_quartile:
+            return "前25%"
+        if key <= self.sign * self.median:
+            return "25%~50%"
+        if key <= self.sign * self.lower_quartile:
+            return "50%~75%"
+        return "后25%"
+
+    @classmethod
+    def from_values(
+        cls, orgs: np.ndarray, values: np.ndarray, ascending: bool
+    ) -> Optional["GroupDistribution"]:
+        """由一个分组的机构和取值构建分布，取值全部为空时返回None"""
+        values = np.asarray(values, dtype="float64")
+        present = ~np.isnan(values)
+        if not present.any():
+            return None
+        sign = 1.0 if ascending else -1.0
+        segments = SortedSegments(
+            np.asarray(orgs)[present],
+            values[present],
+            sign * values[present],
+            np.zeros(int(present.sum()), dtype=np.int64),
+            1,
+        )
+        return segments.group(0, sign)
+
+
+class SortedSegments:
+    """多个分组的取值一次排序后按分组连续存放，分位数按各分组的起止下标向量化计算"""
+
+    def __init__(
+        self,
+        orgs: np.ndarray,
+        values: np.ndarray,
+        keys: np.ndarray,
+        group_codes: np.ndarray,
+        n_groups: int,
+    ):
+        order = np.lexsort((keys, group_codes))
+        self.orgs = orgs[order]
+        self.values = values[order]
+        self.keys = keys[order]
+        self.counts = np.bincount(group_codes, minlength=n_groups)
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.median = self._quantile(0.5)
+        self.upper_quartile = self._quantile(0.25)
+        self.lower_quartile = self._quantile(0.75)
+
+    def _quantile(self, q: float) -> np.ndarray:
+        """各分组排序值的分位数（线性插值），空分组为NaN"""
+        result = np.full(len(self.counts), np.nan)
+        present = self.counts > 0
+        position = self.starts[present] + q * (self.counts[present] - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        result[present] = self.keys[low] + (self.keys[high] - self.keys[low]) * (position - low)
+        return result
+
+    def group(self, code: int, sign: float) -> GroupDistribution:
+        """第code个分组的分布，分位数换算回指标值"""
+        start, stop = self.starts[code], self.starts[code] + self.counts[code]
+        return GroupDistribution(
+            orgs=self.orgs[start:stop],
+            values=self.values[start:stop],
+            keys=self.keys[start:stop],
+            sign=sign,
+            median=float(sign * self.median[code]),
+            upper_quartile=float(sign * self.upper_quartile[code]),
+            lower_quartile=float(sign * self.lower_quartile[code]),
+        )
+
+
+def level_group(
+    group_levels: Dict[str, Dict[str, str]], level: str, org: str, primary_group
+) -> Optional[str]:
+    """机构在某一层级下所属的分组，primary_group 为机构在窄表中的机构分组"""
+    if level == PRIMARY_LEVEL:
+        return primary_group
+    if level == ALL_ORGS_LEVEL:
+        return ALL_ORGS_GROUP
+    return group_levels.get(level, {}).get(str(org))
+
+
+def level_members(
+    group_levels: Dict[str, Dict[str, str]], level: str, group
+) -> Optional[Iterable[str]]:
+    """层级中某一分组的全部机构，全部机构层级返回None（不限机构）"""
+    if level == ALL_ORGS_LEVEL:
+        return None
+    return {org for org, value in group_levels.get(level, {}).items() if value == group}
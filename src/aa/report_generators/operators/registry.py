@@ -0,0 +1,198 @@
+"""
+算子注册表模块
+
+算子名称到算子类的映射。算子以 "模块:类名" 的形式登记，第一次使用时才导入模块。
+算子来源（按优先级）：
+- 报告配置中的 operator_plugins，如 {行业对标: mypkg.operators:BenchmarkOperator}
+- 内置算子（当期值、组内排名、年同比等）以及按名称生成的趋势类算子（近N月趋势、连续月趋势等）
+- 已安装的Python包通过入口点（entry point）组 aa.operators 登记的算子，入口点名称即算子名称
+内置算子导入失败时直接抛出异常；operator_plugins和入口点算子导入失败时记录错误，算子按未知操作符处理，
+失败不缓存，下次解析时重新导入。
+"""
+import importlib
+import logging
+import threading
+from importlib.metadata import entry_points
+from typing import Callable, Dict, Mapping, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "aa.operators"
+
+_DEFAULT_OPERATORS_MODULE = "aa.report_generators.operators.default_operators"
+
+# 内置算子：算子名称 -> "模块:类名"
+BUILTIN_OPERATORS = {
+    "当期值": f"{_DEFAULT_OPERATORS_MODULE}:CurrentValueOperator",
+    "组内排名": f"{_DEFAULT_OPERATORS_MODULE}:RankingOperator",
+    "组内分位": f"{_DEFAULT_OPERATORS_MODULE}:PercentileOperator",
+    "近3月趋势": f"{_DEFAULT_OPERATORS_MODULE}:TrendLast3MonthsOperator",
+    "近3季度趋势": f"{_DEFAULT_OPERATORS_MODULE}:TrendLast3QuartersOperator",
+    "近3年趋势": f"{_DEFAULT_OPERATORS_MODULE}:TrendLast3YearsOperator",
+    "年同比": f"{_DEFAULT_OPERATORS_MODULE}:YearOverYearOperator",
+    "月环比": f"{_DEFAULT_OPERATORS_MODULE}:MonthOverMonthOperator",
+    "异常波动": f"{_DEFAULT_OPERATORS_MODULE}:AnomalyOperator",
+}
+# 按名称生成算子的解析函数：算子名称 -> 算子类或None
+BUILTIN_RESOLVERS = (f"{_DEFAULT_OPERATORS_MODULE}:resolve_trend_operator",)
+
+OperatorSpec = Union[str, type]
+
+
+def load_object(spec: str):
+    """
+    按 "模块:对象名" 导入对象
+
+    Raises:
+        ValueError: 格式错误时
+        ImportError, AttributeError: 模块或对象不存在时
+    """
+    module_name, _, attr = str(spec).partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"算子路径格式应为 模块:类名：{spec}")
+    obj = importlib.import_module(module_name.strip())
+    for part in attr.strip().split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+class OperatorRegistry:
+    """算子注册表，算子在第一次解析时导入并缓存"""
+
+    def __init__(
+        self,
+        operators: Optional[Mapping[str, OperatorSpec]] = None,
+        resolvers: Sequence[Union[str, Callable]] = (),
+        parent: Optional["OperatorRegistry"] = None,
+        use_entry_points: bool = False,
+        isolate_failures: bool = False,
+    ):
+        """
+        Args:
+            operators: 算子名称 -> "模块:类名" 或算子类
+            resolvers: 按名称生成算子的解析函数（或其 "模块:函数名"）
+            parent: 上级注册表，本注册表中找不到的算子到上级查找
+            use_entry_points: 是否查找入口点登记的算子
+            isolate_failures: operators中的算子导入失败时是否只记录错误而不抛出异常（用于operator_plugins）
+        """
+        self._specs: Dict[str, OperatorSpec] = dict(operators or {})
+        self._resolvers = list(resolvers)
+        self._parent = parent
+        self._use_entry_points = use_entry_points
+        self._entry_points = None
+        self._isolate_failures = isolate_failures
+        self._loaded: Dict[str, Optional[type]] = {}
+        # 导入失败的算子名称 -> 出错信息
+        self._failures: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "OperatorRegistry":
+        """内置算子和入口点算子组成的注册表"""
+        return cls(BUILTIN_OPERATORS, BUILTIN_RESOLVERS, use_entry_points=True)
+
+    def with_plugins(self, plugins: Optional[Mapping[str, OperatorSpec]]) -> "OperatorRegistry":
+        """
+        在本注册表之上叠加报告配置中的算子，不修改本注册表
+
+        Args:
+            plugins: 报告配置中的 operator_plugins，算子名称 -> "模块:类名"
+        """
+        if not plugins:
+            return self
+        if not isinstance(plugins, Mapping):
+            logger.warning("operator_plugins应为 算子名称: 模块:类名 的映射，已忽略")
+            return self
+        return OperatorRegistry(plugins, parent=self, isolate_failures=True)
+
+    def names(self) -> list:
+        """已登记的算子名称（不含按名称生成的算子）"""
+        names = list(self._parent.names()) if self._parent is not None else []
+        names.extend(name for name in self._specs if name not in names)
+        if self._use_entry_points:
+            names.extend(name for name in self._discover_entry_points() if name not in names)
+        return names
+
+    def resolve(self, operator_type: str) -> Optional[type]:
+        """
+        根据算子名称返回算子类，无法识别或插件算子导入失败时返回None
+
+        Raises:
+            ImportError, AttributeError, TypeError: 内置算子导入失败时
+        """
+        with self._lock:
+            if operator_type in self._loaded:
+                return self._loaded[operator_type]
+        handler = self._resolve(operator_type)
+        if handler is None and self.load_error(operator_type) is not None:
+            # 导入失败不缓存，下次解析时重新导入
+            return None
+        with self._lock:
+            return self._loaded.setdefault(operator_type, handler)
+
+    def load_error(self, operator_type: str) -> Optional[str]:
+        """插件算子最近一次导入失败的出错信息，未失败时返回None"""
+        with self._lock:
+            error = self._failures.get(operator_type)
+        if error is None and self._parent is not None:
+            return self._parent.load_error(operator_type)
+        return error
+
+    def _resolve(self, operator_type: str) -> Optional[type]:
+        spec = self._specs.get(operator_type)
+        if spec is not None:
+            return self._load(operator_type, spec, self._isolate_failures)
+        if self._parent is not None:
+            handler = self._parent.resolve(operator_type)
+            if handler is not None:
+                return handler
+        for resolver in self._resolvers:
+            if isinstance(resolver, str):
+                resolver = load_object(resolver)
+            handler = resolver(operator_type)
+            if handler is not None:
+                return handler
+        if self._use_entry_points:
+            entry_point = self._discover_entry_points().get(operator_type)
+            if entry_point is not None:
+                return self._load(operator_type, entry_point, isolate=True)
+        return None
+
+    def _load(self, operator_type: str, spec, isolate: bool) -> Optional[type]:
+        """
+        导入算子类并检查是否实现了handle方法
+
+        Args:
+            isolate: 导入失败时是否只记录错误并返回None，否则抛出异常
+        """
+        try:
+            if isinstance(spec, type):
+                handler = spec
+            elif hasattr(spec, "load"):
+                handler = spec.load()
+            else:
+                handler = load_object(spec)
+            if not callable(getattr(handler, "handle", None)):
+                raise TypeError(f"算子未实现handle方法：{operator_type}（{spec}）")
+        except Exception as e:
+            if not isolate:
+                raise
+            logger.error("算子导入失败：%s（%s）", operator_type, e)
+            with self._lock:
+                self._failures[operator_type] = str(e)
+            return None
+        with self._lock:
+            self._failures.pop(operator_type, None)
+        logger.info("已加载算子：%s", operator_type)
+        return handler
+
+    def _discover_entry_points(self) -> dict:
+        """查找入口点登记的算子，只查找一次"""
+        if self._entry_points is None:
+            try:
+                found = {ep.name: ep for ep in entry_points(group=ENTRY_POINT_GROUP)}
+            except Exception as e:
+                logger.warning("查找算子入口点失败：%s", e)
+                found = {}
+            self._entry_points = found
+        return self._entry_points
@@ -0,0 +1,263 @@
+"""
+趋势计算引擎
+
+将窄表中的月末数据整理为 (机构, 指标) × 月份 的稠密矩阵，按周期类型（月/季度/年）
+和窗口长度取出时间窗口，对所有序列一次性向量化计算斜率、连续变动期数和拐点。
+配置了聚合方式的指标，季度、年度窗口直接读取预先计算的汇总矩阵。
+同一数据日期、同一窗口的计算结果被缓存，生成多个机构的报告时只计算一次。
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import pandas as pd
+from aa.report_generators.operators import frame_cache
+
+logger = logging.getLogger(__name__)
+
+# 周期类型 -> 相邻两期间隔的月数
+PERIOD_STEPS = {"月": 1, "季度": 3, "年": 12}
+# 周期类型 -> 数据日期不完整时的提示用语
+PERIOD_LABELS = {"月": "个月末", "季度": "个季度末", "年": "个年末"}
+
+
+def month_id(date: pd.Timestamp) -> int:
+    """将日期转换为自公元0年起的月序号"""
+    return date.year * 12 + date.month - 1
+
+
+def anchor_month_id(period_kind: str, target_date: pd.Timestamp) -> int:
+    """
+    计算窗口最后一期对应的月序号
+
+    月、季度以数据日期所在月为最后一期；年以最近一个已结束的年末为最后一期
+    （数据日期为12月31日时即为当年年末）。
+    """
+    if period_kind == "年" and not (target_date.month == 12 and target_date.day == 31):
+        return (target_date.year - 1) * 12 + 11
+    return month_id(target_date)
+
+
+def period_id(period_kind: str, dates: pd.Series) -> pd.Series:
+    """汇总周期的周期号：季度为 年×4+季度序号，年为年份"""
+    if period_kind == "季度":
+        return dates.dt.year * 4 + (dates.dt.month - 1) // 3
+    return dates.dt.year
+
+
+def rollup_anchor(period_kind: str, target_date: pd.Timestamp) -> int:
+    """
+    汇总趋势窗口最后一期的周期号
+
+    取数据日期当天或之前最近一个已结束的季度、年度，与年度趋势取最近一个年末的规则一致。
+    """
+    quarter_end = target_date.month % 3 == 0 and target_date.is_month_end
+    if period_kind == "季度":
+        current = target_date.year * 4 + (target_date.month - 1) // 3
+        return current if quarter_end else current - 1
+    year_end = target_date.month == 12 and target_date.day == 31
+    return target_date.year if year_end else target_date.year - 1
+
+
+def window_months(
+    period_kind: str, length: int, target_date: pd.Timestamp, rollup: bool = False
+) -> list:
+    """
+    趋势窗口用到的月份（月序号），供预检判断数据是否齐全
+
+    Args:
+        period_kind: 周期类型，月/季度/年
+        length: 窗口期数（含当期）
+        target_date: 数据日期
+        rollup: 指标是否按汇总值计算季度、年度趋势，是时需要窗口内各周期的全部月份
+    """
+    if rollup and period_kind in ("季度", "年"):
+        anchor_period = rollup_anchor(period_kind, target_date)
+        months = []
+        for period in range(anchor_period - length + 1, anchor_period + 1):
+            if period_kind == "季度":
+                year, quarter = divmod(period, 4)
+                first = year * 12 + quarter * 3
+                months.extend(range(first, first + 3))
+            else:
+                months.extend(range(period * 12, period * 12 + 12))
+        return months
+    step = PERIOD_STEPS[period_kind]
+    anchor = anchor_month_id(period_kind, target_date)
+    return [anchor - step * k for k in range(length - 1, -1, -1)]
+
+
+@dataclass(frozen=True)
+class TrendWindow:
+    """一个时间窗口上所有序列的趋势计算结果，各数组按序列行号对齐"""
+
+    values: np.ndarray          # 窗口内的指标值 (序列数 × 窗口长度)
+    has_any: np.ndarray         # 窗口内是否至少有一期数据
+    complete: np.ndarray        # 窗口内各期数据是否齐全
+    slope: np.ndarray           # 最小二乘斜率（每期变动量）
+    last_direction: np.ndarray  # 最后一期相对上一期的变动方向 1/-1/0
+    streak: np.ndarray          # 截至最后一期，同方向连续变动的期数
+    flat: np.ndarray            # 窗口内各期是否完全持平
+
+
+class TrendEngine:
+    """按数据集构建的趋势计算引擎"""
+
+    def __init__(self, all_data_melted_df: pd.DataFrame, rollup_df: Optional[pd.DataFrame] = None):
+        df = all_data_melted_df[["数据日期", "机构名称", "指标名称", "指标值"]]
+        df = df[df["数据日期"].dt.is_month_end & df["指标值"].notna()]
+
+        months = (df["数据日期"].dt.year * 12 + df["数据日期"].dt.month - 1).to_numpy()
+        # 机构、指标分别编码后组合为序列编号，避免对字符串组合键做哈希
+        org_codes, orgs = pd.factorize(df["机构名称"])
+        indicator_codes, indicators = pd.factorize(df["指标名称"])
+        n_indicators = max(len(indicators), 1)
+        pair_codes = org_codes.astype("int64") * n_indicators + indicator_codes
+        pairs, codes = np.unique(pair_codes, return_inverse=True)
+        self.series_index = {
+            (str(orgs[p // n_indicators]), str(indicators[p % n_indicators])): i
+            for i, p in enumerate(pairs)
+        }
+        self.base_month = int(months.min()) if len(months) else 0
+        n_months = int(months.max()) - self.base_month + 1 if len(months) else 0
+
+        # 同一序列同一月份存在重复记录时保留最后一条
+        keys = pd.DataFrame({"code": codes, "month": months - self.base_month})
+        last = ~keys.duplicated(keep="last").to_numpy()
+
+        self.values = np.full((len(pairs), n_months), np.nan)
+        self.values[codes[last], keys["month"].to_numpy()[last]] = (
+            df["指标值"].to_numpy(dtype="float64")[last]
+        )
+
+        # 配置了聚合方式的指标，季度、年度趋势读取汇总值而不是季末、年末的月度快照
+        self.rollups = self._build_rollups(rollup_df) if rollup_df is not None else {}
+
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _build_rollups(self, rollup_df: pd.DataFrame) -> dict:
+        """
+        将汇总窄表整理为 周期类型 -> (序列行号数组, 序列 × 周期 矩阵, 起始周期号)
+
+        配置了聚合方式的指标，其所有序列都按汇总值计算，即使尚无月份齐全的周期；
+        月份不全的周期为缺失值，算子提示数据不全，不会改用季末、年末的月度快照。
+        """
+        rollups = {}
+        for period_kind, months_per_period in (("季度", 3), ("年", 12)):
+            df = rollup_df[rollup_df["周期类型"] == period_kind]
+            configured = set(df["指标名称"].astype(str))
+            series_rows = np.array(
+                sorted(
+                    row for (_, indicator), row in self.series_index.items()
+                    if indicator in configured
+                ),
+                dtype=int,
+            )
+            if not len(series_rows):
+                continue
+            rows = np.array(
+                [
+                    self.series_index.get((str(org), str(indicator)), -1)
+                    for org, indicator in zip(df["机构名称"], df["指标名称"])
+                ],
+                dtype=int,
+            )
+            keep = (rows >= 0) & (df["月份数"] == months_per_period).to_numpy()
+            periods = period_id(period_kind, df["数据日期"]).to_numpy()
+            base = int(periods.min())
+            values = np.full((len(series_rows), int(periods.max()) - base + 1), np.nan)
+            codes = np.searchsorted(series_rows, rows[keep])
+            values[codes, periods[keep] - base] = df["指标值"].to_numpy(dtype="float64")[keep]
+            rollups[period_kind] = (series_rows, values, base)
+        return rollups
+
+    @classmethod
+    def for_frame(cls, all_data_melted_df: pd.DataFrame) -> "TrendEngine":
+        """获取数据集对应的引擎实例，同一数据集只构建一次；使用SQLite指标库时只读取月末数据构建"""
+        def build():
+            store = frame_cache.get(all_data_melted_df, "metric_store")
+            return cls(
+                store.month_end_frame() if store is not None else all_data_melted_df,
+                frame_cache.get(all_data_melted_df, "rollup"),
+            )
+
+        return frame_cache.get_or_build(all_data_melted_df, "trend_engine", build)
+
+    def series_row(self, org: str, indicator: str) -> Optional[int]:
+        """返回 (机构, 指标) 序列的行号，不存在时返回None"""
+        return self.series_index.get((org, indicator))
+
+    def window(self, period_kind: str, length: int, target_date: pd.Timestamp) -> TrendWindow:
+        """
+        计算指定时间窗口上所有序列的趋势结果
+
+        Args:
+            period_kind: 周期类型，月/季度/年
+            length: 窗口期数（含当期）
+            target_date: 数据日期
+
+        Returns:
+            TrendWindow
+        """
+        step = PERIOD_STEPS[period_kind]
+        anchor = anchor_month_id(period_kind, target_date)
+        key = (step, length, anchor)
+        with self._lock:
+            cached = self._windows.get(key)
+        if cached is not None:
+            return cached
+
+        columns = anchor - self.base_month - step * np.arange(length - 1, -1, -1)
+        in_range = (columns >= 0) & (columns < self.values.shape[1])
+        values = np.full((self.values.shape[0], length), np.nan)
+        values[:, in_range] = self.values[:, columns[in_range]]
+
+        if period_kind in self.rollups:
+            series_rows, rollup_values, base = self.rollups[period_kind]
+            anchor_period = rollup_anchor(period_kind, target_date)
+            periods = anchor_period - base - np.arange(length - 1, -1, -1)
+            in_range = (periods >= 0) & (periods < rollup_values.shape[1])
+            window_values = np.full((len(series_rows), length), np.nan)
+            window_values[:, in_range] = rollup_values[:, periods[in_range]]
+            values[series_rows] = window_values
+
+        present = ~np.isnan(values)
+        diffs = np.diff(values, axis=1)
+        directions = np.sign(diffs)
+
+        # 最小二乘斜率：sum((x - x̄) * y) / sum((x - x̄)^2)
+        x = np.arange(length) - (length - 1) / 2
+        denominator = float((x * x).sum()) or 1.0
+        with np.errstate(invalid="ignore"):
+            slope = values @ x / denominator
+
+        if length > 1:
+            last_direction = directions[:, -1]
+            same = (directions == last_direction[:, None]) & (directions != 0)
+            streak = np.cumprod(same[:, ::-1], axis=1).sum(axis=1)
+            flat = (directions == 0).all(axis=1)
+        else:
+            last_direction = np.zeros(len(values))
+            streak = np.zeros(len(values), dtype=int)
+            flat = np.ones(len(values), dtype=bool)
+
+        result = TrendWindow(
+            values=values,
+            has_any=present.any(axis=1),
+            complete=present.all(axis=1),
+            slope=slope,
+            last_direction=np.nan_to_num(last_direction).astype(int),
+            streak=streak.astype(int),
+            flat=flat,
+        )
+        with self._lock:
+            return self._windows.setdefault(key, result)
+
+    def full_window(self, period_kind: str, target_date: pd.Timestamp) -> TrendWindow:
+        """以全部历史为窗口计算趋势结果，用于连续变动期数的检测"""
+        step = PERIOD_STEPS[period_kind]
+        anchor = anchor_month_id(period_kind, target_date)
+        length = max((anchor - self.base_month) // step + 1, 1)
+        return self.window(period_kind, length, target_date)
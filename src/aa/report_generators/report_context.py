@@ -0,0 +1,26 @@
+"""报告运行上下文模块
+
+一份报告（一个机构、一个数据日期）生成过程中用到的全部可变状态都放在运行上下文中，
+由生成器显式传给各章节处理函数和算子，不再修改模块全局变量或报告配置。
+多个生成器（包括使用不同数据预处理配置的生成器）因此可以在同一进程的多个线程中并行运行。
+"""
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, List, Mapping
+from aa.report_generators.operators.indicator_catalog import IndicatorCatalog
+
+
+@dataclass(frozen=True)
+class ReportContext:
+    """一份报告的运行上下文"""
+
+    catalog: IndicatorCatalog  # 指标目录：排序方向、展示格式、正负向
+    head: Mapping[str, object]  # 本份报告的head参数（org_name为单个机构）
+    rank_rows: List[dict] = field(default_factory=list)  # 指标排名表的行，渲染时一次性构建表格
+    results: Dict[tuple, str] = field(default_factory=dict)  # 算子结果：(指标, 算子序号, 输出列) -> 文本
+    data_dt_remarks: Dict[int, str] = field(default_factory=dict)  # 指标 -> 数据日期备注
+
+    @classmethod
+    def create(cls, catalog: IndicatorCatalog, head: dict, **overrides) -> "ReportContext":
+        """根据报告配置的head和覆盖参数创建运行上下文，head只读"""
+        return cls(catalog, MappingProxyType({**head, **overrides}))
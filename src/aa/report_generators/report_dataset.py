@@ -0,0 +1,196 @@
+"""报告数据集模块
+
+封装报告生成所需的只读数据：数据预处理配置、预处理后的宽表和窄表（或SQLite指标库）、
+指标立方体、排名立方体、数据覆盖索引以及指标目录。
+数据集只加载一次，可以被多个报告生成器共享，算子的派生索引缓存也随数据集共享。
+"""
+import logging
+import time
+from pathlib import Path
+from typing import Optional, Union
+import pandas as pd
+from aa.data_loader.conflict_resolver import CONFLICT_SHEET
+from aa.data_loader.metric_cube import CUBE_FILE_NAME, MetricCube
+from aa.data_loader.metric_store import MetricStore, is_store_file
+from aa.data_loader.xlsx_stream import read_split_sheet
+from aa.report_generators.operators import frame_cache
+from aa.report_generators.operators.calendar_index import CalendarIndex
+from aa.report_generators.operators.coverage_index import CoverageIndex
+from aa.report_generators.operators.indicator_catalog import IndicatorCatalog
+from aa.report_generators.operators.rank_cube import RankCube, parse_group_levels
+from aa.utils.config_parser import parse_data_extraction_config
+from aa.utils.dtype_coercion import MELTED_SCHEMA, coerce_frame
+from aa.utils.run_metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class ReportDataset:
+    """报告生成共享的只读数据集"""
+
+    def __init__(
+        self,
+        data_extraction_config_file: Union[str, Path],
+        data_output_file: Union[str, Path],
+        metrics: Optional[RunMetrics] = None,
+    ):
+        """
+        Args:
+            data_extraction_config_file: 数据预处理配置文件路径
+            data_output_file: 预处理后的数据文件路径
+            metrics: 运行指标，数据集缓存和基于该数据集的报告生成记入其中
+        """
+        start = time.perf_counter()
+        self.metrics = metrics if metrics is not None else RunMetrics()
+        self.data_extraction_config_file = Path(data_extraction_config_file)
+        self.data_output_file = Path(data_output_file)
+        self.data_config_df_dict = parse_data_extraction_config(self.data_extraction_config_file)
+        self.metric_store: Optional[MetricStore] = None
+
+        try:
+            if is_store_file(self.data_output_file):
+                self._load_store()
+            else:
+                self._load_excel()
+        except FileNotFoundError as e:
+            raise RuntimeError(f"数据文件未找到: {e.filename}") from e
+        except Exception as e:
+            raise RuntimeError(f"初始化数据失败: {str(e)}") from e
+        frame_cache.bind_metrics(self.all_data_melted_df, self.metrics)
+
+        # 根据关键词配置和数据中的指标名称一次性构建指标目录
+        self.indicator_catalog = self._build_indicator_catalog()
+
+        # 预处理时已保证 (数据日期, 机构名称, 指标名称) 唯一的，算子跳过去重和记录数检查
+        self.unique_keys = self._load_uniqueness()
+        if self.unique_keys:
+            frame_cache.put(self.all_data_melted_df, "unique_keys", True)
+
+        # 季度、年度汇总（数据预处理配置了“指标聚合”页时生成），趋势算子按周期读取
+        self.rollup_df = self._load_rollup()
+        if self.rollup_df is not None:
+            frame_cache.put(self.all_data_melted_df, "rollup", self.rollup_df)
+
+        # 加载时构建日历索引，算子按期号计算比较期
+        self.calendar = CalendarIndex.for_frame(self.all_data_melted_df)
+        # 数据覆盖索引：最新数据日期和各月份是否有数据，供data_dt_rule和预检使用
+        self.coverage = CoverageIndex.for_frame(self.all_data_melted_df)
+
+        self.metric_cube = self._open_metric_cube()
+        if self.metric_cube is not None:
+            frame_cache.put(self.all_data_melted_df, "metric_cube", self.metric_cube)
+
+        # 多层级分组：每个层级做一次分组排序，算子直接读取排名；使用SQLite指标库时按需查询
+        self.group_levels = parse_group_levels(self.data_config_df_dict.get("机构分组"))
+        frame_cache.put(self.all_data_melted_df, "group_levels", self.group_levels)
+        self.rank_cube: Optional[RankCube] = None
+        if self.metric_store is None:
+            self.rank_cube = RankCube.for_frame(
+                self.all_data_melted_df,
+                self.group_levels,
+                self.indicator_catalog.is_ascending,
+                self.unique_keys,
+            )
+        self.metrics.inc("stage_duration_seconds", time.perf_counter() - start, stage="加载数据集")
+
+    def _load_excel(self):
+        """读取xlsx中的宽表和窄表"""
+        # 数据量超过Excel行数上限时，宽表和窄表会拆分为多个sheet（ALL_DATA_MELTED_2 …）
+        self.all_data_df = read_split_sheet(self.data_output_file, "ALL_DATA")
+        self.all_data_melted_df = read_split_sheet(self.data_output_file, "ALL_DATA_MELTED")
+        # 读取时统一字段类型，算子中无需再反复转换
+        wide_schema = {
+            col: dtype for col, dtype in MELTED_SCHEMA.items() if col in self.all_data_df.columns
+        }
+        self.all_data_df = coerce_frame(self.all_data_df, wide_schema, source="ALL_DATA")
+        self.all_data_melted_df = coerce_frame(
+            self.all_data_melted_df, MELTED_SCHEMA, source="ALL_DATA_MELTED"
+        )
+
+    def _load_store(self):
+        """
+        打开SQLite指标库，数据不整体读入内存
+
+        宽表和窄表为只有表头的空表，窄表作为数据集的标识，
+        指标库登记在其缓存上，算子通过参数化查询按需取数。
+        """
+        self.metric_store = MetricStore(self.data_output_file)
+        empty = pd.DataFrame({col: pd.Series(dtype="object") for col in MELTED_SCHEMA})
+        self.all_data_melted_df = coerce_frame(empty, MELTED_SCHEMA, source="ALL_DATA_MELTED")
+        self.all_data_df = self.all_data_melted_df[["数据日期", "机构分组", "机构名称"]].copy()
+        frame_cache.put(self.all_data_melted_df, "metric_store", self.metric_store)
+        logger.info("已打开指标库：%s", self.data_output_file)
+
+    def _load_rollup(self) -> Optional[pd.DataFrame]:
+        """读取季度、年度汇总，未生成时返回None"""
+        if self.metric_store is not None:
+            rollup_df = self.metric_store.rollup_frame()
+        else:
+            try:
+                rollup_df = read_split_sheet(self.data_output_file, "ALL_DATA_ROLLUP")
+            except ValueError:
+                return None
+            rollup_df["数据日期"] = pd.to_datetime(rollup_df["数据日期"], errors="coerce")
+        if rollup_df is not None:
+            logger.info("已读取季度、年度汇总：%s行", len(rollup_df))
+        return rollup_df
+
+    def _load_uniqueness(self) -> bool:
+        """预处理结果是否带有冲突报告（即已保证唯一），旧版本的预处理结果返回False"""
+        if self.metric_store is not None:
+            unique_keys = self.metric_store.unique_keys
+        else:
+            try:
+                conflict_df = read_split_sheet(self.data_output_file, CONFLICT_SHEET)
+            except ValueError:
+                conflict_df = None
+            unique_keys = conflict_df is not None
+            if unique_keys and not conflict_df.empty:
+                logger.info("预处理时处理了%s处数据冲突，明细见%s页", len(conflict_df), CONFLICT_SHEET)
+        if not unique_keys:
+            logger.info("预处理结果未标记唯一，算子将逐次去重")
+        return unique_keys
+
+    def indicator_names(self):
+        """数据中的全部指标名称"""
+        if self.metric_store is not None:
+            return self.metric_store.indicators()
+        return self.all_data_melted_df["指标名称"].unique()
+
+    def latest_date(self, org: str, indicator: str) -> Optional[pd.Timestamp]:
+        """(机构, 指标) 的最新数据日期，无数据时返回None"""
+        return self.coverage.latest_date(org, indicator)
+
+    def _build_indicator_catalog(self) -> IndicatorCatalog:
+        """构建指标目录：关键词配置 + 数据中的指标名称 + “指标属性”页的覆盖项"""
+        asc_keywords = self.data_config_df_dict['ASC_ORDERED_KEYWORDS']['关键词'].tolist()
+        percentage_keywords = self.data_config_df_dict['PERCENTAGE_KEYWORDS']['关键词'].tolist()
+        catalog = IndicatorCatalog(
+            asc_keywords,
+            percentage_keywords,
+            indicator_names=self.indicator_names(),
+            overrides_df=self.data_config_df_dict.get("指标属性"),
+        )
+        logger.info("已构建指标目录，ASC_ORDERED_KEYWORDS: %s", asc_keywords)
+        logger.info("已构建指标目录，PERCENTAGE_KEYWORDS: %s", percentage_keywords)
+        return catalog
+
+    def _open_metric_cube(self) -> Optional[MetricCube]:
+        """以内存映射方式打开与预处理结果同目录的指标立方体，不存在或已过期时返回None"""
+        cube_file = self.data_output_file.parent / CUBE_FILE_NAME
+        if not cube_file.exists():
+            return None
+        cube = MetricCube.open(self.data_output_file.parent)
+        if cube is None:
+            return None
+        if cube.is_stale(self.data_output_file):
+            logger.warning("指标立方体与预处理数据文件不一致，已忽略：%s", cube_file)
+            return None
+        if cube.duplicates:
+            logger.warning(
+                "指标立方体中有%s组重复的 (数据日期, 机构名称)，这些记录从窄表取数：%s",
+                len(cube.duplicates),
+                list(cube.duplicates)[:5],
+            )
+        logger.info("已映射指标立方体：%s %s", cube_file, cube.values.shape)
+        return cube
@@ -8,25 +8,55 @@
 """
 
 import logging
-from typing import Any
+from collections import Counter
+from typing import Any, List, Mapping, Optional
 from pathlib import Path
 import re
+import time
 import pandas as pd
 from aa.report_generators.base_generator import BaseReportGenerator
+from aa.report_generators.report_context import ReportContext
+from aa.report_generators.report_dataset import ReportDataset
 from aa.utils.config_loader import load_config
-from aa.utils.config_parser import parse_data_extraction_config
-from aa.report_generators.operators.default_operators import (
-    CurrentValueOperator,
-    RankingOperator,
-    TrendLast3MonthsOperator,
-    TrendLast3QuartersOperator,
-    TrendLast3YearsOperator,
-    YearOverYearOperator,
-    MonthOverMonthOperator,
+from aa.utils.run_metrics import RunMetrics
+from aa.report_generators.operators.base_operator import OperatorError
+from aa.report_generators.operators.coverage_index import month_label
+from aa.report_generators.operators.registry import OperatorRegistry
+from aa.report_generators.report_plan import (
+    IndicatorPlan,
+    ReportPlan,
+    SectionPlan,
+    compile_report_plan,
 )
 
 logger = logging.getLogger(__name__)
 
+# 内置算子和入口点算子，报告配置中的operator_plugins在此之上叠加
+OPERATOR_REGISTRY = OperatorRegistry.default()
+
+
+def resolve_operator(operator_type: str):
+    """根据算子名称返回算子类，无法识别时返回None"""
+    return OPERATOR_REGISTRY.resolve(operator_type)
+
+
+def month_end_dates(start_dt: str, end_dt: str) -> List[str]:
+    """
+    日期区间内的每个月末日期，如 ["2024-01-31", "2024-02-29", …]
+
+    Raises:
+        ValueError: 日期区间内没有月末日期
+    """
+    month_ends = pd.date_range(
+        pd.Timestamp(start_dt) + pd.offsets.MonthEnd(0),
+        pd.Timestamp(end_dt),
+        freq=pd.offsets.MonthEnd(),
+    )
+    if len(month_ends) == 0:
+        raise ValueError(f"日期区间内没有月末日期：{start_dt} ~ {end_dt}")
+    return [month_end.strftime("%Y-%m-%d") for month_end in month_ends]
+
+
 class ReportGenerator(BaseReportGenerator):
     """配置驱动的分析报告生成器"""
 
@@ -34,80 +64,94 @@ class ReportGenerator(BaseReportGenerator):
         self,
         report_config_file: [str, Path] = "config/report_config_零售业_分店.yaml",
         data_output_file: [str, Path] = "data/processed/data_preprocessed.xlsx",
-        data_extraction_config_file: [str, Path] = "config/data_extraction_config_样例_零售.xlsx"
+        data_extraction_config_file: [str, Path] = "config/data_extraction_config_样例_零售.xlsx",
+        dataset: Optional[ReportDataset] = None,
+        head_overrides: Optional[dict] = None,
+        metrics: Optional[RunMetrics] = None,
     ):
+        """
+        Args:
+            report_config_file: 报告配置文件路径
+            data_output_file: 预处理后的数据文件路径
+            data_extraction_config_file: 数据预处理配置文件路径
+            dataset: 已加载的共享数据集，传入时不再读取数据文件和数据预处理配置
+            head_overrides: 覆盖报告配置head中的参数，如 org_name、data_dt
+            metrics: 运行指标，未传入dataset时用于新加载的数据集；传入dataset时使用数据集的运行指标
+        """
         logger.info(
-            "支持的算子包括：当期值, 组内排名, 近3月趋势, 近3季度趋势, 年同比, 月环比"
+            "支持的算子包括：当期值, 组内排名, 近N月趋势, 近N季度趋势, 近N年趋势, "
+            "连续月趋势, 连续季度趋势, 连续年趋势, 年同比, 月环比"
         )
         super().__init__()
-        self.data_extraction_config_file = Path(data_extraction_config_file)
-        self.data_config_df_dict = parse_data_extraction_config(self.data_extraction_config_file)
-
-        # 更新default_operators模块中的关键词列表
-        from aa.report_generators.operators import default_operators
-        if ("ASC_ORDERED_KEYWORDS" in self.data_config_df_dict) and (
-            "PERCENTAGE_KEYWORDS" in self.data_config_df_dict
-        ):
-            asc_keywords = self.data_config_df_dict['ASC_ORDERED_KEYWORDS']['关键词'].tolist()
-            percentage_keywords = self.data_config_df_dict['PERCENTAGE_KEYWORDS']['关键词'].tolist()
-            default_operators.update_keywords(asc_keywords,percentage_keywords)
-
-        # 创建空的 DataFrame，指定列名和数据类型
-        self.indicator_rank_df = pd.DataFrame(columns=["维度", "指标名称", "组内排名"], dtype="string")
-
-        # 当前一级标题
-        self.current_level_title = ""
+        if dataset is None:
+            dataset = ReportDataset(data_extraction_config_file, data_output_file, metrics)
+        self.dataset = dataset
+        self.metrics = dataset.metrics
+        self.data_extraction_config_file = dataset.data_extraction_config_file
+        self.data_config_df_dict = dataset.data_config_df_dict
+        self.all_data_df = dataset.all_data_df
+        self.all_data_metled_df = dataset.all_data_melted_df
+        self.metric_cube = dataset.metric_cube
+        # 指标目录随运行上下文传给算子，不同数据集的生成器互不影响
+        self.indicator_catalog = dataset.indicator_catalog
 
         self.config = load_config(report_config_file)
-        try:
-            self.all_data_df = pd.read_excel(data_output_file, sheet_name="ALL_DATA")
-            self.all_data_metled_df = pd.read_excel(
-                data_output_file, sheet_name="ALL_DATA_MELTED"
-            )
-        except FileNotFoundError as e:
-            raise RuntimeError(f"数据文件未找到: {e.filename}") from e
-        except Exception as e:
-            raise RuntimeError(f"初始化数据失败: {str(e)}") from e
-
-    def generate(self, analysis_results: Any) -> dict:
+        if head_overrides:
+            self.config.setdefault("head", {}).update(head_overrides)
+        # 报告配置中的operator_plugins登记自定义算子，算子在第一次使用时导入
+        self.operator_registry = OPERATOR_REGISTRY.with_plugins(self.config.get("operator_plugins"))
+        # 报告模板只编译一次，所有机构共用同一执行计划
+        self.plan: ReportPlan = compile_report_plan(self.config, self._resolve_operator)
+        # 指标排名表的排名列，head中配置rank_levels时按层级并列展示
+        self.rank_columns = self._rank_columns(self.config.get("head", {}).get("rank_levels"))
+
+    def generate(self, analysis_results: Any, head_overrides: Optional[dict] = None) -> dict:
         """
         生成报告主入口
         :param analysis_results: 分析结果数据（暂未使用）
+        :param head_overrides: 本次生成覆盖的head参数（如 data_dt），不修改报告配置
         :return: 生成报告内容字符串
         """
-        report_content = []
+        report_dir = Path("reports/")
+        org_name_list = []
 
         # 处理报告头部信息
         if 'head' in self.config:
-            # 如配置了多个机构，则逐一生成报告
-            org_name_list = self.config["head"]["org_name"].split()
-            for _ in org_name_list:
-                report_content = []
-                # global indicator_rank_df
-                self.indicator_rank_df = self.indicator_rank_df.drop(self.indicator_rank_df.index)
-                self.config["head"]["org_name"] = _
-                report_content.append(self._process_head(self.config['head']))
+            head = {**self.config["head"], **(head_overrides or {})}
+            # 如配置了多个机构，则逐一生成报告，每个机构使用独立的运行上下文
+            org_name_list = head["org_name"].split()
+            contexts = [
+                ReportContext.create(self.indicator_catalog, head, org_name=org_name)
+                for org_name in org_name_list
+            ]
+            # 先按算子批量计算所有机构的结果，再逐一渲染
+            with self.metrics.stage("算子计算"):
+                self._run_operators(contexts)
+            for context in contexts:
+                render_start = time.perf_counter()
+                report_content = [self._process_head(context.head)]
 
                 # 处理主体章节
-                report_content.append(self._process_sections(self.config.get('sections', [])))
+                report_content.append(self._process_sections(self.plan.sections, context))
 
                 res = "\n".join(report_content)
 
                 # 保存Markdown文件
-                report_dir = Path("reports/")
                 # report_dir = Path("/Users/chenxin/Library/Mobile Documents/iCloud~md~obsidian/Documents/Vault/12 工作/项目/经营分析/AA分析报告")
                 report_dir.mkdir(parents=True, exist_ok=True)
 
                 # 清理文件名中的特殊字符
-                safe_title = self.config['head']['title'].replace(" ", "_").replace(":", "-")
-                safe_org = self.config['head']['org_name'].replace(" ", "_").replace(":", "-")
-                safe_date = self.config['head']['data_dt'].replace(" ", "_").replace(":", "-")
+                safe_title = context.head['title'].replace(" ", "_").replace(":", "-")
+                safe_org = context.head['org_name'].replace(" ", "_").replace(":", "-")
+                safe_date = context.head['data_dt'].replace(" ", "_").replace(":", "-")
 
                 filename = f"{safe_title}_{safe_org}_{safe_date}.md"
                 filepath = report_dir / filename
 
                 with open(filepath, "w", encoding="utf-8") as f:
                     f.write(res)
+                self.metrics.inc("reports_written_total")
+                self.metrics.inc("stage_duration_seconds", time.perf_counter() - render_start, stage="渲染报告")
 
         return {
             "status": "success",
@@ -115,7 +159,88 @@ class ReportGenerator(BaseReportGenerator):
             "report_dir": str(report_dir)
         }
 
-    def _process_head(self, head: dict) -> str:
+    def preflight(self, head_overrides: Optional[dict] = None) -> list:
+        """
+        预检：不生成报告，列出各机构、指标、算子计算所需但没有数据的期间
+
+        只检查声明了所需期间（required_periods）的算子，通过数据覆盖索引判断，不查询指标数据。
+        :param head_overrides: 覆盖的head参数（如 data_dt）
+        :return: 缺失记录列表，每条包括 机构名称、指标名称、算子、数据日期、缺失期间
+        """
+        with self.metrics.stage("预检"):
+            return self._preflight({**self.config.get("head", {}), **(head_overrides or {})})
+
+    def _preflight(self, head: dict) -> list:
+        """逐个机构检查算子所需期间"""
+        coverage = self.dataset.coverage
+        missing_rows = []
+        for org_name in str(head.get("org_name", "")).split():
+            context = ReportContext.create(self.indicator_catalog, head, org_name=org_name)
+            for handler_class, key, config, operator in self._operator_requests(context):
+                if key[2] != "A":
+                    continue
+                required_periods = getattr(handler_class, "required_periods", None)
+                if required_periods is None:
+                    continue
+                try:
+                    months = required_periods(config, self.all_data_metled_df)
+                except Exception as e:
+                    logger.warning(
+                        "预检时无法确定%s的%s所需期间：%s", config["indicator"], operator.operator_type, e
+                    )
+                    continue
+                if not months:
+                    continue
+                missing = coverage.missing(org_name, config["indicator"], months)
+                if not missing:
+                    continue
+                row = {
+                    "机构名称": org_name,
+                    "指标名称": config["indicator"],
+                    "算子": operator.operator_type,
+                    "数据日期": config["data_dt_rule"],
+                    "缺失期间": [month_label(month) for month in missing],
+                }
+                missing_rows.append(row)
+                logger.warning(
+                    "预检：%s %s %s（数据日期%s）缺少期间：%s",
+                    org_name,
+                    row["指标名称"],
+                    row["算子"],
+                    row["数据日期"],
+                    "、".join(row["缺失期间"]),
+                )
+        logger.info("预检完成，共%s项缺失", len(missing_rows))
+        return missing_rows
+
+    def generate_date_range(self, start_dt: str, end_dt: str) -> dict:
+        """
+        回溯生成日期区间内每个月末的报告
+
+        所有月份共用已加载的数据集和执行计划；按日期先后生成，
+        上月已计算的排名、取数结果在数据集缓存中，本月计算环比等时直接复用。
+
+        Args:
+            start_dt: 开始日期，如 "2024-01-31"
+            end_dt: 结束日期，如 "2024-12-31"
+
+        Returns:
+            生成结果，包括每个数据日期的报告机构
+        """
+        results = {}
+        for data_dt in month_end_dates(start_dt, end_dt):
+            report = self.generate({}, head_overrides={"data_dt": data_dt})
+            results[data_dt] = report["org_name"]
+            logger.info("已生成%s的报告：%s", data_dt, report["org_name"])
+
+        return {
+            "status": "success",
+            "data_dt": list(results),
+            "org_name": results,
+            "report_dir": "reports/",
+        }
+
+    def _process_head(self, head: Mapping) -> str:
         """处理报告头部信息"""
         header = []
         v1 = v2 = v3 = v4= ""
@@ -135,140 +260,206 @@ class ReportGenerator(BaseReportGenerator):
         # header.append(f"---")
         return '\n'.join(header)
 
-    def _process_sections(self, sections: list, level: int = 1) -> str:
-        """递归处理章节结构"""
+    def _process_sections(self, sections: tuple, context: ReportContext) -> str:
+        """按执行计划递归处理章节结构"""
         content = []
         for section in sections:
-            # 处理章节标题
-            if 'section_title' in section:
-                content.append(f"{'#' * (level+1)} {section['section_title']}\n")
-                if level == 1:
-                    # global current_level_title
-                    self.current_level_title = section['section_title']
-            # 处理普通内容
-            if 'content' in section:
-                content.append(section['content'] + "\n")
-
-            # 处理indicator_rank
-            if 'indicator_rank' in section:
-                content.append(self._process_indicator_rank()+ "")
-
-            # 处理指标项
-            if 'indicators' in section:
-                content.extend(self._process_indicators(section['indicators']))
-
-            # 递归处理子章节
-            if 'sections' in section:
-                content.append(self._process_sections(section['sections'], level + 1))
-
+            content.extend(self._process_section(section, context))
         return '\n'.join(content)
 
-    def _process_indicator_rank(self) -> str:
-        # global indicator_rank_df
+    def _process_section(self, section: SectionPlan, context: ReportContext) -> list:
+        """处理单个章节"""
+        content = []
+        # 处理章节标题
+        if section.title is not None:
+            content.append(f"{'#' * (section.level + 1)} {section.title}\n")
+        # 处理普通内容
+        if section.content is not None:
+            content.append(section.content + "\n")
+
+        # 处理indicator_rank
+        if section.indicator_rank:
+            content.append(self._process_indicator_rank(context) + "")
+
+        # 处理指标项
+        if section.indicators:
+            content.extend(self._process_indicators(section, context))
+
+        # 递归处理子章节
+        if section.sections:
+            content.append(self._process_sections(section.sections, context))
+        return content
+
+    def _resolve_operator(self, operator_type: str) -> Optional[type]:
+        """解析算子类，插件算子导入失败时记入运行指标"""
+        handler = self.operator_registry.resolve(operator_type)
+        if handler is None and self.operator_registry.load_error(operator_type) is not None:
+            self.metrics.inc("operator_load_failures_total", operator=operator_type)
+        return handler
+
+    @staticmethod
+    def _rank_columns(rank_levels) -> list:
+        """
+        指标排名表的排名列
+
+        Args:
+            rank_levels: head中配置的分组层级列表（或以空格分隔的字符串），未配置时只有“组内排名”一列
 
-        if self.indicator_rank_df.empty:
+        Returns:
+            [(列名, 分组层级)]，分组层级为None时使用算子自身的层级
+        """
+        if not rank_levels:
+            return [("组内排名", None)]
+        if isinstance(rank_levels, str):
+            rank_levels = rank_levels.split()
+        return [(f"{level}排名", str(level)) for level in rank_levels]
+
+    def _process_indicator_rank(self, context: ReportContext) -> str:
+        if not context.rank_rows:
             return ""
 
+        rank_column_names = [column for column, _ in self.rank_columns]
+        indicator_rank_df = pd.DataFrame(
+            context.rank_rows, columns=["维度", "指标名称", *rank_column_names], dtype="string"
+        )
         output = []
         # 按维度字段分组处理
-        for dimension in self.indicator_rank_df['维度'].unique():
+        for dimension in indicator_rank_df['维度'].unique():
             # 添加小标题
             dimension_sub = re.sub(r"[\d\s]", "", dimension)
             output.append(f"#### {dimension_sub}\n")
             # 过滤当前维度的数据
-            df_filtered = self.indicator_rank_df[self.indicator_rank_df['维度'] == dimension].copy()
-            # df_filtered["指标名称"] = df_filtered["指标名称"].str[:30].str.ljust(30).str.replace(' ', '&nbsp;')
+            df_filtered = indicator_rank_df[indicator_rank_df['维度'] == dimension]
             # 生成表格
             output.append(
                 df_filtered[
-                    ["指标名称", "组内排名"]
+                    ["指标名称", *rank_column_names]
                 ].to_markdown(index=False, tablefmt="pipe", stralign="left")
             )
 
         return "\n".join(output)# + "\n"
 
-    def _process_indicators(self, indicators: list) -> list:
-        """处理指标集合"""
+    def _resolve_data_dt(self, indicator: IndicatorPlan, head: Mapping) -> tuple:
+        """
+        计算指标实际使用的数据日期
+
+        Returns:
+            (data_dt_rule, 报告中的数据日期备注)
+        """
+        data_dt = head["data_dt"]
+        if not indicator.use_latest_date:
+            return data_dt, ""
+
+        # 如果指标的属性中包含 data_dt_rule，说明由于时效性问题，需要取最新数据日期
+        org = head["org_name"]
+        max_date = self.dataset.latest_date(org, indicator.name)
+        if max_date is None:
+            return data_dt, ""
+        max_date = max_date.strftime("%Y-%m-%d")
+        # 如果 max_date < data_dt 说明需要应用data_dt_rule
+        if max_date < data_dt:
+            return max_date, f" 注：该指标的数据日期为：{max_date}"
+        # data_dt_rule 取 data_dt的值，对后面的逻辑不产生实际影响，
+        return data_dt, ""
+
+    def _operator_requests(self, context: ReportContext):
+        """
+        生成一份报告中全部算子调用的配置
+
+        Yields:
+            (算子类, 结果键, 算子配置, 算子计划)，结果键为 (指标, 算子序号, 输出列)
+        """
+        for _, indicator in self.plan.iter_indicators():
+            data_dt_rule, data_dt_remark = self._resolve_data_dt(indicator, context.head)
+            context.data_dt_remarks[id(indicator)] = data_dt_remark
+            base_config = {
+                **context.head,
+                "indicator": indicator.name,
+                "data_dt_rule": data_dt_rule,
+                "context": context,
+            }
+            for index, operator in enumerate(indicator.operators):
+                handler_class = operator.handler_class
+                if handler_class is None:
+                    continue
+                operator_config = dict(base_config)
+                if operator.options:
+                    operator_config["operator_options"] = dict(operator.options)
+                yield (
+                    handler_class,
+                    (id(indicator), index, "A"),
+                    {**operator_config, "format": "A"},
+                    operator,
+                )
+
+                if operator.operator_type == "组内排名":
+                    for column, level in self.rank_columns:
+                        config = {**operator_config, "format": "B"}
+                        if level is not None:
+                            config["rank_level"] = level
+                        yield handler_class, (id(indicator), index, column), config, operator
+
+    def _run_operators(self, contexts: list):
+        """
+        按算子汇总所有机构的调用，每个算子调用一次handle_batch，结果写入各自的运行上下文
+
+        算子的批量方法出错时改为逐个调用handle，保证兼容只实现了handle的算子。
+        """
+        requests = {}
+        for context in contexts:
+            for handler_class, key, config, operator in self._operator_requests(context):
+                requests.setdefault(handler_class, []).append(
+                    (context, key, config, operator.operator_type)
+                )
+
+        for handler_class, items in requests.items():
+            configs = [config for _, _, config, _ in items]
+            texts = None
+            handle_batch = getattr(handler_class, "handle_batch", None)
+            if handle_batch is not None:
+                try:
+                    texts = handle_batch(configs, self.all_data_df, self.all_data_metled_df)
+                    if len(texts) != len(configs):
+                        raise ValueError(f"返回结果数{len(texts)}与请求数{len(configs)}不一致")
+                except Exception as e:
+                    logger.warning("算子%s批量计算失败，改为逐个计算：%s", handler_class.__name__, e)
+                    self.metrics.inc("operator_batch_fallbacks_total", operator=items[0][3])
+                    texts = None
+            if texts is None:
+                texts = [
+                    handler_class.handle(config, self.all_data_df, self.all_data_metled_df)
+                    for config in configs
+                ]
+            calls, errors = Counter(), Counter()
+            for (context, key, _, operator_type), text in zip(items, texts):
+                context.results[key] = text
+                calls[operator_type] += 1
+                if isinstance(text, OperatorError):
+                    errors[operator_type] += 1
+            for operator_type, count in calls.items():
+                self.metrics.inc("operator_calls_total", count, operator=operator_type)
+                self.metrics.inc("operator_errors_total", errors[operator_type], operator=operator_type)
+
+    def _process_indicators(self, section: SectionPlan, context: ReportContext) -> list:
+        """处理章节下的指标集合，算子结果已由_run_operators算出"""
         output = []
-        operator_handlers = {
-            "当期值": CurrentValueOperator,
-            "组内排名": RankingOperator,
-            "近3月趋势": TrendLast3MonthsOperator,
-            "近3季度趋势": TrendLast3QuartersOperator,
-            "近3年趋势": TrendLast3YearsOperator,
-            "年同比": YearOverYearOperator,
-            "月环比": MonthOverMonthOperator,
-        }
 
-        for indicator in indicators:
-            note = "" + indicator["note"] if 'note' in indicator else ""
+        for indicator in section.indicators:
+            data_dt_remark = context.data_dt_remarks.get(id(indicator), "")
+            output.append(f"**{indicator.name}{indicator.note}{data_dt_remark}**")
 
-            # 默认用head里的data_dt, org, name
-            data_dt = self.config["head"]["data_dt"]
-            data_dt_rule = self.config["head"]["data_dt"]
-            org = self.config["head"]["org_name"]
-            indicator_name = indicator["name"]
+            for index, operator in enumerate(indicator.operators):
+                if operator.handler_class is None:
+                    output.append(f"- 未知操作符: {operator.operator_type}")
+                    continue
 
-            # 初步用机构名称和指标过滤，
-            filtered_indicator_df = self.all_data_metled_df[
-                (self.all_data_metled_df["机构名称"] == org)
-                & (self.all_data_metled_df["指标名称"] == indicator_name)
-            ]
-            max_date = filtered_indicator_df["数据日期"].max().strftime("%Y-%m-%d")
-
-            # 如果指标的属性中包含 data_dt_rule，说明由于时效性问题，需要取最新数据日期
-            data_dt_remark = ""
-            if "data_dt_rule" in indicator:
-                # 如果 max_date < data_dt 说明需要应用data_dt_rule
-                if max_date < data_dt:
-                    data_dt_rule = max_date
-                    data_dt_remark = f" 注：该指标的数据日期为：{data_dt_rule}"
-                # data_dt_rule 取 data_dt的值，对后面的逻辑不产生实际影响，
-                else:
-                    data_dt_rule = data_dt
-                    data_dt_remark = ""
-            output.append(f"**{indicator['name']}{note}{data_dt_remark}**")
-
-            for operator_config in indicator.get('operators', []):
-                # 解析操作符类型和配置
-                operator_type, _, config_str = operator_config.partition(':')
-                handler_class = operator_handlers.get(operator_type.strip())
-
-                if handler_class:
-                    # 构造配置字典（示例实现）
-                    # config = {'value': 'XX'}
-                    config = {
-                        **self.config.get("head", {}),
-                        "indicator": indicator["name"],
-                        "data_dt_rule": data_dt_rule,
-                        "format": "A",
-                    }
-
-                    # 处理算子
-                    text_a = f"- {handler_class.handle(config, self.all_data_df, self.all_data_metled_df)}"
-                    output.append(text_a)
-
-                    if operator_type == "组内排名":
-                        config = {
-                            **self.config.get("head", {}),
-                            "indicator": indicator["name"],
-                            "data_dt_rule": data_dt_rule,
-                            "format": "B",
-                        }
-
-                        text_b = f"{handler_class.handle(config, self.all_data_df, self.all_data_metled_df)}"
-                        # 要插入的数据
-                        new_data = {
-                            "维度": self.current_level_title,
-                            "指标名称": indicator["name"],
-                            "组内排名": text_b,
-                        }
-                        # 获取当前 DataFrame 的长度作为新行的索引
-                        new_index = len(self.indicator_rank_df)
-                        self.indicator_rank_df.loc[new_index] = new_data
-
-                else:
-                    output.append(f"- 未知操作符: {operator_type}")
+                output.append(f"- {context.results[(id(indicator), index, 'A')]}")
+
+                if operator.operator_type == "组内排名":
+                    row = {"维度": section.dimension, "指标名称": indicator.name}
+                    for column, _ in self.rank_columns:
+                        row[column] = f"{context.results[(id(indicator), index, column)]}"
+                    context.rank_rows.append(row)
 
             output.append("")  # 空行分隔
         return output
@@ -0,0 +1,142 @@
+"""报告执行计划模块
+
+将报告模板（YAML）一次性编译为不可变的执行计划：章节、指标、已解析的算子类以及
+data_dt_rule规则。生成多个机构的报告时直接遍历执行计划，无需重复解析配置。
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class OperatorPlan:
+    """指标下的一个算子"""
+
+    operator_type: str
+    config_str: str
+    handler_class: Optional[type]  # 为None表示未知操作符
+    options: Mapping[str, object] = field(default_factory=lambda: MappingProxyType({}))
+
+
+@dataclass(frozen=True)
+class IndicatorPlan:
+    """章节下的一个指标"""
+
+    name: str
+    note: str
+    use_latest_date: bool  # 配置了data_dt_rule，数据日期缺失时取最新数据日期
+    operators: Tuple[OperatorPlan, ...]
+
+
+@dataclass(frozen=True)
+class SectionPlan:
+    """报告中的一个章节"""
+
+    level: int
+    title: Optional[str]
+    content: Optional[str]
+    dimension: str  # 所属一级标题，作为指标排名表的维度
+    indicator_rank: bool
+    indicators: Tuple[IndicatorPlan, ...]
+    sections: Tuple["SectionPlan", ...]
+
+
+@dataclass(frozen=True)
+class ReportPlan:
+    """报告执行计划"""
+
+    sections: Tuple[SectionPlan, ...]
+
+    def iter_indicators(self):
+        """按报告顺序遍历所有 (章节, 指标)"""
+        stack = list(reversed(self.sections))
+        while stack:
+            section = stack.pop()
+            for indicator in section.indicators:
+                yield section, indicator
+            stack.extend(reversed(section.sections))
+
+
+def parse_operator_options(config_str: str) -> Mapping[str, object]:
+    """
+    解析算子配置中的参数，如 "top=5, bottom=3, neighbors=2"，数值参数转换为整数
+
+    未使用 key=value 写法的配置（如 "XX"）视为无参数。
+    """
+    options = {}
+    for item in re.split(r"[,，\s]+", config_str.strip()):
+        key, sep, value = item.partition("=")
+        if not sep or not key:
+            continue
+        value = value.strip()
+        options[key.strip()] = int(value) if value.lstrip("-").isdigit() else value
+    return MappingProxyType(options)
+
+
+def compile_report_plan(
+    config: dict, resolve_operator: Callable[[str], Optional[type]]
+) -> ReportPlan:
+    """
+    将报告配置编译为执行计划
+
+    Args:
+        config: 报告配置（load_config的结果）
+        resolve_operator: 根据算子名称返回算子类的函数，无法识别时返回None
+
+    Returns:
+        ReportPlan
+    """
+    resolved: Dict[str, Optional[type]] = {}
+    current_dimension = ""
+
+    def compile_operator(operator_config: str) -> OperatorPlan:
+        # 解析操作符类型和配置，如 "组内排名: XX"
+        operator_type, _, config_str = str(operator_config).partition(":")
+        operator_type = operator_type.strip()
+        if operator_type not in resolved:
+            resolved[operator_type] = resolve_operator(operator_type)
+            if resolved[operator_type] is None:
+                logger.warning("报告配置中存在未知操作符：%s", operator_type)
+        return OperatorPlan(
+            operator_type,
+            config_str.strip(),
+            resolved[operator_type],
+            parse_operator_options(config_str),
+        )
+
+    def compile_indicator(indicator: dict) -> IndicatorPlan:
+        return IndicatorPlan(
+            name=indicator["name"],
+            note=indicator.get("note") or "",
+            use_latest_date="data_dt_rule" in indicator,
+            operators=tuple(compile_operator(op) for op in indicator.get("operators", [])),
+        )
+
+    def compile_sections(sections: list, level: int) -> Tuple[SectionPlan, ...]:
+        nonlocal current_dimension
+        compiled = []
+        for section in sections:
+            title = section.get("section_title")
+            if title is not None and level == 1:
+                current_dimension = title
+            dimension = current_dimension
+            indicators = tuple(compile_indicator(i) for i in section.get("indicators", []))
+            children = compile_sections(section.get("sections", []), level + 1)
+            compiled.append(
+                SectionPlan(
+                    level=level,
+                    title=title,
+                    content=section.get("content"),
+                    dimension=dimension,
+                    indicator_rank="indicator_rank" in section,
+                    indicators=indicators,
+                    sections=children,
+                )
+            )
+        return tuple(compiled)
+
+    return ReportPlan(sections=compile_sections(config.get("sections", []) or [], 1))
@@ -9,6 +9,13 @@ import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# 可选的配置表
+OPTIONAL_SHEETS = [
+    "指标属性",  # 按指标覆盖排序方向、展示格式和正负向
+    "指标聚合",  # 按指标配置季度、年度汇总的聚合方式
+    "衍生指标",  # 按公式由已有指标计算衍生指标
+]
+
 def parse_data_extraction_config(config_file: Union[str, Path]) -> Dict[str, pd.DataFrame]:
     """
     解析数据提取配置文件
@@ -24,24 +31,22 @@ def parse_data_extraction_config(config_file: Union[str, Path]) -> Dict[str, pd.
     """
     config_file = Path(config_file)
 
-    # 读取各配置表
-    multi_df = pd.read_excel(
-        config_file, sheet_name="multi_sheet_df"
-    )
-    single_df = pd.read_excel(
-        config_file, sheet_name="single_sheet_df"
-    )
-    groups_df = pd.read_excel(
-        config_file, sheet_name="机构分组"
-    )
-    filter_df = pd.read_excel(
-        config_file, sheet_name="过滤机构"
-    )
-    replacement_df = pd.read_excel(
-        config_file, sheet_name="机构名替换"
-    )
-    ASC_ORDERED_KEYWORDS_df = pd.read_excel(config_file, sheet_name="ASC_ORDERED_KEYWORDS")
-    PERCENTAGE_KEYWORDS_df = pd.read_excel(config_file, sheet_name="PERCENTAGE_KEYWORDS")
+    # 只打开一次配置文件，依次读取各配置表
+    with pd.ExcelFile(config_file) as xls:
+        multi_df = pd.read_excel(xls, sheet_name="multi_sheet_df")
+        single_df = pd.read_excel(xls, sheet_name="single_sheet_df")
+        groups_df = pd.read_excel(xls, sheet_name="机构分组")
+        filter_df = pd.read_excel(xls, sheet_name="过滤机构")
+        replacement_df = pd.read_excel(xls, sheet_name="机构名替换")
+        ASC_ORDERED_KEYWORDS_df = pd.read_excel(xls, sheet_name="ASC_ORDERED_KEYWORDS")
+        PERCENTAGE_KEYWORDS_df = pd.read_excel(xls, sheet_name="PERCENTAGE_KEYWORDS")
+        # 可选配置表，未配置时不返回
+        optional_dfs = {
+            sheet_name: pd.read_excel(xls, sheet_name=sheet_name)
+            for sheet_name in OPTIONAL_SHEETS
+            if sheet_name in xls.sheet_names
+        }
+
     # 验证必要字段
     required_multi = [
         "multi_sheet_df",
@@ -69,4 +74,5 @@ def parse_data_extraction_config(config_file: Union[str, Path]) -> Dict[str, pd.
         "机构名替换": replacement_df,
         "ASC_ORDERED_KEYWORDS": ASC_ORDERED_KEYWORDS_df,
         "PERCENTAGE_KEYWORDS": PERCENTAGE_KEYWORDS_df,
+        **optional_dfs,
     }
@@ -0,0 +1,121 @@
+"""数据类型转换工具
+
+根据配置的dtype在数据读取时一次性完成类型转换，并汇总报告无法转换的单元格，
+使下游模块无需反复执行 pd.to_numeric / pd.to_datetime。
+"""
+import logging
+from typing import Dict, Optional
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 配置中允许的dtype写法 -> 规范化后的类型
+DTYPE_ALIASES = {
+    "float": "float",
+    "float64": "float",
+    "double": "float",
+    "number": "float",
+    "numeric": "float",
+    "int": "int",
+    "int64": "int",
+    "integer": "int",
+    "date": "datetime",
+    "datetime": "datetime",
+    "datetime64": "datetime",
+    "string": "string",
+    "str": "string",
+    "text": "string",
+    "category": "category",
+    "categorical": "category",
+}
+
+# 预处理结果中各标识列的类型，报告生成时按此类型读取
+MELTED_SCHEMA = {
+    "数据日期": "datetime",
+    "机构分组": "category",
+    "机构名称": "category",
+    "指标名称": "category",
+    "指标值": "float",
+}
+
+# 报告中最多展示的错误单元格样例数
+_MAX_BAD_SAMPLES = 5
+
+
+def normalize_dtype(dtype: Optional[str], field_type: Optional[str] = None) -> Optional[str]:
+    """
+    将配置中的dtype规范化
+
+    Args:
+        dtype: single_sheet_df中配置的dtype
+        field_type: single_sheet_df中配置的type，dimension类型的文本字段按分类类型处理
+
+    Returns:
+        规范化后的类型名称，无法识别时返回None
+    """
+    if dtype is None or pd.isna(dtype):
+        return None
+    normalized = DTYPE_ALIASES.get(str(dtype).strip().lower())
+    if normalized is None:
+        logger.warning("无法识别的dtype配置：%s", dtype)
+        return None
+    if normalized == "string" and str(field_type).strip().lower() == "dimension":
+        return "category"
+    return normalized
+
+
+def coerce_series(series: pd.Series, dtype: str) -> tuple:
+    """
+    按规范化类型转换单列数据
+
+    Args:
+        series: 待转换的列
+        dtype: 规范化后的类型名称
+
+    Returns:
+        (转换后的列, 无法转换的单元格布尔掩码)
+    """
+    if dtype in ("float", "int"):
+        converted = pd.to_numeric(series, errors="coerce")
+        if dtype == "int" and not converted.isna().any():
+            converted = converted.astype("int64")
+        else:
+            converted = converted.astype("float64")
+    elif dtype == "datetime":
+        converted = pd.to_datetime(series, errors="coerce").dt.normalize()
+    elif dtype == "category":
+        converted = series.astype("category")
+    elif dtype == "string":
+        converted = series.astype("string")
+    else:
+        return series, pd.Series(False, index=series.index)
+
+    bad_mask = series.notna() & converted.isna()
+    return converted, bad_mask
+
+
+def coerce_frame(df: pd.DataFrame, dtype_map: Dict[str, str], source: str = "") -> pd.DataFrame:
+    """
+    按类型映射转换DataFrame中的列，并对每列的错误单元格只报告一次
+
+    Args:
+        df: 待转换的DataFrame
+        dtype_map: {列名: 规范化类型}
+        source: 数据来源描述，用于日志
+
+    Returns:
+        转换后的DataFrame
+    """
+    for col, dtype in dtype_map.items():
+        if col not in df.columns or dtype is None:
+            continue
+        converted, bad_mask = coerce_series(df[col], dtype)
+        bad_count = int(bad_mask.sum())
+        if bad_count:
+            samples = df.loc[bad_mask, col].astype(str).unique()[:_MAX_BAD_SAMPLES]
+            logger.warning(
+                "%s 字段[%s]有%s个单元格无法转换为%s，已置为空值，样例：%s",
+                source, col, bad_count, dtype, ", ".join(samples),
+            )
+        df[col] = converted
+    return df
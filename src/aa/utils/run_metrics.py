@@ -0,0 +1,198 @@
+"""运行指标模块
+
+记录一次运行（数据预处理、报告生成、批量报告）的运行指标：
+- 各阶段耗时（多线程执行时为各线程累计耗时）
+- 读取的原始文件数、各数据源读入的行数
+- 未在机构分组中配置的机构名称
+- 插件算子的导入失败次数、各算子的出错次数
+- 数据集缓存的命中率
+- 生成的报告数和进程内存峰值
+
+运行指标对象由main在每次运行开始时创建，显式传给数据预处理、报告数据集和批量任务，不使用进程级全局变量。
+运行结束时写出 Prometheus textfile 格式（供 node exporter 的 textfile collector 采集）和 JSON 两种文件，
+定时任务无需解析日志即可跟踪吞吐量和性能退化。
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "aa_"
+
+# 指标名称 -> (类型, 说明)
+METRIC_HELP = {
+    "stage_duration_seconds": ("gauge", "各阶段累计耗时（秒）"),
+    "files_read_total": ("counter", "读取的原始数据文件次数"),
+    "rows_ingested_total": ("counter", "各数据源读入的行数"),
+    "layout_detections_total": ("counter", "自动识别手工表数据区域的次数（hit为沿用已缓存的版式）"),
+    "unmatched_orgs": ("gauge", "未在机构分组中配置的机构名称个数"),
+    "operator_load_failures_total": ("counter", "插件算子导入失败的次数"),
+    "operator_calls_total": ("counter", "各算子的调用次数"),
+    "operator_errors_total": ("counter", "各算子返回出错信息的次数"),
+    "operator_batch_fallbacks_total": ("counter", "算子批量计算失败后改为逐个计算的次数"),
+    "cache_requests_total": ("counter", "数据集缓存的查询次数"),
+    "cache_hit_ratio": ("gauge", "数据集缓存的命中率"),
+    "reports_written_total": ("counter", "生成的报告文件数"),
+    "peak_rss_bytes": ("gauge", "进程内存峰值（字节）"),
+    "run_duration_seconds": ("gauge", "本次运行耗时（秒）"),
+    "run_success": ("gauge", "本次运行是否成功"),
+    "run_timestamp_seconds": ("gauge", "本次运行结束时间（Unix时间戳）"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """进程内存峰值，不支持的平台（如Windows）返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def _format_value(value: float) -> str:
+    """整数按整数输出，避免大数值被科学计数法截断精度"""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RunMetrics:
+    """一次运行的指标，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """开始新的一次运行，清空已记录的指标"""
+        with self._lock:
+            self._values: Dict[str, Dict[Labels, float]] = {}
+            self.unmatched_org_names = set()
+            self.started_at = time.time()
+            self._started = time.perf_counter()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """累加计数类指标"""
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """设置取值类指标"""
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def add_unmatched_orgs(self, org_names: Iterable[str]):
+        """记录未在机构分组中配置的机构名称"""
+        with self._lock:
+            self.unmatched_org_names.update(str(name) for name in org_names)
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录一个阶段的耗时，同一阶段多次执行时累计"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc("stage_duration_seconds", time.perf_counter() - start, stage=name)
+
+    def snapshot(self, success: bool = True) -> Dict[str, Dict[Labels, float]]:
+        """汇总全部指标，补充缓存命中率、内存峰值和运行耗时"""
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            unmatched = len(self.unmatched_org_names)
+        values["unmatched_orgs"] = {(): unmatched}
+
+        requests = values.get("cache_requests_total", {})
+        totals: Dict[str, float] = {}
+        hits: Dict[str, float] = {}
+        for labels, count in requests.items():
+            label_dict = dict(labels)
+            totals[label_dict["key"]] = totals.get(label_dict["key"], 0) + count
+            if label_dict.get("result") == "hit":
+                hits[label_dict["key"]] = hits.get(label_dict["key"], 0) + count
+        if totals:
+            values["cache_hit_ratio"] = {
+                (("key", key),): round(hits.get(key, 0) / total, 6) for key, total in totals.items()
+            }
+
+        peak = peak_rss_bytes()
+        if peak is not None:
+            values["peak_rss_bytes"] = {(): peak}
+        values["run_duration_seconds"] = {(): round(time.perf_counter() - self._started, 6)}
+        values["run_success"] = {(): 1 if success else 0}
+        values["run_timestamp_seconds"] = {(): round(time.time(), 3)}
+        return values
+
+    def write(
+        self, metrics_dir: Union[str, Path], task: str, success: bool = True
+    ) -> Tuple[Path, Path]:
+        """
+        写出本次运行的指标文件 aa_task_<任务>.prom 和 aa_task_<任务>.json
+
+        文件先写临时文件再原子替换，textfile collector 不会读到写了一半的文件。
+
+        Args:
+            metrics_dir: 指标文件目录，通常为 node exporter 的 --collector.textfile.directory
+            task: 任务编号，作为所有指标的task标签
+            success: 本次运行是否成功
+
+        Returns:
+            (Prometheus文件路径, JSON文件路径)
+        """
+        metrics_dir = Path(metrics_dir)
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        values = self.snapshot(success)
+
+        lines = []
+        for name, series in values.items():
+            metric_type, help_text = METRIC_HELP.get(name, ("gauge", name))
+            full_name = f"{METRIC_PREFIX}{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            for labels, value in sorted(series.items()):
+                label_text = ",".join(
+                    f'{k}="{_escape(v)}"' for k, v in (("task", str(task)), *labels)
+                )
+                lines.append(f"{full_name}{{{label_text}}} {_format_value(value)}")
+        prom_file = metrics_dir / f"aa_task_{task}.prom"
+        self._atomic_write(prom_file, "\n".join(lines) + "\n")
+
+        document = {
+            "task": str(task),
+            "success": success,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "unmatched_org_names": sorted(self.unmatched_org_names),
+            "metrics": {
+                name: [{"labels": dict(labels), "value": value} for labels, value in series.items()]
+                for name, series in values.items()
+            },
+        }
+        json_file = metrics_dir / f"aa_task_{task}.json"
+        self._atomic_write(json_file, json.dumps(document, ensure_ascii=False, indent=2))
+        logger.info("已写出运行指标：%s、%s", prom_file, json_file)
+        return prom_file, json_file
+
+    @staticmethod
+    def _atomic_write(path: Path, text: str):
+        tmp_file = path.with_name(f".{path.name}.tmp")
+        tmp_file.write_text(text, encoding="utf-8")
+        os.replace(tmp_file, path)
+
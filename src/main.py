@@ -7,9 +7,13 @@ import sys
 import logging
 import argparse
 from pathlib import Path
-from aa.report_generators.report_generator import ReportGenerator
+from aa.report_generators.report_generator import ReportGenerator, month_end_dates
+from aa.report_generators.batch_runner import BatchReportRunner
+from aa.data_loader.conflict_resolver import CONFLICT_POLICIES, LAST_WINS
 from aa.data_loader.data_preprocessor import DataPreprocessor
+from aa.data_loader.gather_table_heads import gather_table_heads
 from aa.utils.error_handler import handle_errors
+from aa.utils.run_metrics import RunMetrics
 
 # from aa.utils.config_loader import load_config
 
@@ -27,8 +31,8 @@ def main():
         "--task", "-T",
         type=str,
         default="2",
-        choices=["1", "2"],
-        help="1:准备数据 2:生成报告 默认执行2:生成报告任务 ",
+        choices=["1", "2", "3", "4"],
+        help="1:准备数据 2:生成报告 3:批量生成报告 4:核对原始报表表头 默认执行2:生成报告任务 ",
     )
     parser.add_argument(
         "--report_config_file",
@@ -48,14 +52,85 @@ def main():
         default="data/raw/X公司样例_零售业/",
         help="原始数据文件夹",
     )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default="xlsx",
+        choices=["xlsx", "sqlite"],
+        help="预处理数据的存储格式，xlsx:Excel文件 sqlite:SQLite指标库（适用于超出内存的历史数据） 默认xlsx",
+    )
+    parser.add_argument(
+        "--partition",
+        type=str,
+        default=None,
+        choices=["月", "年"],
+        help="数据预处理时按月或按年分区合并，内存占用取决于最大的分区，默认一次性处理全部数据",
+    )
+    parser.add_argument(
+        "--conflict_policy",
+        type=str,
+        default=LAST_WINS,
+        choices=CONFLICT_POLICIES,
+        help="数据预处理时重复数据的冲突策略：后者覆盖（默认，multi_sheet_df中靠后的数据源覆盖靠前的）"
+        "或 配置顺序（靠前的数据源优先）",
+    )
+    parser.add_argument(
+        "--date_range",
+        type=str,
+        default=None,
+        help="按日期区间回溯生成每个月末的报告，格式为 开始日期:结束日期，如 2024-01-31:2024-12-31",
+    )
+    parser.add_argument(
+        "--job_file",
+        type=str,
+        default="config/X公司样例_零售业/report_jobs_X公司样例_零售业.yaml",
+        help="批量报告任务文件路径",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="批量生成报告时并行执行任务的线程数、核对表头时并行读取文件的进程数，默认按顺序执行",
+    )
+    parser.add_argument(
+        "--table_heads_file",
+        type=str,
+        default="data/processed/table_heads.xlsx",
+        help="核对表头任务的输出文件",
+    )
+    parser.add_argument(
+        "--preflight",
+        action="store_true",
+        help="报告生成前预检：不生成报告，列出各机构、指标、算子所需但缺失数据的期间",
+    )
+    parser.add_argument(
+        "--metrics_dir",
+        type=str,
+        default=None,
+        help="运行指标输出目录，指定时写出 aa_task_<任务>.prom（Prometheus textfile格式）和 aa_task_<任务>.json",
+    )
     args = parser.parse_args()
 
+    metrics = RunMetrics()
+    succeeded = False
+    try:
+        status = run_task(args, metrics)
+        succeeded = status == 0
+        return status
+    finally:
+        if args.metrics_dir:
+            metrics.write(args.metrics_dir, args.task, succeeded)
+
+
+def run_task(args: argparse.Namespace, metrics: RunMetrics) -> int:
+    """执行命令行指定的任务，运行指标记入metrics，返回退出码"""
     # 使用常量定义路径
-    DATA_OUTPUT_FILE = "data/processed/data_preprocessed.xlsx"
+    DATA_OUTPUT_FILE = f"data/processed/data_preprocessed.{args.store}"
     report_config_file = Path(args.report_config_file)
     data_extraction_config_file = Path(args.data_extraction_config_file)
     data_path = Path(DATA_OUTPUT_FILE)
     raw_data_dir = Path(args.raw_data_dir)
+    job_file = Path(args.job_file)
 
     # 使用match语句处理任务选择
     match args.task:
@@ -66,7 +141,16 @@ def main():
             if not raw_data_dir.exists():
                 logger.error("原始数据文件夹不存在：%s", raw_data_dir)
                 return 1
-            handle_data_preprocessing(data_extraction_config_file, raw_data_dir)
+            result = handle_data_preprocessing(
+                data_extraction_config_file,
+                raw_data_dir,
+                args.store,
+                args.partition,
+                args.conflict_policy,
+                metrics,
+            )
+            if result["status"] != "success":
+                return 1
         case "2":
             if not report_config_file.exists():
                 logger.error("报告配置文件不存在：%s", report_config_file)
@@ -77,40 +161,146 @@ def main():
             if not data_extraction_config_file.exists():
                 logger.error("数据预处理配置文件不存在：%s", data_extraction_config_file)
                 return 1
+            date_range = None
+            if args.date_range:
+                date_range = args.date_range.split(":")
+                if len(date_range) != 2:
+                    logger.error("日期区间格式错误，应为 开始日期:结束日期：%s", args.date_range)
+                    return 1
             handle_report_generation(
                 data_extraction_config_file,
                 report_config_file,
-                data_path
+                data_path,
+                date_range,
+                args.preflight,
+                metrics,
+            )
+        case "3":
+            if not job_file.exists():
+                logger.error("批量报告任务文件不存在：%s", job_file)
+                return 1
+            if not data_path.exists():
+                logger.error("预处理数据不存在：%s", data_path)
+                return 1
+            if not data_extraction_config_file.exists():
+                logger.error("数据预处理配置文件不存在：%s", data_extraction_config_file)
+                return 1
+            summary = handle_batch_report_generation(
+                data_extraction_config_file, job_file, data_path, args.workers, metrics
+            )
+            if summary["failed_count"]:
+                return 1
+        case "4":
+            if not data_extraction_config_file.exists():
+                logger.error("数据预处理配置文件不存在：%s", data_extraction_config_file)
+                return 1
+            if not raw_data_dir.exists():
+                logger.error("原始数据文件夹不存在：%s", raw_data_dir)
+                return 1
+            result = handle_table_head_survey(
+                data_extraction_config_file,
+                raw_data_dir,
+                Path(args.table_heads_file),
+                args.workers,
+                metrics,
             )
+            if result["status"] != "success":
+                return 1
     return 0
 
 
 @handle_errors
-def handle_data_preprocessing(data_extraction_config_file: Path, raw_data_dir: Path):
+def handle_data_preprocessing(
+    data_extraction_config_file: Path,
+    raw_data_dir: Path,
+    store_format: str = "xlsx",
+    partition_by: str = None,
+    conflict_policy: str = LAST_WINS,
+    metrics: RunMetrics = None
+):
     """执行数据预处理任务"""
     processor = DataPreprocessor(
         data_extraction_config_file=str(data_extraction_config_file),
-        raw_data_dir=str(raw_data_dir)
+        raw_data_dir=str(raw_data_dir),
+        store_format=store_format,
+        partition_by=partition_by,
+        conflict_policy=conflict_policy,
+        metrics=metrics
     )
     result = processor.load()
     logger.info("数据预处理完成：%s", result)
+    return result
 
 
 @handle_errors
 def handle_report_generation(
     data_extraction_config_file: Path,
     report_config_file: Path,
-    data_output_file: Path
+    data_output_file: Path,
+    date_range: list = None,
+    preflight: bool = False,
+    metrics: RunMetrics = None
 ):
-    """执行报告生成任务"""
+    """执行报告生成任务，指定日期区间时回溯生成区间内每个月末的报告；preflight为True时只做预检"""
     generator = ReportGenerator(
         data_extraction_config_file=str(data_extraction_config_file),
         report_config_file=str(report_config_file),
-        data_output_file=str(data_output_file) # 中间数据预处理后的数据文件
+        data_output_file=str(data_output_file), # 中间数据预处理后的数据文件
+        metrics=metrics
     )
-    report = generator.generate({})
+    if preflight:
+        data_dts = month_end_dates(*date_range) if date_range else [None]
+        missing = []
+        for data_dt in data_dts:
+            missing.extend(generator.preflight({"data_dt": data_dt} if data_dt else None))
+        logger.info("预检完成：%s项缺失", len(missing))
+        return
+    if date_range:
+        report = generator.generate_date_range(*date_range)
+    else:
+        report = generator.generate({})
     logger.info("报告生成完成：%s", report)
 
 
+@handle_errors
+def handle_batch_report_generation(
+    data_extraction_config_file: Path,
+    job_file: Path,
+    data_output_file: Path,
+    workers: int = 1,
+    metrics: RunMetrics = None
+):
+    """执行批量报告生成任务，所有任务共享一次加载的数据，workers大于1时在线程池中并行执行"""
+    runner = BatchReportRunner(
+        data_extraction_config_file=str(data_extraction_config_file),
+        data_output_file=str(data_output_file),
+        metrics=metrics
+    )
+    summary = runner.run(job_file, workers=workers)
+    for job in summary["jobs"]:
+        logger.info("任务结果：%s", job)
+    logger.info(
+        "批量报告生成完成：共%s个任务，失败%s个",
+        summary["job_count"], summary["failed_count"]
+    )
+    return summary
+
+
+@handle_errors
+def handle_table_head_survey(
+    data_extraction_config_file: Path,
+    raw_data_dir: Path,
+    output_file: Path,
+    workers: int = 1,
+    metrics: RunMetrics = None
+):
+    """执行表头核对任务，汇总各原始报表的表头和数据区域末尾，workers大于1时在进程池中并行读取文件"""
+    result = gather_table_heads(
+        data_extraction_config_file, raw_data_dir, output_file, workers=workers, metrics=metrics
+    )
+    logger.info("表头核对完成：%s", result)
+    return result
+
+
 if __name__ == "__main__":
     sys.exit(main())
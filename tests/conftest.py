@@ -0,0 +1,5 @@
+"""测试配置：源码位于src目录，测试时加入导入路径"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,80 @@
+"""异常波动引擎的测试，稳健Z值与手工计算的中位数、MAD核对"""
+import numpy as np
+import pandas as pd
+import pytest
+from aa.report_generators.operators.anomaly_engine import (
+    MAD_SCALE,
+    MEAN_AD_SCALE,
+    AnomalyEngine,
+    robust_scores,
+)
+from aa.report_generators.operators.trend_engine import TrendEngine
+
+MONTHS = pd.date_range("2024-01-31", periods=5, freq="ME")
+TARGET = MONTHS[-1]
+# 机构A近4期为10、12、14、20：中位数13，绝对偏差3、1、1、7，MAD为2
+HISTORY = {"A": [10.0, 12.0, 14.0, 20.0, 19.0]}
+# 当期各机构取值：分组“城区”为A、B、C、D，分组“郊县”只有E、F
+CURRENT = {"A": 19.0, "B": 10.0, "C": 12.0, "D": 15.0, "E": 8.0, "F": 9.0, "G": 7.0}
+ORG_GROUPS = {"A": "城区", "B": "城区", "C": "城区", "D": "城区", "E": "郊县", "F": "郊县"}
+
+
+def build_engine() -> AnomalyEngine:
+    records = [
+        (date, org, "贷款余额", value)
+        for org, values in HISTORY.items()
+        for date, value in zip(MONTHS, values)
+    ]
+    records += [(TARGET, org, "贷款余额", value) for org, value in CURRENT.items() if org not in HISTORY]
+    melted = pd.DataFrame(records, columns=["数据日期", "机构名称", "指标名称", "指标值"])
+    return AnomalyEngine(TrendEngine(melted), ORG_GROUPS)
+
+
+def test_history_score_matches_hand_computed_mad():
+    engine = build_engine()
+    window = engine.window(4, TARGET)
+    row = engine.series_row("A", "贷款余额")
+    assert window.current[row] == 19.0
+    assert window.history_count[row] == 4
+    assert window.history_median[row] == 13.0
+    assert window.history_score[row] == pytest.approx(6.0 / (MAD_SCALE * 2.0))
+
+
+def test_history_score_needs_min_history():
+    engine = build_engine()
+    window = engine.window(2, MONTHS[2])
+    row = engine.series_row("A", "贷款余额")
+    assert window.history_count[row] == 2
+    assert np.isnan(window.history_score[row])
+    # 没有历史数据的机构
+    assert np.isnan(engine.window(4, TARGET).history_score[engine.series_row("B", "贷款余额")])
+
+
+def test_peer_score_matches_hand_computed_mad():
+    engine = build_engine()
+    window = engine.window(4, TARGET)
+    # 城区：19、10、12、15，中位数13.5，绝对偏差5.5、3.5、1.5、1.5，MAD为2.5
+    row = engine.series_row("A", "贷款余额")
+    assert window.peer_count[row] == 4
+    assert window.peer_median[row] == 13.5
+    assert window.peer_score[row] == pytest.approx(5.5 / (MAD_SCALE * 2.5))
+    assert window.peer_score[engine.series_row("B", "贷款余额")] == pytest.approx(-3.5 / (MAD_SCALE * 2.5))
+    # 郊县机构数不足，未配置分组的机构不参与同组比较
+    assert window.peer_count[engine.series_row("E", "贷款余额")] == 2
+    assert np.isnan(window.peer_score[engine.series_row("E", "贷款余额")])
+    assert window.peer_count[engine.series_row("G", "贷款余额")] == 0
+    assert np.isnan(window.peer_score[engine.series_row("G", "贷款余额")])
+
+
+def test_robust_scores_degenerate_scale():
+    deviation = np.array([4.0, 3.0, -2.0, 0.0, np.nan])
+    mad = np.array([2.0, 0.0, 0.0, 0.0, 0.0])
+    mean_ad = np.array([1.0, 2.0, 0.0, 0.0, 0.0])
+    scores = robust_scores(deviation, mad, mean_ad)
+    assert scores[0] == pytest.approx(4.0 / (MAD_SCALE * 2.0))
+    # MAD为0时改用平均绝对偏差
+    assert scores[1] == pytest.approx(3.0 / (MEAN_AD_SCALE * 2.0))
+    # 两者都为0时偏离即为无穷大，不偏离为0
+    assert scores[2] == -np.inf
+    assert scores[3] == 0.0
+    assert np.isnan(scores[4])
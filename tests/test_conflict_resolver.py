@@ -0,0 +1,67 @@
+"""冲突策略的测试"""
+import numpy as np
+import pandas as pd
+import pytest
+from aa.data_loader.conflict_resolver import FIRST_WINS, LAST_WINS, ConflictResolver
+
+DATE = pd.Timestamp("2024-12-31")
+KEYS = ["数据日期", "机构名称"]
+
+
+def duplicated_rows() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "数据日期": [DATE, DATE, DATE],
+            "机构名称": ["A", "A", "B"],
+            "销售额": [1.0, 2.0, 5.0],
+            "客户数": [10.0, np.nan, 50.0],
+        }
+    )
+
+
+@pytest.mark.parametrize("policy, expected", [(LAST_WINS, 2.0), (FIRST_WINS, 1.0)])
+def test_dedupe_picks_value_by_policy(policy, expected):
+    resolver = ConflictResolver(policy)
+    result = resolver.dedupe(duplicated_rows(), KEYS, [(0, "表1"), (0, "表1"), (0, "表1")])
+    row = result[result["机构名称"] == "A"].iloc[0]
+    assert row["销售额"] == expected
+    # 空值不覆盖已有取值，也不记为冲突
+    assert row["客户数"] == 10.0
+    report = resolver.report()
+    assert list(report["指标名称"]) == ["销售额"]
+    assert report["采用值"].iloc[0] == expected
+
+
+def test_dedupe_without_duplicates_returns_input():
+    resolver = ConflictResolver()
+    df = duplicated_rows().iloc[1:]
+    assert resolver.dedupe(df, KEYS, [(0, "表1")] * 2) is df
+    assert resolver.report().empty
+
+
+@pytest.mark.parametrize(
+    "policy, kept_source, kept_value", [(LAST_WINS, "表2", 3.0), (FIRST_WINS, "表1", 1.0)]
+)
+def test_combine_across_sources(policy, kept_source, kept_value):
+    resolver = ConflictResolver(policy)
+    merged = pd.DataFrame(
+        {
+            "数据日期": [DATE, DATE],
+            "机构名称": ["A", "B"],
+            "销售额": [1.0, np.nan],
+            "销售额_DROP": [3.0, 4.0],
+        }
+    )
+    sources = {"销售额": (0, "表1")}
+    result = resolver.combine(merged, ["销售额"], sources, (1, "表2"))
+    assert list(result.columns) == ["数据日期", "机构名称", "销售额"]
+    # 冲突按策略取值，缺失值由另一个数据源填补
+    assert list(result["销售额"]) == [kept_value, 4.0]
+    report = resolver.report()
+    assert len(report) == 1
+    assert report.iloc[0]["采用来源"] == kept_source
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ConflictResolver("随机")
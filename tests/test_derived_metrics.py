@@ -0,0 +1,31 @@
+"""衍生指标公式解析的测试"""
+import pytest
+from aa.data_loader.derived_metrics import parse_formula
+
+
+def test_commutative_operands_are_canonicalised():
+    """满足交换律的运算，操作数顺序不同得到同一表达式树"""
+    assert parse_formula("销售额 * 客户数")[0] == parse_formula("客户数 * 销售额")[0]
+    assert parse_formula("a + b")[0] == parse_formula("b + a")[0]
+
+
+def test_non_commutative_operands_keep_order():
+    assert parse_formula("a - b")[0] != parse_formula("b - a")[0]
+    assert parse_formula("a / b")[0] == ("/", ("col", "a"), ("col", "b"))
+
+
+def test_bracketed_names_and_numbers():
+    tree, names = parse_formula("[营收(万元)] * 10000 / 员工人数")
+    assert names == ["员工人数", "营收(万元)"]
+    assert tree == ("/", ("*", ("col", "营收(万元)"), ("num", 10000.0)), ("col", "员工人数"))
+
+
+def test_unary_operators():
+    assert parse_formula("-a")[0] == ("neg", ("col", "a"))
+    assert parse_formula("+a")[0] == ("col", "a")
+
+
+@pytest.mark.parametrize("expression", ["a ** 2", "a +", "max(a, b)"])
+def test_unsupported_expressions_raise(expression):
+    with pytest.raises(ValueError):
+        parse_formula(expression)
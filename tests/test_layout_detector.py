@@ -0,0 +1,73 @@
+"""手工表数据区域识别的测试"""
+import pytest
+from openpyxl import Workbook
+from aa.data_loader.layout_detector import (
+    LayoutCache,
+    detect_layout,
+    is_auto_row,
+    is_block_end,
+    layout_fingerprint,
+)
+
+
+@pytest.mark.parametrize("value", [None, float("nan"), "", " auto ", "AUTO", -1, 0, "-1", "abc"])
+def test_auto_row_values(value):
+    assert is_auto_row(value)
+
+
+@pytest.mark.parametrize("value", [1, 5, "3", 3.0])
+def test_configured_rows_are_kept(value):
+    assert not is_auto_row(value)
+
+
+@pytest.mark.parametrize("value", [None, float("nan"), "", "  ", "合  计", "总计：", "全辖合计"])
+def test_block_end_values(value):
+    assert is_block_end(value)
+
+
+def test_org_names_do_not_end_block():
+    assert not is_block_end("城东支行")
+    assert not is_block_end(0)
+
+
+def test_fingerprint_ignores_digits_and_trailing_blanks():
+    march = [("2024年3月31日报表", None, None), ("机构名称", "贷款余额", "")]
+    april = [("2024年4月30日报表",), ("机构名称", "贷款余额")]
+    assert layout_fingerprint(march) == layout_fingerprint(april)
+    assert layout_fingerprint(march) != layout_fingerprint([("2024年4月30日报表",), ("机构名称", "存款余额")])
+
+
+def write_sheet(path, orgs, title="2024年3月31日报表"):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "明细"
+    sheet.append([title])
+    sheet.append(["机构名称", "贷款余额"])
+    for i, org in enumerate(orgs):
+        sheet.append([org, i + 1])
+    sheet.append(["合计", len(orgs)])
+    workbook.save(path)
+
+
+def test_detect_layout_and_cache(tmp_path):
+    march = tmp_path / "march.xlsx"
+    write_sheet(march, ["甲", "乙", "丙"])
+    layout = detect_layout(march, "明细", 0, "机构名称")
+    assert (layout.header_rows, layout.start_row, layout.end_row) == (2, 3, 5)
+
+    cache = LayoutCache(tmp_path / "layout_cache.json")
+    cache.remember("明细", layout)
+    cache.save()
+    assert not (tmp_path / ".layout_cache.json.tmp").exists()
+
+    # 下一期日期和机构数变化，版式不变
+    april = tmp_path / "april.xlsx"
+    write_sheet(april, ["甲", "乙"], title="2024年4月30日报表")
+    assert LayoutCache(tmp_path / "layout_cache.json").match(april, "明细") == layout
+
+
+def test_detect_layout_without_header_raises(tmp_path):
+    path = tmp_path / "bad.xlsx"
+    write_sheet(path, ["甲"])
+    with pytest.raises(ValueError):
+        detect_layout(path, "明细", 1, "机构名称")
@@ -0,0 +1,65 @@
+"""SQLite指标库的测试"""
+import threading
+import pandas as pd
+import pytest
+from aa.data_loader.metric_store import MetricStore
+
+DATE = pd.Timestamp("2024-12-31")
+
+
+def melted_frame(value: float) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "数据日期": [DATE, DATE],
+            "机构分组": ["一组", "一组"],
+            "机构名称": ["A", "B"],
+            "指标名称": ["销售额", "销售额"],
+            "指标值": [value, value + 1],
+        }
+    )
+
+
+def test_values_roundtrip(tmp_path):
+    store_file = MetricStore.write(melted_frame(10.0), tmp_path / "store.sqlite")
+    store = MetricStore(store_file)
+    assert list(store.values(DATE, "A", "销售额")) == [10.0]
+    assert len(store.values(DATE, "C", "销售额")) == 0
+    assert store.org_groups() == {"A": "一组", "B": "一组"}
+
+
+def test_rewrite_reconnects_all_reader_threads(tmp_path):
+    store_file = MetricStore.write(melted_frame(10.0), tmp_path / "store.sqlite")
+    store = MetricStore(store_file)
+    read_first = threading.Barrier(3)
+    rewritten = threading.Event()
+    results = {}
+
+    def reader(org: str):
+        before = float(store.values(DATE, org, "销售额")[0])
+        read_first.wait(timeout=10)
+        rewritten.wait(timeout=10)
+        results[org] = (before, float(store.values(DATE, org, "销售额")[0]))
+
+    threads = [threading.Thread(target=reader, args=(org,), daemon=True) for org in ("A", "B")]
+    for thread in threads:
+        thread.start()
+    try:
+        read_first.wait(timeout=10)
+        assert len(store._connections) == 2
+
+        # 重写指标库时关闭所有线程的读连接，之后的查询读取新文件
+        MetricStore.write(melted_frame(20.0), store_file)
+        assert store._connections == []
+        assert store._generation == 1
+    finally:
+        rewritten.set()
+        for thread in threads:
+            thread.join(timeout=10)
+
+    assert results == {"A": (10.0, 20.0), "B": (11.0, 21.0)}
+    assert len(store._connections) == 2
+
+
+def test_missing_store_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        MetricStore(tmp_path / "missing.sqlite")
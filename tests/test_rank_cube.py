@@ -0,0 +1,97 @@
+"""排名立方体和组内分布的测试"""
+import numpy as np
+import pytest
+import pandas as pd
+from aa.report_generators.operators.rank_cube import (
+    ALL_ORGS_GROUP,
+    ALL_ORGS_LEVEL,
+    GroupDistribution,
+    PRIMARY_LEVEL,
+    RankCube,
+)
+
+DATE = pd.Timestamp("2024-12-31")
+
+
+def melted_frame() -> pd.DataFrame:
+    orgs = ["A", "B", "C", "D", "E"]
+    return pd.DataFrame(
+        {
+            "数据日期": [DATE] * 10,
+            "指标名称": ["销售额"] * 5 + ["成本率"] * 5,
+            "机构名称": orgs * 2,
+            "指标值": [10.0, 30.0, 20.0, 30.0, np.nan, 0.3, 0.1, 0.2, 0.2, 0.5],
+            "机构分组": ["一组", "一组", "一组", "二组", "二组"] * 2,
+        }
+    )
+
+
+def build_cube() -> RankCube:
+    return RankCube(
+        melted_frame(), {"区域": {"A": "东", "B": "东", "C": "西", "D": "西"}}, lambda n: "率" in n
+    )
+
+
+def test_ranking_per_level_and_direction():
+    cube = build_cube()
+    orgs, values, ranks = cube.ranking(PRIMARY_LEVEL, DATE, "销售额", "一组", False)
+    assert dict(zip(orgs, ranks)) == {"A": 3, "B": 1, "C": 2}
+    # 升序指标越小越好，并列取最小名次，空值不参与排名
+    orgs, _, ranks = cube.ranking(ALL_ORGS_LEVEL, DATE, "成本率", ALL_ORGS_GROUP, True)
+    assert dict(zip(orgs, ranks)) == {"A": 4, "B": 1, "C": 2, "D": 2, "E": 5}
+    orgs, _, ranks = cube.ranking("区域", DATE, "销售额", "西", False)
+    assert dict(zip(orgs, ranks)) == {"C": 2, "D": 1}
+    assert cube.ranking(PRIMARY_LEVEL, DATE, "销售额", "三组", False) is None
+
+
+def test_direction_mismatch_raises_key_error():
+    """排序方向与构建时不一致时，调用方应改为现场计算"""
+    with pytest.raises(KeyError):
+        build_cube().ranking(PRIMARY_LEVEL, DATE, "销售额", "一组", True)
+
+
+def test_percentile_ties_and_nan():
+    dist = GroupDistribution.from_values(np.array(list("abcde")), [5.0, 4.0, 4.0, 2.0, np.nan], False)
+    # 空值不参与分布，降序指标由好到差排列
+    assert list(dist.orgs) == ["a", "b", "c", "d"]
+    assert dist.best == 5.0
+    assert dist.median == 4.0
+    # 4位机构：比4差的1位，并列2位取中间位置 (1 + 0.5) / 3
+    assert dist.percentile(4.0) == pytest.approx(50.0)
+    assert dist.percentile(5.0) == 100.0
+    assert dist.percentile(2.0) == 0.0
+    assert dist.percentile(3.0) == pytest.approx(100.0 / 3)
+
+
+def test_percentile_degenerate_groups():
+    assert GroupDistribution.from_values(np.array(["a", "b"]), [np.nan, np.nan], True) is None
+    single = GroupDistribution.from_values(np.array(["a"]), [7.0], True)
+    assert single.percentile(7.0) == 100.0
+
+
+def test_quartile_band_uses_group_quartiles():
+    dist = GroupDistribution.from_values(np.array(list("abcde")), [1.0, 2.0, 3.0, 4.0, 5.0], True)
+    assert (dist.upper_quartile, dist.median, dist.lower_quartile) == (2.0, 3.0, 4.0)
+    bands = [dist.quartile_band(v) for v in [1.0, 2.0, 3.0, 4.0, 5.0]]
+    assert bands == ["前25%", "前25%", "25%~50%", "50%~75%", "后25%"]
+    # 降序指标：[5, 4, 4, 2] 的前25%分界为4.25，后25%分界为3.5
+    dist = GroupDistribution.from_values(np.array(list("abcd")), [5.0, 4.0, 4.0, 2.0], False)
+    assert (dist.upper_quartile, dist.lower_quartile) == (4.25, 3.5)
+    assert [dist.quartile_band(v) for v in [5.0, 4.0, 3.5, 2.0]] == ["前25%", "25%~50%", "50%~75%", "后25%"]
+
+
+def test_cube_distribution_matches_from_values():
+    cube = build_cube()
+    frame = melted_frame()
+    for indicator, ascending in [("销售额", False), ("成本率", True)]:
+        rows = frame[frame["指标名称"] == indicator]
+        expected = GroupDistribution.from_values(rows["机构名称"].to_numpy(), rows["指标值"], ascending)
+        dist = cube.distribution(ALL_ORGS_LEVEL, DATE, indicator, ALL_ORGS_GROUP, ascending)
+        assert sorted(dist.orgs) == sorted(expected.orgs)
+        np.testing.assert_allclose(dist.keys, expected.keys)
+        assert (dist.median, dist.upper_quartile, dist.lower_quartile) == pytest.approx(
+            (expected.median, expected.upper_quartile, expected.lower_quartile)
+        )
+        for value in rows["指标值"].dropna():
+            assert dist.percentile(value) == pytest.approx(expected.percentile(value))
+    assert cube.distribution(PRIMARY_LEVEL, DATE, "销售额", "三组", False) is None
@@ -0,0 +1,51 @@
+"""算子注册表的测试"""
+import pytest
+from aa.report_generators.operators.registry import OperatorRegistry
+
+
+class EchoOperator:
+    @classmethod
+    def handle(cls, *args, **kwargs):
+        return "ok"
+
+
+def test_builtin_import_error_propagates():
+    registry = OperatorRegistry({"当期值": "aa_missing_module:CurrentValueOperator"})
+    with pytest.raises(ImportError):
+        registry.resolve("当期值")
+
+
+def test_builtin_resolver_import_error_propagates():
+    registry = OperatorRegistry(resolvers=("aa_missing_module:resolve",))
+    with pytest.raises(ImportError):
+        registry.resolve("近6月趋势")
+
+
+def test_plugin_failure_is_isolated_and_not_cached(tmp_path, monkeypatch):
+    base = OperatorRegistry({"当期值": EchoOperator})
+    registry = base.with_plugins({"行业对标": "aa_test_plugin:BenchmarkOperator"})
+    assert registry.resolve("行业对标") is None
+    assert registry.load_error("行业对标") is not None
+    # 内置算子不受插件导入失败影响
+    assert registry.resolve("当期值") is EchoOperator
+
+    # 插件模块修复后，下次解析重新导入
+    (tmp_path / "aa_test_plugin.py").write_text(
+        "class BenchmarkOperator:\n    @classmethod\n    def handle(cls):\n        return ''\n",
+        encoding="utf-8",
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    assert registry.resolve("行业对标").__name__ == "BenchmarkOperator"
+    assert registry.load_error("行业对标") is None
+
+
+def test_plugin_without_handle_is_rejected():
+    registry = OperatorRegistry().with_plugins({"行业对标": object})
+    assert registry.resolve("行业对标") is None
+    assert "handle" in registry.load_error("行业对标")
+
+
+def test_unknown_operator_is_none():
+    registry = OperatorRegistry({"当期值": EchoOperator})
+    assert registry.resolve("不存在") is None
+    assert registry.load_error("不存在") is None